@@ -1,18 +1,90 @@
+import time
+_INICIO_PROCESSO = time.perf_counter()
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-import pandas as pd
 from datetime import datetime
 import os
 import sys
 import subprocess
-from tkinter import messagebox, END, INSERT
-from fpdf import FPDF
+from tkinter import messagebox, filedialog, Listbox, END, INSERT
 import glob
 import re
-from openpyxl.styles import PatternFill, Font
-from openpyxl.utils import get_column_letter
-from openpyxl.formatting.rule import FormulaRule
+import pickle
+import json
+import threading
+import importlib
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import traceback
+import math
+import uuid
+import argparse
+import contextlib
+import cProfile
+import pstats
+import io
+import logging
+import logging.handlers
+from collections import deque
+import socket
+import socketserver
+import queue
+import itertools
+import bisect
+import heapq
+import unicodedata
+import gzip
+import zipfile
+import shutil
+import hmac
+import ipaddress
+from concurrent.futures import Future, TimeoutError as TempoEsgotadoFuturo
+
+# --- IMPORTAÇÕES ADIADAS ---
+# pandas, numpy, openpyxl e fpdf só são importados no primeiro uso: o formulário de entrada aparece antes e o
+# aquecimento em segundo plano (aquecer_sistema) carrega tudo enquanto o operador digita. M4_INICIO_RAPIDO=0 desliga.
+INICIO_RAPIDO = os.environ.get('M4_INICIO_RAPIDO', '1') != '0'
+
+class _ModuloAdiado:
+    def __init__(self, nome_modulo):
+        self._nome_modulo = nome_modulo
+        self._modulo = None
+
+    def carregar(self):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nome_modulo)
+        return self._modulo
+
+    def __getattr__(self, nome):
+        return getattr(self.carregar(), nome)
+
+def _nome_adiado(modulo, nome):
+    # PARA OS NOMES IMPORTADOS COM 'from ... import': A CHAMADA RESOLVE O NOME REAL NO MÓDULO.
+    def chamar(*args, **kwargs):
+        return getattr(modulo, nome)(*args, **kwargs)
+    chamar.__name__ = nome
+    return chamar
+
+pd = _ModuloAdiado('pandas')
+np = _ModuloAdiado('numpy')
+_MODULOS_ADIADOS = (pd, np, _ModuloAdiado('openpyxl'), _ModuloAdiado('openpyxl.styles'), _ModuloAdiado('openpyxl.utils'),
+                    _ModuloAdiado('openpyxl.cell'), _ModuloAdiado('openpyxl.formatting.rule'), _ModuloAdiado('fpdf'))
+Workbook = _nome_adiado(_MODULOS_ADIADOS[2], 'Workbook')
+PatternFill = _nome_adiado(_MODULOS_ADIADOS[3], 'PatternFill')
+Font = _nome_adiado(_MODULOS_ADIADOS[3], 'Font')
+get_column_letter = _nome_adiado(_MODULOS_ADIADOS[4], 'get_column_letter')
+WriteOnlyCell = _nome_adiado(_MODULOS_ADIADOS[5], 'WriteOnlyCell')
+FormulaRule = _nome_adiado(_MODULOS_ADIADOS[6], 'FormulaRule')
+FPDF = _nome_adiado(_MODULOS_ADIADOS[7], 'FPDF')
+
+def carregar_modulos_adiados():
+    for modulo in _MODULOS_ADIADOS:
+        modulo.carregar()
+
+if not INICIO_RAPIDO: carregar_modulos_adiados()
+_FIM_IMPORTACOES = time.perf_counter()
 
 # --- CONFIGURAÇÕES GLOBAIS ---
 PASTA_LOGS_EXCEL = "Logs_Excel"
@@ -25,14 +97,110 @@ COLUNAS_ORDENADAS = [
     'Cliente', 'Nº do Lacre', 'Nota Fiscal (NF)', 'Destino', 'Observações',
     'Placa do Veículo', 'Placa Carreta', 'Motorista', 'CPF Motorista', 'Transportadora',
     'Tara', 'Peso Bruto Carga', 'Booking', 'Armador', 'Navio', 'Deadline',
-    'Tempo de Pátio (Dias)'
+    'Tempo de Pátio (Dias)', 'ID Movimento'
 ]
 # DICIONÁRIO DE TIPOS PARA LEITURA ROBUSTA DO EXCEL. GARANTE QUE COLUNAS VAZIAS SEJAM LIDAS COMO TEXTO.
 DTYPE_COLS = {col: str for col in COLUNAS_ORDENADAS if col != 'Data e Hora'}
+# ÍNDICE PERSISTENTE DO PÁTIO: ÚLTIMO MOVIMENTO DE CADA CONTÊINER POR ARQUIVO DE LOG, VALIDADO POR MTIME/TAMANHO.
+ARQUIVO_INDICE_PATIO = ".indice_patio.pkl"
+VERSAO_INDICE_PATIO = 5
+# ESCRITA DO EXCEL EM MODO STREAMING (openpyxl write-only): MEMÓRIA CONSTANTE, MESMA FORMATAÇÃO DO MODO CLÁSSICO.
+MODO_ESCRITA_RAPIDA = True
+FORMATO_DATA_EXCEL = "DD/MM/YYYY HH:MM"
+# DIÁRIO DE MOVIMENTOS (JSON LINES, SOMENTE ANEXAÇÃO). É O REGISTRO OFICIAL; O EXCEL DO DIA É DERIVADO DELE.
+EXTENSAO_DIARIO = ".jsonl"
+ATRASO_EXPORTACAO_EXCEL_S = 3.0
+# A INTERFACE CONFERE A CADA TANTOS ms SE ALGUMA PLANILHA DO DIA FICOU DESATUALIZADA (EX.: ABERTA NO EXCEL).
+INTERVALO_AVISO_EXCEL_MS = 2000
+# ARQUIVO MORTO: CADA MÊS FECHADO VIRA UM ÚNICO ARQUIVO COLUNAR (JSON COMPACTADO) EM Logs_Excel/_arquivo, LIDO COMO
+# QUALQUER OUTRA FONTE DO HISTÓRICO. OS ARQUIVOS ORIGINAIS DOS DIAS FICAM EM Originais_<mês>.zip.
+PASTA_ARQUIVO_MORTO = "_arquivo"
+EXTENSAO_ARQUIVO_MENSAL = ".json.gz"
+VERSAO_ARQUIVO_MENSAL = 1
+# PASTAS DIÁRIAS JÁ ARQUIVADAS AGUARDANDO REMOÇÃO. FICA FORA DE Logs_Excel PARA NÃO SER LIDA COMO HISTÓRICO.
+PASTA_REMOCAO_PENDENTE = "_remocao_pendente"
+# LEITURA PARALELA DO HISTÓRICO. None = UM PROCESSO POR NÚCLEO (PODE SER FIXADO PELA VARIÁVEL M4_WORKERS_LEITURA).
+MAX_WORKERS_LEITURA = None
+MIN_ARQUIVOS_PARALELO = 8
+# CARGA COMPACTA DO HISTÓRICO: COLUNAS DE POUCOS VALORES VIRAM 'category', CADA CONSULTA LÊ SÓ AS COLUNAS QUE USA E OS
+# ARQUIVOS SÃO PROCESSADOS EM LOTES. VALE PARA AS CARGAS COMPLETAS (EXPORTAÇÃO, AUDITORIA, INDICADORES); O ÍNDICE DO
+# PÁTIO FICA EM TEXTO, PORQUE UNIR AS CATEGORIAS DE TODOS OS ARQUIVOS A CADA CONSULTA CUSTA MAIS (~0,8 s CONTRA ~0,2 s EM
+# 365 DIAS) DO QUE OS ~6 MB ECONOMIZADOS. TETO DE MEMÓRIA: O HISTÓRICO CARREGADO (ÍNDICE DO PÁTIO OU CONSULTA COMPLETA)
+# NÃO DEVE PASSAR DE LIMITE_MEMORIA_HISTORICO_MB. MEDIDO: ~0,56 KB POR MOVIMENTO NAS 23 COLUNAS EM MODO COMPACTO
+# (CONTRA ~1,26 KB SÓ COM str), OU SEJA, ~450 MIL MOVIMENTOS (CINCO ANOS A ~250/DIA) CABEM EM 256 MB; CONSULTAS QUE
+# PEDEM POUCAS COLUNAS (AUDITORIA: 5) FICAM EM ~0,15 KB POR MOVIMENTO. ACIMA DO TETO É EMITIDO UM AVISO.
+MODO_COMPACTO = True
+COLUNAS_CATEGORICAS = ('Status', 'Tipo de Contêiner', 'Condição', 'Cliente', 'Armador', 'Navio', 'Transportadora', 'Destino')
+# AS DEMAIS COLUNAS DE TEXTO TAMBÉM VIRAM 'category' QUANDO, NO ARQUIVO, OS VALORES SE REPETEM (MOTORISTA, CPF, DEADLINE).
+FRACAO_MAX_CATEGORICA = 0.5
+COLUNAS_NUNCA_CATEGORICAS = ('Data e Hora', 'Nº do Contêiner', 'ID Movimento')
+ARQUIVOS_POR_LOTE = 64
+# MESES DO ARQUIVO MORTO SÃO AGRUPADOS ATÉ ESTE TOTAL DE MOVIMENTOS POR LOTE (~55 MB COMPACTOS A ~0,56 KB POR
+# MOVIMENTO): A ~250 MOVIMENTOS/DIA SÃO ~13 MESES, LIDOS EM PARALELO, SEM PASSAR DO TETO DE MEMÓRIA.
+LINHAS_POR_LOTE_ARQUIVO = 100_000
+# NA DECISÃO DE LER EM PARALELO, UM MÊS ARQUIVADO PESA COMO OS ~30 DIÁRIOS QUE SUBSTITUI.
+DIAS_POR_ARQUIVO_MENSAL = 30
+LIMITE_MEMORIA_HISTORICO_MB = 256
+# ROMANEIO: RÓTULO IMPRESSO -> CAMPO DO MOVIMENTO DE SAÍDA. O LAYOUT FIXO É MONTADO UMA VEZ A PARTIR DESTA LISTA.
+CAMPOS_ROMANEIO_PDF = (
+    ('Nº do Contêiner', 'Nº do Contêiner'), ('Cliente', 'Cliente'), ('Placa do Veículo', 'Placa do Veículo'),
+    ('Placa Carreta', 'Placa Carreta'), ('Motorista', 'Motorista'), ('CPF', 'CPF Motorista'),
+    ('Transportadora', 'Transportadora'), ('Nº do Lacre', 'Nº do Lacre'), ('Tara', 'Tara'),
+    ('Peso da Carga', 'Peso Bruto Carga'), ('Booking', 'Booking'), ('Armador', 'Armador'), ('Navio', 'Navio'),
+    ('Deadline', 'Deadline'), ('Destino', 'Destino')
+)
+MIN_ROMANEIOS_PARALELO = 4
+# IMPORTAÇÃO EM LOTE (LINHA DE COMANDO)
+COLUNAS_OBRIGATORIAS_IMPORTACAO = ('Data e Hora', 'Status', 'Nº do Contêiner')
+CAMPOS_ROMANEIO = ['Tara', 'Peso Bruto Carga', 'Booking', 'Armador', 'Navio', 'Deadline']
+# TAREFAS EM SEGUNDO PLANO DA INTERFACE: INTERVALO DE VERIFICAÇÃO (ms) DOS RESULTADOS PELO LOOP DO TK.
+INTERVALO_VERIFICACAO_MS = 50
+# LISTA DO PÁTIO: SÓ A PÁGINA VISÍVEL VAI PARA O TREEVIEW; BUSCA E ORDENAÇÃO SÃO FEITAS NO DATAFRAME.
+TAMANHO_PAGINA_PATIO = 100
+ATRASO_BUSCA_MS = 150
+COLUNAS_BUSCA_PATIO = ('Nº do Contêiner', 'Cliente', 'Placa do Veículo')
+
+# INDICADORES: RESUMO DIÁRIO (ENTRADAS, SAÍDAS, PERMANÊNCIA) POR ARQUIVO DE LOG, RECALCULADO SÓ PARA ARQUIVOS ALTERADOS.
+ARQUIVO_INDICADORES = ".indicadores.pkl"
+VERSAO_INDICADORES = 2
+COLUNAS_INDICADORES = ['Dia', 'Status', 'Cliente', 'Tipo de Contêiner', 'Condição', 'Tempo de Pátio (Dias)']
+FAIXAS_PERMANENCIA = ((0, 2, '0-2 dias'), (3, 7, '3-7 dias'), (8, 15, '8-15 dias'), (16, 30, '16-30 dias'), (31, math.inf, '31+ dias'))
+QTD_PRINCIPAIS_CLIENTES = 10
+# AUTOCOMPLETAR: ÍNDICE DE PREFIXOS EM MEMÓRIA, MONTADO DO HISTÓRICO EM SEGUNDO PLANO E ATUALIZADO A CADA MOVIMENTO.
+ARQUIVO_INDICE_SUGESTOES = ".indice_sugestoes.pkl"
+VERSAO_INDICE_SUGESTOES = 2
+CAMPOS_SUGESTAO = ('Cliente', 'Motorista', 'CPF Motorista', 'Placa do Veículo', 'Placa Carreta', 'Transportadora')
+CAMPOS_DO_MOTORISTA = ('CPF Motorista', 'Placa do Veículo', 'Placa Carreta', 'Transportadora')
+QTD_SUGESTOES = 8
+TAMANHO_PREFIXO_PRECALCULADO = 3
+# VÁRIOS TERMINAIS: COM M4_COORDENADOR=host:porta AS GRAVAÇÕES PASSAM PELO COORDENADOR (python M4_logistica.py coordenador).
+# SEM COORDENADOR (UM SÓ PC, OU COORDENADOR FORA DO AR) CADA GRAVAÇÃO NO DIÁRIO É PROTEGIDA POR UMA TRAVA DE ARQUIVO.
+ENDERECO_COORDENADOR = None
+PORTA_COORDENADOR = 8765
+# SENHA COMPARTILHADA ENTRE COORDENADOR E TERMINAIS (OU M4_TOKEN_COORDENADOR). OBRIGATÓRIA PARA O COORDENADOR ESCUTAR
+# FORA DA PRÓPRIA MÁQUINA: SEM ELA, QUALQUER PC DA REDE DO PORTÃO PODERIA GRAVAR NO DIÁRIO.
+TOKEN_COORDENADOR = None
+MAX_LOTE_GRAVACAO = 200
+TIMEOUT_COORDENADOR_S = 15.0
+INTERVALO_RECONEXAO_S = 30.0
+INTERVALO_RESSINCRONIA_S = 30.0
+TRAVA_TIMEOUT_S = 15.0
+TRAVA_EXPIRACAO_S = 60.0
 
+# INSTRUMENTAÇÃO (OPCIONAL): M4_METRICAS=1 LIGA O REGISTRO DE TEMPOS EM Metricas/metricas.jsonl (ARQUIVO ROTATIVO).
+PASTA_METRICAS = "Metricas"
+TAMANHO_MAX_METRICAS_BYTES = 1024 * 1024
+QTD_ARQUIVOS_METRICAS = 5
+QTD_METRICAS_RECENTES = 500
+# META DE ABERTURA: SEGUNDOS ATÉ O FORMULÁRIO APARECER. CADA ABERTURA É ANOTADA EM Metricas/inicializacao.jsonl.
+META_INICIALIZACAO_S = 1.5
+ARQUIVO_INICIALIZACAO = "inicializacao.jsonl"
 
 # --- FUNÇÕES UTILITÁRIAS DE SISTEMA ---
 def _base_dir():
+    # M4_BASE_DIR PERMITE APONTAR O SISTEMA PARA OUTRA PASTA DE DADOS (BENCHMARKS, TESTES, TERMINAL DE TREINAMENTO).
+    if os.environ.get('M4_BASE_DIR'):
+        return os.environ['M4_BASE_DIR']
     if getattr(sys, 'frozen', False):
         return os.path.dirname(sys.executable)
     else:
@@ -49,12 +217,170 @@ def _abrir_no_sistema(caminho: str):
     except Exception as e:
         messagebox.showwarning("Aviso", f"Não foi possível abrir o caminho:\n{e}")
 
+# --- INSTRUMENTAÇÃO E PERFILAMENTO ---
+# medir_operacao() envolve as operações principais (leitura, concat, gravação, formatação, PDF e pátio). Desligada,
+# custa só uma verificação de flag. 'perfilar' captura a próxima operação (ou a próxima com aquele nome) no cProfile.
+_METRICAS = {
+    'ativas': os.environ.get('M4_METRICAS') == '1',
+    'perfilar': None,
+    'recentes': deque(maxlen=QTD_METRICAS_RECENTES),
+    'logger': None,
+    # NUM WORKER DE ProcessPoolExecutor: MÉTRICAS QUE VOLTAM AO PRINCIPAL COM O RESULTADO (_com_metricas_do_worker).
+    'do_worker': [],
+}
+_TRAVA_METRICAS = threading.Lock()
+
+def definir_metricas_ativas(ativas):
+    _METRICAS['ativas'] = bool(ativas)
+
+def perfilar_proxima_operacao(operacao='*'):
+    _METRICAS['perfilar'] = operacao
+
+def metricas_recentes():
+    with _TRAVA_METRICAS:
+        return list(_METRICAS['recentes'])
+
+def _logger_metricas():
+    if _METRICAS['logger'] is None:
+        pasta = os.path.join(_base_dir(), PASTA_METRICAS)
+        os.makedirs(pasta, exist_ok=True)
+        logger = logging.getLogger('m4.metricas')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(os.path.join(pasta, 'metricas.jsonl'), maxBytes=TAMANHO_MAX_METRICAS_BYTES,
+                                                       backupCount=QTD_ARQUIVOS_METRICAS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _METRICAS['logger'] = logger
+    return _METRICAS['logger']
+
+def _registrar_metrica(registro):
+    # SÓ O PROCESSO PRINCIPAL GRAVA: OS WORKERS GUARDAM A MÉTRICA, QUE VOLTA JUNTO COM O RESULTADO DA TAREFA.
+    if multiprocessing.parent_process() is not None:
+        registro['processo'] = os.getpid()
+        _METRICAS['do_worker'].append(registro)
+        return
+    with _TRAVA_METRICAS:
+        _METRICAS['recentes'].append(registro)
+        try:
+            _logger_metricas().info(json.dumps(registro, ensure_ascii=False, default=str))
+        except Exception:
+            traceback.print_exc()
+
+def _com_metricas_do_worker(funcao, ativas, *args):
+    # EXECUTADA NO WORKER: USA A CHAVE DE MÉTRICAS DO PRINCIPAL E DEVOLVE (resultado, métricas medidas na tarefa).
+    _METRICAS['ativas'] = ativas
+    _METRICAS['do_worker'] = []
+    resultado = funcao(*args)
+    metricas, _METRICAS['do_worker'] = _METRICAS['do_worker'], []
+    return resultado, metricas
+
+def _registrar_metricas_do_worker(metricas):
+    for registro in metricas:
+        _registrar_metrica(registro)
+
+def _salvar_perfil(perfil, operacao):
+    pasta = os.path.join(_base_dir(), PASTA_METRICAS)
+    os.makedirs(pasta, exist_ok=True)
+    base = os.path.join(pasta, f"perfil_{re.sub(r'[^A-Za-z0-9_]+', '_', operacao)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    perfil.dump_stats(base + ".prof")
+    texto = io.StringIO()
+    pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(40)
+    with open(base + ".txt", 'w', encoding='utf-8') as f:
+        f.write(texto.getvalue())
+    return base + ".prof"
+
+@contextlib.contextmanager
+def medir_operacao(operacao, **detalhes):
+    # 'detalhes' PODE SER COMPLETADO DENTRO DO BLOCO (EX.: detalhes['linhas'] = len(df)).
+    alvo_perfil = _METRICAS['perfilar']
+    perfilar = alvo_perfil in ('*', operacao) and multiprocessing.parent_process() is None
+    if not _METRICAS['ativas'] and not perfilar:
+        yield detalhes
+        return
+    perfil = None
+    if perfilar:
+        with _TRAVA_METRICAS:
+            if _METRICAS['perfilar'] == alvo_perfil:
+                _METRICAS['perfilar'] = None
+                perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    if perfil is not None: perfil.enable()
+    try:
+        yield detalhes
+    except BaseException as e:
+        detalhes['erro'] = type(e).__name__
+        raise
+    finally:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        if perfil is not None:
+            perfil.disable()
+            try:
+                detalhes['perfil'] = _salvar_perfil(perfil, operacao)
+            except Exception:
+                traceback.print_exc()
+        registro = {'quando': datetime.now().isoformat(timespec='milliseconds'), 'operacao': operacao,
+                    'duracao_ms': round(duracao_ms, 2), 'thread': threading.current_thread().name}
+        registro.update(detalhes)
+        _registrar_metrica(registro)
+
+def registrar_inicializacao(etapas):
+    # SEMPRE GRAVADO (UMA LINHA POR ABERTURA), MESMO COM AS MÉTRICAS DESLIGADAS. O TEMPO CONTA A PARTIR DA PRIMEIRA
+    # LINHA DO MÓDULO; O INTERPRETADOR E A EXTRAÇÃO DO EXECUTÁVEL (PyInstaller) FICAM DE FORA.
+    registro = {'quando': datetime.now().isoformat(timespec='seconds'), 'rapido': INICIO_RAPIDO,
+                'congelado': bool(getattr(sys, 'frozen', False)), 'meta_s': META_INICIALIZACAO_S}
+    registro.update({etapa: round(segundos, 3) for etapa, segundos in etapas.items()})
+    registro['dentro_da_meta'] = registro.get('janela_s', math.inf) <= META_INICIALIZACAO_S
+    try:
+        pasta = os.path.join(_base_dir(), PASTA_METRICAS)
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, ARQUIVO_INICIALIZACAO), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    except OSError:
+        traceback.print_exc()
+    return registro
+
+def relatorio_inicializacao(ultimas=50):
+    registros = []
+    try:
+        with open(os.path.join(_base_dir(), PASTA_METRICAS, ARQUIVO_INICIALIZACAO), encoding='utf-8') as f:
+            for linha in f:
+                try: registros.append(json.loads(linha))
+                except ValueError: continue
+    except OSError:
+        pass
+    registros = registros[-ultimas:]
+    etapas = {}
+    for etapa in ('importacoes_s', 'janela_s', 'pronto_s'):
+        valores = sorted(r[etapa] for r in registros if isinstance(r.get(etapa), (int, float)))
+        if valores:
+            etapas[etapa] = {'mediana': valores[len(valores) // 2], 'p90': valores[min(len(valores) - 1, int(len(valores) * 0.9))],
+                             'maximo': valores[-1]}
+    return {'aberturas': len(registros), 'dentro_da_meta': sum(1 for r in registros if r.get('dentro_da_meta')),
+            'meta_s': META_INICIALIZACAO_S, 'etapas': etapas, 'ultima': registros[-1] if registros else None}
+
 # --- FUNÇÕES DE VALIDAÇÃO ---
+_VALORES_ISO6346 = {'0': 0, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, 'A': 10, 'B': 12, 'C': 13, 'D': 14, 'E': 15, 'F': 16, 'G': 17, 'H': 18, 'I': 19, 'J': 20, 'K': 21, 'L': 23, 'M': 24, 'N': 25, 'O': 26, 'P': 27, 'Q': 28, 'R': 29, 'S': 30, 'T': 31, 'U': 32, 'V': 34, 'W': 35, 'X': 36, 'Y': 37, 'Z': 38}
+_RE_NAO_ALFANUMERICO = re.compile(r'[^A-Z0-9]')
+_RE_FORMATO_CONTAINER = re.compile(r'^[A-Z]{4}\d{7}$')
+
+@functools.lru_cache(maxsize=None)
+def _tabelas_validacao():
+    # TABELAS PARA A VALIDAÇÃO VETORIZADA: VALOR ISO 6346 INDEXADO PELO CÓDIGO ASCII E PESOS 2**i / 10..2 / 11..2.
+    # MONTADAS NO PRIMEIRO USO PARA NÃO IMPORTAR O NUMPY NA ABERTURA DO PROGRAMA.
+    tabela_iso6346 = np.zeros(128, dtype=np.int64)
+    for caractere, valor in _VALORES_ISO6346.items(): tabela_iso6346[ord(caractere)] = valor
+    return {
+        'iso6346': tabela_iso6346,
+        'pesos_iso6346': 2 ** np.arange(10, dtype=np.int64),
+        'pesos_cpf_1': np.arange(10, 1, -1, dtype=np.int64),
+        'pesos_cpf_2': np.arange(11, 1, -1, dtype=np.int64),
+    }
+
 def validar_numero_container(numero_container):
-    num_limpo = re.sub(r'[^A-Z0-9]', '', str(numero_container).upper())
-    if not re.match(r'^[A-Z]{4}\d{7}$', num_limpo): return False
-    mapa_valores = {'0': 0, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, 'A': 10, 'B': 12, 'C': 13, 'D': 14, 'E': 15, 'F': 16, 'G': 17, 'H': 18, 'I': 19, 'J': 20, 'K': 21, 'L': 23, 'M': 24, 'N': 25, 'O': 26, 'P': 27, 'Q': 28, 'R': 29, 'S': 30, 'T': 31, 'U': 32, 'V': 34, 'W': 35, 'X': 36, 'Y': 37, 'Z': 38}
-    soma_ponderada = sum(mapa_valores[num_limpo[i]] * (2**i) for i in range(10))
+    num_limpo = _RE_NAO_ALFANUMERICO.sub('', str(numero_container).upper())
+    if not _RE_FORMATO_CONTAINER.match(num_limpo): return False
+    soma_ponderada = sum(_VALORES_ISO6346[num_limpo[i]] * (2**i) for i in range(10))
     digito_calculado = soma_ponderada % 11
     if digito_calculado == 10: digito_calculado = 0
     return digito_calculado == int(num_limpo[10])
@@ -70,6 +396,53 @@ def validar_cpf(cpf):
     if resto != int(cpf_numeros[10]): return False
     return True
 
+def _digitos_em_matriz(textos, largura):
+    # TEXTOS ASCII DE MESMO TAMANHO -> MATRIZ (n, largura) DE CÓDIGOS, SEM LAÇO PYTHON POR CARACTERE.
+    if len(textos) == 0: return np.empty((0, largura), dtype=np.int64)
+    return np.frombuffer(''.join(textos).encode('ascii'), dtype=np.uint8).reshape(-1, largura).astype(np.int64)
+
+def validar_containers_vetorizado(numeros):
+    # DEVOLVE UM DataFrame ('valido', 'motivo') ALINHADO AO ÍNDICE DA ENTRADA (Series, array ou lista).
+    serie = numeros if isinstance(numeros, pd.Series) else pd.Series(numeros)
+    limpos = serie.astype(object).fillna('').astype(str).str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
+    vazio = (limpos == '').to_numpy()
+    formato_ok = limpos.str.fullmatch(r'[A-Z]{4}\d{7}').fillna(False).to_numpy(dtype=bool)
+    digito_ok = np.zeros(len(serie), dtype=bool)
+    codigos = _digitos_em_matriz(limpos[formato_ok].tolist(), 11)
+    if len(codigos):
+        tabelas = _tabelas_validacao()
+        soma = (tabelas['iso6346'][codigos[:, :10]] * tabelas['pesos_iso6346']).sum(axis=1)
+        digito_ok[formato_ok] = (soma % 11 % 10) == (codigos[:, 10] - ord('0'))
+    motivo = np.select(
+        [vazio, ~formato_ok, ~digito_ok],
+        ["Nº do Contêiner vazio", "Formato inválido (esperado 4 letras e 7 dígitos)", "Dígito verificador inválido"],
+        default=''
+    )
+    return pd.DataFrame({'valido': digito_ok, 'motivo': motivo}, index=serie.index)
+
+def validar_cpfs_vetorizado(cpfs, permitir_vazio=True):
+    # CPF VAZIO É ACEITO POR PADRÃO, COMO NO FORMULÁRIO (O CAMPO É OPCIONAL).
+    serie = cpfs if isinstance(cpfs, pd.Series) else pd.Series(cpfs)
+    digitos = serie.astype(object).fillna('').astype(str).str.replace(r'[^0-9]', '', regex=True)
+    vazio = (digitos == '').to_numpy()
+    tamanho_ok = (digitos.str.len() == 11).to_numpy()
+    repetido = (digitos == digitos.str[0].str.repeat(11)).to_numpy() & tamanho_ok
+    calculavel = tamanho_ok & ~repetido
+    digitos_ok = np.zeros(len(serie), dtype=bool)
+    numeros = _digitos_em_matriz(digitos[calculavel].tolist(), 11) - ord('0')
+    if len(numeros):
+        tabelas = _tabelas_validacao()
+        dv1 = (numeros[:, :9] @ tabelas['pesos_cpf_1']) * 10 % 11 % 10
+        dv2 = (numeros[:, :10] @ tabelas['pesos_cpf_2']) * 10 % 11 % 10
+        digitos_ok[calculavel] = (dv1 == numeros[:, 9]) & (dv2 == numeros[:, 10])
+    valido = digitos_ok | (vazio & permitir_vazio)
+    motivo = np.select(
+        [vazio & permitir_vazio, vazio, ~tamanho_ok, repetido, ~digitos_ok],
+        ['', "CPF vazio", "CPF deve ter 11 dígitos", "CPF com todos os dígitos iguais", "Dígitos verificadores do CPF inválidos"],
+        default=''
+    )
+    return pd.DataFrame({'valido': valido, 'motivo': motivo}, index=serie.index)
+
 # --- FUNÇÕES DE ARQUIVOS E PLANILHA ---
 def get_pasta_logs_do_dia():
     hoje = datetime.now().strftime('%Y-%m-%d')
@@ -81,9 +454,21 @@ def get_caminho_log_diario():
     nome_arquivo = f"Log_Diario_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
     return os.path.join(pasta_logs_dia, nome_arquivo)
 
+def get_caminho_diario(dia=None):
+    dia = dia or datetime.now().strftime('%Y-%m-%d')
+    pasta_logs_dia = os.path.join(_base_dir(), PASTA_LOGS_EXCEL, dia)
+    os.makedirs(pasta_logs_dia, exist_ok=True)
+    return os.path.join(pasta_logs_dia, f"Log_Diario_{dia}{EXTENSAO_DIARIO}")
+
+def _caminho_excel_do_diario(caminho_diario):
+    return os.path.splitext(caminho_diario)[0] + ".xlsx"
+
 def garantir_arquivo_do_dia():
     caminho = get_caminho_log_diario()
-    if not os.path.exists(caminho):
+    caminho_diario = os.path.splitext(caminho)[0] + EXTENSAO_DIARIO
+    if os.path.exists(caminho_diario) and _excel_desatualizado(caminho_diario):
+        exportar_diario_para_excel(caminho_diario)
+    elif not os.path.exists(caminho):
         df_vazio = pd.DataFrame(columns=COLUNAS_ORDENADAS).astype(DTYPE_COLS)
         salvar_planilha(df_vazio, caminho)
     return caminho
@@ -94,7 +479,7 @@ def formatar_planilha(writer, df):
     header_fill = PatternFill(start_color="2F4F4F", end_color="2F4F4F", fill_type="solid")
     fill_entrada = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
     fill_saida = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    formato_data = "DD/MM/YYYY HH:MM"
+    formato_data = FORMATO_DATA_EXCEL
     max_row = ws.max_row
     max_col = ws.max_column
     for col_num, column_title in enumerate(df.columns, 1):
@@ -121,7 +506,7 @@ def formatar_planilha(writer, df):
         except KeyError:
             pass
 
-def salvar_planilha(df_para_salvar, caminho_arquivo):
+def _preparar_df_para_planilha(df_para_salvar):
     if 'Data e Hora' in df_para_salvar.columns:
         df_para_salvar['Data e Hora'] = pd.to_datetime(df_para_salvar['Data e Hora'])
     df_para_salvar = df_para_salvar.reindex(columns=COLUNAS_ORDENADAS)
@@ -130,20 +515,308 @@ def salvar_planilha(df_para_salvar, caminho_arquivo):
     for col in df_para_escrever.columns:
         if col != 'Data e Hora':
             df_para_escrever[col] = df_para_escrever[col].fillna('')
-    with pd.ExcelWriter(caminho_arquivo, engine='openpyxl', datetime_format=None) as writer:
-        df_para_escrever.to_excel(writer, sheet_name=NOME_ABA_EXCEL, index=False)
-        formatar_planilha(writer, df_para_escrever)
+    return df_para_escrever
 
-def registrar_movimento(dados_base=None):
-    caminho_arquivo = get_caminho_log_diario()
-    novo_df = pd.DataFrame([dados_base])
+def salvar_planilha(df_para_salvar, caminho_arquivo, rapido=None):
+    rapido = MODO_ESCRITA_RAPIDA if rapido is None else rapido
+    with medir_operacao('salvar', arquivo=os.path.basename(caminho_arquivo), linhas=len(df_para_salvar), modo='streaming' if rapido else 'classico') as detalhes:
+        if rapido:
+            salvar_planilha_rapida(df_para_salvar, caminho_arquivo)
+        else:
+            df_para_escrever = _preparar_df_para_planilha(df_para_salvar)
+            with pd.ExcelWriter(caminho_arquivo, engine='openpyxl', datetime_format=None) as writer:
+                df_para_escrever.to_excel(writer, sheet_name=NOME_ABA_EXCEL, index=False)
+                with medir_operacao('formatar', linhas=len(df_para_escrever)):
+                    formatar_planilha(writer, df_para_escrever)
+        detalhes['bytes'] = os.path.getsize(caminho_arquivo)
+
+def _larguras_colunas(df):
+    larguras = {}
+    for col in COLUNAS_ORDENADAS:
+        maior = df[col].astype(str).str.len().max() if col in df and not df.empty else 0
+        larguras[col] = max(int(maior) if pd.notna(maior) else 0, len(col)) + 2
+    return larguras
+
+def escrever_planilha_streaming(caminho_arquivo, blocos, larguras):
+    # GRAVA BLOCOS DE DataFrame (JÁ NAS COLUNAS DE COLUNAS_ORDENADAS) LINHA A LINHA, SEM MONTAR A PLANILHA EM MEMÓRIA.
+    # AS LARGURAS PRECISAM SER CONHECIDAS ANTES DA PRIMEIRA LINHA; FILTRO E CORES SÃO GRAVADOS AO FINAL.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(NOME_ABA_EXCEL)
+    for col_num, column_title in enumerate(COLUNAS_ORDENADAS, 1):
+        ws.column_dimensions[get_column_letter(col_num)].width = larguras.get(column_title, len(column_title) + 2)
+    ws.freeze_panes = 'A2'
+    header_font = Font(bold=True, color="FFFFFF", name='Calibri')
+    header_fill = PatternFill(start_color="2F4F4F", end_color="2F4F4F", fill_type="solid")
+    cabecalho = []
+    for column_title in COLUNAS_ORDENADAS:
+        celula = WriteOnlyCell(ws, value=column_title)
+        celula.font = header_font; celula.fill = header_fill
+        cabecalho.append(celula)
+    ws.append(cabecalho)
+    idx_data = COLUNAS_ORDENADAS.index('Data e Hora')
+    total_linhas = 1
+    for bloco in blocos:
+        if bloco is None or bloco.empty: continue
+        datas = pd.to_datetime(bloco['Data e Hora'], errors='coerce')
+        datas = datas.astype(object).where(datas.notna(), None).tolist()
+        valores = bloco.reindex(columns=COLUNAS_ORDENADAS).astype(object)
+        valores = valores.where(valores.notna() & (valores != ''), None)
+        for data, linha in zip(datas, valores.itertuples(index=False, name=None)):
+            linha = list(linha)
+            celula_data = WriteOnlyCell(ws, value=data.to_pydatetime() if data is not None else None)
+            celula_data.number_format = FORMATO_DATA_EXCEL
+            linha[idx_data] = celula_data
+            ws.append(linha)
+        total_linhas += len(bloco)
+    ultima_coluna = get_column_letter(len(COLUNAS_ORDENADAS))
+    ws.auto_filter.ref = f"A1:{ultima_coluna}{total_linhas}"
+    if total_linhas > 1:
+        col_status_letter = get_column_letter(COLUNAS_ORDENADAS.index('Status') + 1)
+        data_range_full = f"A2:{ultima_coluna}{total_linhas}"
+        fill_entrada = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+        fill_saida = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+        ws.conditional_formatting.add(data_range_full, FormulaRule(formula=[f'${col_status_letter}2="Entrada"'], fill=fill_entrada))
+        ws.conditional_formatting.add(data_range_full, FormulaRule(formula=[f'${col_status_letter}2="Saída"'], fill=fill_saida))
+    wb.save(caminho_arquivo)
+    return total_linhas - 1
+
+def salvar_planilha_rapida(df_para_salvar, caminho_arquivo):
+    df_para_escrever = _preparar_df_para_planilha(df_para_salvar)
+    escrever_planilha_streaming(caminho_arquivo, [df_para_escrever], _larguras_colunas(df_para_escrever))
+
+# --- DIÁRIO DE MOVIMENTOS (SOMENTE ANEXAÇÃO) ---
+# Cada movimento é uma linha JSON anexada ao diário do dia; correções posteriores (romaneio) são
+# linhas do tipo 'atualizacao', sempre identificadas pelo 'ID Movimento', aplicadas na leitura. A planilha
+# formatada é regenerada a partir do diário.
+_EXPORTACOES_PENDENTES = {}
+_TRAVA_EXPORTACAO = threading.Lock()
+_TRAVA_ESCRITA_EXCEL = threading.Lock()
+# PLANILHAS CUJA ÚLTIMA EXPORTAÇÃO FALHOU (CAMINHO -> MOTIVO); SAEM DAQUI NA PRÓXIMA EXPORTAÇÃO BEM-SUCEDIDA.
+_FALHAS_EXPORTACAO_EXCEL = {}
+
+class ErroMovimento(Exception):
+    pass
+
+def _registro_serializavel(dados):
+    registro = {}
+    for chave, valor in dados.items():
+        if isinstance(valor, datetime): registro[chave] = valor.isoformat()
+        elif valor is None or pd.isna(valor): registro[chave] = ''
+        else: registro[chave] = str(valor)
+    return registro
+
+def _serializar_movimento(dados):
+    return json.dumps(_registro_serializavel(dados), ensure_ascii=False)
+
+@contextlib.contextmanager
+def _trava_arquivo(caminho):
+    # TRAVA ENTRE PROCESSOS/TERMINAIS POR ARQUIVO '.lock' CRIADO COM O_EXCL (FUNCIONA EM PASTA DE REDE).
+    # UMA TRAVA MAIS VELHA QUE TRAVA_EXPIRACAO_S É DE UM PROCESSO QUE CAIU E PODE SER REMOVIDA.
+    caminho_trava = caminho + '.lock'
+    limite = time.monotonic() + TRAVA_TIMEOUT_S
+    while True:
+        try:
+            fd = os.open(caminho_trava, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(caminho_trava) > TRAVA_EXPIRACAO_S:
+                    os.remove(caminho_trava)
+                    continue
+            except OSError:
+                pass
+            if time.monotonic() > limite:
+                raise ErroMovimento(f"O arquivo {os.path.basename(caminho)} está em uso por outro terminal. Tente novamente.")
+            time.sleep(0.05)
+    try:
+        os.write(fd, f"{socket.gethostname()} {os.getpid()}".encode('utf-8'))
+        os.close(fd)
+        yield
+    finally:
+        try: os.remove(caminho_trava)
+        except OSError: pass
+
+def _anexar_diario(caminho_diario, registros):
+    linhas = ''.join(_serializar_movimento(r) + '\n' for r in registros)
+    with medir_operacao('gravar_diario', arquivo=os.path.basename(caminho_diario), linhas=len(registros)), _trava_arquivo(caminho_diario):
+        _migrar_excel_legado(caminho_diario)
+        with open(caminho_diario, 'a+b') as f:
+            # UMA QUEDA DURANTE A GRAVAÇÃO PODE DEIXAR A ÚLTIMA LINHA SEM QUEBRA; NÃO EMENDAR NELA.
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n': linhas = '\n' + linhas
+            f.write(linhas.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+
+def _dia_do_diario(caminho_diario):
+    return os.path.basename(os.path.dirname(caminho_diario))
+
+def novo_id_movimento(dia):
+    # O PREFIXO AAAAMMDD É O DIA DO DIÁRIO ONDE O MOVIMENTO ESTÁ GRAVADO; VER localizar_movimento().
+    return f"{dia.replace('-', '')}-{uuid.uuid4().hex[:12]}"
+
+def localizar_movimento(id_movimento):
     try:
+        dia = datetime.strptime(str(id_movimento)[:8], '%Y%m%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+    caminho_diario = os.path.join(_base_dir(), PASTA_LOGS_EXCEL, dia, f"Log_Diario_{dia}{EXTENSAO_DIARIO}")
+    if os.path.exists(caminho_diario): return caminho_diario
+    # DIA JÁ ARQUIVADO: AS CORREÇÕES VÃO PARA O DIÁRIO DE ATUALIZAÇÕES DO MÊS, APLICADO NA LEITURA DO ARQUIVO.
+    caminho_arquivo = _caminho_arquivo_mensal(dia[:7])
+    return _caminho_atualizacoes_arquivo(caminho_arquivo) if os.path.exists(caminho_arquivo) else None
+
+def _garantir_diario(caminho_diario):
+    # MIGRA UMA ÚNICA VEZ O EXCEL LEGADO DO DIA PARA O DIÁRIO, QUE PASSA A SER O REGISTRO OFICIAL.
+    if os.path.exists(caminho_diario): return True
+    if not os.path.exists(_caminho_excel_do_diario(caminho_diario)): return False
+    with _trava_arquivo(caminho_diario):
+        return _migrar_excel_legado(caminho_diario)
+
+def _migrar_excel_legado(caminho_diario):
+    # CHAMADA COM A TRAVA DO DIÁRIO JÁ ADQUIRIDA: OUTRO TERMINAL PODE TER MIGRADO (E ANEXADO) ENQUANTO ESPERÁVAMOS.
+    if os.path.exists(caminho_diario): return True
+    caminho_excel = _caminho_excel_do_diario(caminho_diario)
+    if not os.path.exists(caminho_excel): return False
+    df_legado = pd.read_excel(caminho_excel, sheet_name=NOME_ABA_EXCEL, dtype=DTYPE_COLS)
+    df_legado['Data e Hora'] = pd.to_datetime(df_legado['Data e Hora'], errors='coerce')
+    df_legado = df_legado.sort_values(by='Data e Hora', na_position='first').reset_index(drop=True)
+    prefixo_id = _dia_do_diario(caminho_diario).replace('-', '')
+    ids_legado = pd.Series([f"{prefixo_id}-L{n:05d}" for n in range(len(df_legado))], index=df_legado.index)
+    df_legado['ID Movimento'] = df_legado['ID Movimento'].fillna(ids_legado) if 'ID Movimento' in df_legado else ids_legado
+    linhas = ''.join(_serializar_movimento(r) + '\n' for r in df_legado.to_dict('records'))
+    caminho_tmp = f"{caminho_diario}.{os.getpid()}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as f:
+        f.write(linhas)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(caminho_tmp, caminho_diario)
+    return True
+
+def _ler_diario(caminho_diario, movimentos=None):
+    # 'movimentos' PERMITE APLICAR O DIÁRIO SOBRE MOVIMENTOS JÁ CARREGADOS (ATUALIZAÇÕES DE UM MÊS ARQUIVADO).
+    movimentos = [] if movimentos is None else movimentos
+    por_id = {m['ID Movimento']: m for m in movimentos if m.get('ID Movimento')}
+    if not os.path.exists(caminho_diario): return _df_de_registros(movimentos)
+    with open(caminho_diario, encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha: continue
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue
+            if registro.pop('_tipo', 'movimento') == 'atualizacao':
+                alvo = por_id.get(registro.pop('ID Movimento', None))
+                if alvo is not None: alvo.update(registro)
+            else:
+                movimentos.append(registro)
+                if registro.get('ID Movimento'): por_id[registro['ID Movimento']] = registro
+    return _df_de_registros(movimentos)
+
+def _df_de_registros(movimentos):
+    df = pd.DataFrame(movimentos).reindex(columns=COLUNAS_ORDENADAS)
+    df['Data e Hora'] = pd.to_datetime(df['Data e Hora'], errors='coerce')
+    for col in DTYPE_COLS:
+        df[col] = df[col].where(df[col].notna() & (df[col] != ''))
+    return df
+
+def atualizar_movimento(id_movimento, campos):
+    # CORREÇÃO NO PRÓPRIO REGISTRO: UMA LINHA 'atualizacao' ANEXADA AO DIÁRIO ONDE O MOVIMENTO ESTÁ.
+    cliente = cliente_coordenador()
+    if cliente is not None:
+        cliente.atualizar(id_movimento, campos)
+        return None
+    caminho_diario = localizar_movimento(id_movimento)
+    if caminho_diario is None:
+        raise ErroMovimento(f"Movimento {id_movimento} não encontrado.")
+    atualizacao = {'_tipo': 'atualizacao', 'ID Movimento': id_movimento}
+    atualizacao.update(campos)
+    _anexar_diario(caminho_diario, [atualizacao])
+    _agendar_exportacao_excel(caminho_diario)
+    return caminho_diario
+
+def _excel_desatualizado(caminho_diario):
+    caminho_excel = _caminho_excel_do_diario(caminho_diario)
+    if not os.path.exists(caminho_excel): return True
+    return os.path.getmtime(caminho_excel) < os.path.getmtime(caminho_diario)
+
+def exportar_diario_para_excel(caminho_diario):
+    caminho_excel = _caminho_excel_do_diario(caminho_diario)
+    caminho_tmp = os.path.join(os.path.dirname(caminho_excel), f"~${os.getpid()}_{os.path.basename(caminho_excel)}")
+    with _TRAVA_ESCRITA_EXCEL:
+        try:
+            salvar_planilha(_ler_diario(caminho_diario), caminho_tmp)
+            os.replace(caminho_tmp, caminho_excel)
+        except Exception as e:
+            # PLANILHA ABERTA NO EXCEL (WINDOWS BLOQUEIA A TROCA) OU DISCO CHEIO: A CÓPIA TEMPORÁRIA NÃO FICA NA PASTA E
+            # A PLANILHA ANTIGA É MARCADA COMO DESATUALIZADA. O DIÁRIO, QUE É O REGISTRO OFICIAL, NÃO É AFETADO.
+            with contextlib.suppress(OSError): os.remove(caminho_tmp)
+            with _TRAVA_EXPORTACAO: _FALHAS_EXPORTACAO_EXCEL[caminho_excel] = str(e)
+            raise
+    with _TRAVA_EXPORTACAO: _FALHAS_EXPORTACAO_EXCEL.pop(caminho_excel, None)
+    return caminho_excel
+
+def falhas_exportacao_excel():
+    with _TRAVA_EXPORTACAO:
+        return dict(_FALHAS_EXPORTACAO_EXCEL)
+
+def _avisar_falha_exportacao(caminho_diario):
+    if isinstance(sys.exc_info()[1], PermissionError):
+        print(f"AVISO: {os.path.basename(_caminho_excel_do_diario(caminho_diario))} está aberto em outro programa; "
+              "a planilha ficou desatualizada até a próxima exportação.", file=sys.stderr)
+    else:
+        traceback.print_exc()
+
+def _exportar_agendada(caminho_diario, timer):
+    with _TRAVA_EXPORTACAO:
+        if _EXPORTACOES_PENDENTES.get(caminho_diario) is not timer: return
+        del _EXPORTACOES_PENDENTES[caminho_diario]
+    try:
+        exportar_diario_para_excel(caminho_diario)
+    except Exception:
+        _avisar_falha_exportacao(caminho_diario)
+
+def _agendar_exportacao_excel(caminho_diario):
+    # AGRUPA RAJADAS DE MOVIMENTOS: A PLANILHA É REESCRITA UMA VEZ, ALGUNS SEGUNDOS APÓS O ÚLTIMO EVENTO.
+    # MESES ARQUIVADOS NÃO TÊM PLANILHA DIÁRIA; A EXPORTAÇÃO POR PERÍODO COBRE ESSES DIAS.
+    if _eh_do_arquivo_morto(caminho_diario): return
+    with _TRAVA_EXPORTACAO:
+        anterior = _EXPORTACOES_PENDENTES.pop(caminho_diario, None)
+        if anterior is not None: anterior.cancel()
+        timer = threading.Timer(ATRASO_EXPORTACAO_EXCEL_S, lambda: _exportar_agendada(caminho_diario, timer))
+        timer.daemon = True
+        _EXPORTACOES_PENDENTES[caminho_diario] = timer
+        timer.start()
+
+def exportar_pendentes_excel():
+    with _TRAVA_EXPORTACAO:
+        pendentes = list(_EXPORTACOES_PENDENTES.items())
+        _EXPORTACOES_PENDENTES.clear()
+    for caminho_diario, timer in pendentes:
+        timer.cancel()
         try:
-            df_existente = pd.read_excel(caminho_arquivo, sheet_name=NOME_ABA_EXCEL, dtype=DTYPE_COLS)
-        except (FileNotFoundError, ValueError):
-            df_existente = pd.DataFrame(columns=COLUNAS_ORDENADAS).astype(DTYPE_COLS)
-        df_atualizado = pd.concat([df_existente, novo_df], ignore_index=True)
-        salvar_planilha(df_atualizado, caminho_arquivo)
+            exportar_diario_para_excel(caminho_diario)
+        except Exception:
+            _avisar_falha_exportacao(caminho_diario)
+
+def _gravar_movimento(dados_base):
+    # COM COORDENADOR CONFIGURADO E NO AR, ELE É O ÚNICO QUE GRAVA; SENÃO, GRAVAÇÃO DIRETA SOB TRAVA DE ARQUIVO.
+    cliente = cliente_coordenador()
+    if cliente is not None:
+        return cliente.registrar(dados_base)
+    caminho_diario = get_caminho_diario()
+    dados = dict(dados_base)
+    dados['ID Movimento'] = novo_id_movimento(_dia_do_diario(caminho_diario))
+    _anexar_diario(caminho_diario, [dados])
+    _agendar_exportacao_excel(caminho_diario)
+    registrar_sugestoes(dados)
+    return dados['ID Movimento']
+
+def registrar_movimento(dados_base=None):
+    try:
+        _gravar_movimento(dados_base)
         return True
     except Exception:
         traceback.print_exc()
@@ -156,25 +829,1448 @@ def get_todos_logs_filtrados():
     arquivos_validos = [f for f in todos_arquivos_brutos if not os.path.basename(f).startswith('~')]
     return sorted(arquivos_validos, reverse=True)
 
+def get_fontes_historico():
+    # DIÁRIOS SÃO A FONTE OFICIAL; O EXCEL SÓ É LIDO NOS DIAS AINDA NÃO MIGRADOS PARA O DIÁRIO.
+    # MESES FECHADOS VÊM DO ARQUIVO MORTO (UM ARQUIVO POR MÊS), JÁ SEM AS PASTAS DIÁRIAS.
+    caminho_busca = os.path.join(_base_dir(), PASTA_LOGS_EXCEL, "**", f"Log_Diario_*{EXTENSAO_DIARIO}")
+    diarios = glob.glob(caminho_busca, recursive=True)
+    dias_com_diario = {os.path.splitext(f)[0] for f in diarios}
+    excel_legado = [f for f in get_todos_logs_filtrados() if os.path.splitext(f)[0] not in dias_com_diario]
+    arquivos_mensais = glob.glob(os.path.join(_base_dir(), PASTA_LOGS_EXCEL, PASTA_ARQUIVO_MORTO, f"Arquivo_*{EXTENSAO_ARQUIVO_MENSAL}"))
+    return sorted(diarios + excel_legado, reverse=True) + sorted(arquivos_mensais, reverse=True)
+
+def _ler_fonte(caminho, colunas=None):
+    # 'colunas' LIMITA O QUE FICA EM MEMÓRIA (NO EXCEL, O QUE É CONVERTIDO); None = TODAS AS DE COLUNAS_ORDENADAS.
+    colunas = COLUNAS_ORDENADAS if colunas is None else list(colunas)
+    with medir_operacao('ler', arquivo=os.path.basename(caminho), bytes=os.path.getsize(caminho)) as detalhes:
+        if caminho.endswith(EXTENSAO_DIARIO):
+            df = _ler_diario(caminho)
+        elif caminho.endswith(EXTENSAO_ARQUIVO_MENSAL):
+            df = _ler_arquivo_mensal(caminho)
+        else:
+            df = pd.read_excel(caminho, sheet_name=NOME_ABA_EXCEL, dtype=DTYPE_COLS, usecols=lambda c: c in colunas)
+        df = df.reindex(columns=colunas)
+        detalhes['linhas'] = len(df)
+    return df
+
+# --- LEITURA PARALELA DO HISTÓRICO ---
+class _FalhaLeitura:
+    # RESULTADO DE UMA LEITURA QUE DEU ERRO (ARQUIVO EM USO, REDE FORA, CORROMPIDO). DIFERENTE DE None (ARQUIVO
+    # VAZIO), NÃO PODE SER GUARDADO NOS ÍNDICES: O ARQUIVO TEM DE SER RELIDO NA PRÓXIMA CONSULTA.
+    def __init__(self, erro):
+        self.erro = erro
+
+def _ler_log_seguro(caminho, processar=None, colunas=None):
+    # ARQUIVOS VAZIOS OU TEMPORÁRIOS DO EXCEL (~$) DEVOLVEM None; ERROS DE LEITURA DEVOLVEM _FalhaLeitura.
+    if os.path.basename(caminho).startswith('~'): return None
+    try:
+        if os.path.getsize(caminho) == 0: return None
+        df = _ler_fonte(caminho, colunas)
+        if df is None or df.empty: return None
+        return processar(df) if processar else df
+    except Exception as e:
+        return _FalhaLeitura(f"{type(e).__name__}: {e}")
+
+def _num_workers_leitura(max_workers=None):
+    workers = max_workers or MAX_WORKERS_LEITURA or os.environ.get('M4_WORKERS_LEITURA') or os.cpu_count() or 1
+    try:
+        return max(1, int(workers))
+    except ValueError:
+        return os.cpu_count() or 1
+
+def carregar_logs_paralelo(arquivos=None, max_workers=None, processar=None, colunas=None):
+    # DEVOLVE [(caminho, df / None / _FalhaLeitura)] NA MESMA ORDEM DE 'arquivos'. 'processar' PRECISA SER UMA FUNÇÃO DE
+    # NÍVEL DE MÓDULO (É ENVIADA AOS PROCESSOS) E É APLICADA A CADA DataFrame DENTRO DO PRÓPRIO WORKER.
+    arquivos = get_todos_logs_filtrados() if arquivos is None else list(arquivos)
+    leitor = functools.partial(_ler_log_seguro, processar=processar, colunas=None if colunas is None else tuple(colunas))
+    workers = min(_num_workers_leitura(max_workers), len(arquivos))
+    peso = sum(DIAS_POR_ARQUIVO_MENSAL if f.endswith(EXTENSAO_ARQUIVO_MENSAL) else 1 for f in arquivos)
+    if workers > 1 and peso >= MIN_ARQUIVOS_PARALELO:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(arquivos) // (workers * 4))
+                medido = functools.partial(_com_metricas_do_worker, leitor, _METRICAS['ativas'])
+                lidos = []
+                for caminho, (df, metricas) in zip(arquivos, pool.map(medido, arquivos, chunksize=chunksize)):
+                    _registrar_metricas_do_worker(metricas)
+                    lidos.append((caminho, df))
+                return lidos
+        except (BrokenProcessPool, OSError):
+            traceback.print_exc()
+    return [(f, leitor(f)) for f in arquivos]
+
+# --- CARGA COMPACTA DO HISTÓRICO ---
+def compactar_df(df, colunas=None):
+    # PODA AS COLUNAS (SE PEDIDO) E CONVERTE AS DE POUCOS VALORES DISTINTOS PARA 'category' (MODO_COMPACTO).
+    if colunas is not None: df = df.reindex(columns=list(colunas))
+    if not MODO_COMPACTO or df.empty: return df
+    convertidas = {}
+    for col in df.columns:
+        if col in COLUNAS_NUNCA_CATEGORICAS or isinstance(df[col].dtype, pd.CategoricalDtype): continue
+        if col not in COLUNAS_CATEGORICAS:
+            preenchidos = df[col].count()
+            if not preenchidos or df[col].nunique() > preenchidos * FRACAO_MAX_CATEGORICA: continue
+        convertidas[col] = df[col].astype('category')
+    return df.assign(**convertidas) if convertidas else df
+
+def descompactar_df(df):
+    # VOLTA AS CATEGÓRICAS A TEXTO, PARA RESULTADOS PEQUENOS QUE SEGUEM COMO REGISTROS (EX.: SAÍDAS DO ROMANEIO EM LOTE).
+    convertidas = {col: df[col].astype(object) for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return df.assign(**convertidas) if convertidas else df
+
+def concatenar_compacto(dfs):
+    # pd.concat DE CATEGÓRICAS COM CATEGORIAS DIFERENTES VOLTA PARA TEXTO: UNIFICA AS CATEGORIAS ANTES DE JUNTAR.
+    dfs = [df for df in dfs if df is not None and not df.empty]
+    if not dfs: return pd.DataFrame()
+    for col in dfs[0].columns:
+        if not all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in dfs): continue
+        categorias = functools.reduce(lambda a, b: a.union(b), (df[col].cat.categories for df in dfs))
+        dfs = [df if df[col].cat.categories.equals(categorias) else df.assign(**{col: df[col].cat.set_categories(categorias)})
+               for df in dfs]
+    return pd.concat(dfs, ignore_index=True)
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024) if df is not None else 0.0
+
+def _verificar_teto_memoria(df, operacao):
+    memoria = memoria_mb(df)
+    if memoria > LIMITE_MEMORIA_HISTORICO_MB:
+        print(f"Aviso: {operacao} ocupa {memoria:.0f} MB, acima do teto de {LIMITE_MEMORIA_HISTORICO_MB} MB "
+              f"(LIMITE_MEMORIA_HISTORICO_MB). Considere arquivar meses antigos.", file=sys.stderr)
+    return memoria
+
+def _lotes_de_fontes(arquivos, arquivos_por_lote):
+    # ATÉ 'arquivos_por_lote' ARQUIVOS POR LOTE, NA ORDEM RECEBIDA. MESES ARQUIVADOS (~30 DIAS CADA) FICAM EM LOTES
+    # PRÓPRIOS, LIMITADOS TAMBÉM A LINHAS_POR_LOTE_ARQUIVO MOVIMENTOS, PARA O LOTE CABER NO TETO DE MEMÓRIA E AINDA SER
+    # LIDO EM PARALELO. UM MÊS MAIOR QUE O LIMITE VAI SOZINHO.
+    lote, linhas, mensal = [], 0, False
+    for caminho in arquivos:
+        eh_mensal = caminho.endswith(EXTENSAO_ARQUIVO_MENSAL)
+        linhas_fonte = _linhas_arquivo_mensal(caminho) if eh_mensal else 0
+        if lote and (eh_mensal != mensal or len(lote) >= arquivos_por_lote or linhas + linhas_fonte > LINHAS_POR_LOTE_ARQUIVO):
+            yield lote
+            lote, linhas = [], 0
+        lote.append(caminho)
+        linhas += linhas_fonte
+        mensal = eh_mensal
+    if lote: yield lote
+
+def iterar_historico(colunas=None, arquivos=None, arquivos_por_lote=ARQUIVOS_POR_LOTE, max_workers=None, com_arquivo=False):
+    # LÊ O HISTÓRICO EM LOTES DE ARQUIVOS E DEVOLVE UM DataFrame COMPACTO POR LOTE; SÓ UM LOTE CRU EXISTE POR VEZ.
+    arquivos = get_fontes_historico() if arquivos is None else list(arquivos)
+    for lote in _lotes_de_fontes(arquivos, arquivos_por_lote):
+        lidos = carregar_logs_paralelo(lote, max_workers=max_workers, processar=compactar_df, colunas=colunas)
+        partes = []
+        for caminho, df in lidos:
+            if isinstance(df, _FalhaLeitura):
+                print(f"Aviso: {os.path.basename(caminho)} não pôde ser lido ({df.erro}); ficou fora do resultado.", file=sys.stderr)
+                continue
+            if df is None: continue
+            if com_arquivo: df = df.assign(Arquivo=pd.Categorical([os.path.basename(caminho)] * len(df)))
+            partes.append(df)
+        if partes: yield concatenar_compacto(partes)
+
+def carregar_historico(colunas=None, filtro=None, arquivos=None, max_workers=None, com_arquivo=False):
+    # HISTÓRICO COMPLETO EM MODO COMPACTO. 'filtro' (DataFrame -> DataFrame) É APLICADO A CADA LOTE ANTES DE ACUMULAR.
+    with medir_operacao('historico', colunas=len(colunas) if colunas else len(COLUNAS_ORDENADAS)) as detalhes:
+        lotes = []
+        for lote in iterar_historico(colunas, arquivos, max_workers=max_workers, com_arquivo=com_arquivo):
+            lotes.append(filtro(lote) if filtro else lote)
+        df = concatenar_compacto(lotes)
+        if df.empty: df = pd.DataFrame(columns=(list(colunas) if colunas else COLUNAS_ORDENADAS) + (['Arquivo'] if com_arquivo else []))
+        detalhes['linhas'] = len(df)
+        detalhes['memoria_mb'] = round(_verificar_teto_memoria(df, 'O histórico carregado'), 1)
+        return df
+
+# --- ÍNDICE INCREMENTAL DO PÁTIO ---
+# Cada arquivo de log é reduzido ao último movimento de cada contêiner e guardado junto com a
+# assinatura (mtime, tamanho) do arquivo. Em cada consulta só os arquivos novos ou alterados são relidos.
+# A 'trava' de cada índice cobre reconciliação, gravação e leitura do dicionário: o aquecimento da abertura e a
+# janela do pátio podem consultar o mesmo índice ao mesmo tempo, em threads diferentes.
+_INDICE_PATIO_MEMORIA = {'value': None, 'trava': threading.RLock()}
+
+def _caminho_indice_patio():
+    return os.path.join(_base_dir(), PASTA_LOGS_EXCEL, ARQUIVO_INDICE_PATIO)
+
+def _assinatura_arquivo(caminho):
+    info = os.stat(caminho)
+    if caminho.endswith(EXTENSAO_ARQUIVO_MENSAL):
+        # O MÊS ARQUIVADO MUDA QUANDO O SEU DIÁRIO DE ATUALIZAÇÕES RECEBE LINHAS (SAÍDA DE UMA ENTRADA ANTIGA).
+        try:
+            atualizacoes = os.stat(_caminho_atualizacoes_arquivo(caminho))
+            return (info.st_mtime_ns, info.st_size, atualizacoes.st_mtime_ns, atualizacoes.st_size)
+        except OSError:
+            pass
+    return (info.st_mtime_ns, info.st_size)
+
+def _ultimos_movimentos(df):
+    df = df.copy()
+    df['Data e Hora'] = pd.to_datetime(df['Data e Hora'], errors='coerce')
+    df.dropna(subset=['Data e Hora', 'Nº do Contêiner'], inplace=True)
+    df.sort_values(by='Data e Hora', ascending=False, inplace=True)
+    return df.drop_duplicates(subset='Nº do Contêiner', keep='first')
+
+def _carregar_indice(caminho, versao, memoria):
+    if memoria['value'] is not None:
+        return memoria['value']
+    indice = None
+    try:
+        with open(caminho, 'rb') as f:
+            indice = pickle.load(f)
+    except Exception:
+        indice = None
+    if not isinstance(indice, dict) or indice.get('versao') != versao:
+        indice = {'versao': versao, 'arquivos': {}}
+    memoria['value'] = indice
+    return indice
+
+def _salvar_indice(caminho, indice):
+    caminho_tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho_tmp, 'wb') as f:
+            pickle.dump(indice, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(caminho_tmp, caminho)
+    except Exception:
+        traceback.print_exc()
+        if os.path.exists(caminho_tmp): os.remove(caminho_tmp)
+
+def _reconciliar_indice(indice, processar, operacao, colunas=None):
+    # RELÊ SÓ AS FONTES NOVAS OU ALTERADAS (ASSINATURA DIFERENTE) E ESQUECE AS QUE SUMIRAM. DEVOLVE SE MUDOU ALGO.
+    registros = indice['arquivos']
+    pasta_base = _base_dir()
+    alterado = False
+    vistos = set()
+    alterados = []
+    for f in get_fontes_historico():
+        try:
+            assinatura = _assinatura_arquivo(f)
+        except OSError:
+            continue
+        chave = os.path.relpath(f, pasta_base)
+        vistos.add(chave)
+        registro = registros.get(chave)
+        if registro is None or registro[0] != assinatura: alterados.append((f, chave, assinatura))
+    if alterados:
+        with medir_operacao(operacao, arquivos_relidos=len(alterados)):
+            for inicio in range(0, len(alterados), ARQUIVOS_POR_LOTE):
+                lote = alterados[inicio:inicio + ARQUIVOS_POR_LOTE]
+                lidos = carregar_logs_paralelo([f for f, _, _ in lote], processar=processar, colunas=colunas)
+                for (_, chave, assinatura), (_, df) in zip(lote, lidos):
+                    if isinstance(df, _FalhaLeitura):
+                        # FICA FORA DO ÍNDICE (E DO ARQUIVO .pkl) PARA SER RELIDO NA PRÓXIMA CONSULTA.
+                        registros.pop(chave, None)
+                        continue
+                    registros[chave] = (assinatura, df)
+        alterado = True
+    for chave in [c for c in registros if c not in vistos]:
+        del registros[chave]
+        alterado = True
+    return alterado
+
+def _carregar_indice_patio():
+    return _carregar_indice(_caminho_indice_patio(), VERSAO_INDICE_PATIO, _INDICE_PATIO_MEMORIA)
+
+def _salvar_indice_patio(indice):
+    _salvar_indice(_caminho_indice_patio(), indice)
+
+def atualizar_indice_patio():
+    with _INDICE_PATIO_MEMORIA['trava']:
+        indice = _carregar_indice_patio()
+        if _reconciliar_indice(indice, _ultimos_movimentos, 'indice_patio'): _salvar_indice_patio(indice)
+        return indice
+
 def get_containers_no_patio():
-    todos_arquivos = get_todos_logs_filtrados()
-    if not todos_arquivos: return pd.DataFrame()
-    lista_dfs = []
-    for f in todos_arquivos:
-        if os.path.getsize(f) > 0:
+    with medir_operacao('patio') as detalhes:
+        cliente = cliente_coordenador()
+        if cliente is not None:
+            # O COORDENADOR ENVIA O PÁTIO E CADA ALTERAÇÃO; NÃO HÁ VARREDURA DA PASTA NESTE TERMINAL.
+            no_patio = cliente.containers_no_patio()
+            detalhes['linhas'] = len(no_patio)
+            detalhes['origem'] = 'coordenador'
+            return no_patio
+        with _INDICE_PATIO_MEMORIA['trava']:
+            indice = atualizar_indice_patio()
+            lista_dfs = [df for _, df in indice['arquivos'].values() if df is not None and not df.empty]
+            if not lista_dfs: return pd.DataFrame()
+            with medir_operacao('concat', arquivos=len(lista_dfs)) as detalhes_concat:
+                df_total = pd.concat(lista_dfs, ignore_index=True)
+                detalhes_concat['memoria_mb'] = round(_verificar_teto_memoria(df_total, 'O índice do pátio'), 1)
+        df_total.sort_values(by='Data e Hora', ascending=False, inplace=True)
+        ultimo_movimento = df_total.drop_duplicates(subset='Nº do Contêiner', keep='first')
+        no_patio = ultimo_movimento[ultimo_movimento['Status'] == 'Entrada']
+        detalhes['linhas'] = len(no_patio)
+        return no_patio
+
+# --- COORDENADOR DE GRAVAÇÃO (VÁRIOS TERMINAIS) ---
+# Um processo por instalação ("python M4_logistica.py coordenador") é o único que grava no diário. Os terminais
+# enviam os movimentos por TCP (uma mensagem JSON por linha); uma thread grava em lote o que chegou enquanto a
+# gravação anterior acontecia (um fsync por diário por lote) e só então confirma. Cada terminal assinante recebe o
+# pátio ao conectar e depois cada alteração, então não precisa varrer a pasta de logs.
+_MODO_COORDENADOR = {'servidor': False}
+_CLIENTE_COORDENADOR = {'value': None, 'proxima_tentativa': 0.0}
+_TRAVA_CLIENTE_COORDENADOR = threading.Lock()
+
+def _token_coordenador():
+    return os.environ.get('M4_TOKEN_COORDENADOR') or TOKEN_COORDENADOR
+
+def _eh_endereco_local(host):
+    if host == 'localhost': return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def _enviar_mensagem(sock, trava, mensagem):
+    dados = (json.dumps(mensagem, ensure_ascii=False) + '\n').encode('utf-8')
+    with trava:
+        sock.sendall(dados)
+
+def _aplicar_evento_patio(patio, evento):
+    # MESMA REGRA NO COORDENADOR E NOS TERMINAIS: ÚLTIMO MOVIMENTO 'Entrada' DE CADA CONTÊINER FICA NO PÁTIO.
+    tipo = evento['evento']
+    if tipo == 'patio':
+        patio.clear()
+        patio.update((r['Nº do Contêiner'], r) for r in evento['containers'])
+    elif tipo == 'movimento':
+        registro = evento['registro']
+        if registro.get('Status') == 'Entrada': patio[registro['Nº do Contêiner']] = registro
+        else: patio.pop(registro.get('Nº do Contêiner'), None)
+    elif tipo == 'atualizacao':
+        campos = {k: v for k, v in evento['registro'].items() if k not in ('_tipo', 'ID Movimento')}
+        for registro in patio.values():
+            if registro.get('ID Movimento') == evento['registro']['ID Movimento']: registro.update(campos)
+
+class _ConexaoCoordenador:
+    def __init__(self, sock):
+        self.sock = sock
+        self.trava = threading.Lock()
+
+    def enviar(self, mensagem):
+        _enviar_mensagem(self.sock, self.trava, mensagem)
+
+class CoordenadorMovimentos:
+    def __init__(self):
+        self.fila = queue.Queue()
+        self.trava = threading.Lock()
+        self.assinantes = set()
+        self.patio = {}
+
+    def carregar_patio(self):
+        df = get_containers_no_patio()
+        registros = [] if df.empty else [_registro_serializavel(r) for r in df[COLUNAS_ORDENADAS].to_dict('records')]
+        patio = {r['Nº do Contêiner']: r for r in registros}
+        with self.trava:
+            if patio == self.patio: return
+            self.patio = patio
+        # ALGUÉM GRAVOU SEM PASSAR PELO COORDENADOR (IMPORTAÇÃO, TERMINAL SEM CONEXÃO): REENVIA O PÁTIO INTEIRO.
+        self.difundir({'evento': 'patio', 'containers': registros})
+
+    def difundir(self, evento):
+        with self.trava:
+            assinantes = list(self.assinantes)
+        for conexao in assinantes:
             try:
-                df = pd.read_excel(f, sheet_name=NOME_ABA_EXCEL, dtype=DTYPE_COLS)
-                if df is not None and not df.empty:
-                    lista_dfs.append(df)
-            except Exception:
+                conexao.enviar(evento)
+            except OSError:
+                self.desconectar(conexao)
+
+    def assinar(self, conexao):
+        with self.trava:
+            self.assinantes.add(conexao)
+            containers = list(self.patio.values())
+        conexao.enviar({'evento': 'patio', 'containers': containers})
+
+    def desconectar(self, conexao):
+        with self.trava:
+            self.assinantes.discard(conexao)
+
+    def atender(self, conexao, pedido):
+        op = pedido.get('op')
+        if op in ('registrar', 'atualizar'):
+            self.fila.put((conexao, pedido))
+        elif op == 'assinar':
+            self.assinar(conexao)
+        elif op in ('ping', 'autenticar'):
+            conexao.enviar({'id': pedido.get('id'), 'ok': True})
+        else:
+            conexao.enviar({'id': pedido.get('id'), 'ok': False, 'erro': f"Operação desconhecida: {op}"})
+
+    def laco_gravacao(self):
+        # A RESSINCRONIA É PERIÓDICA MESMO COM O PORTÃO MOVIMENTADO: GRAVAÇÕES QUE NÃO PASSAM PELO COORDENADOR
+        # (IMPORTAÇÃO EM LOTE, TERMINAL SEM CONEXÃO) CHEGAM AOS TERMINAIS EM ATÉ INTERVALO_RESSINCRONIA_S.
+        proxima_ressincronia = time.monotonic() + INTERVALO_RESSINCRONIA_S
+        while True:
+            try:
+                lote = [self.fila.get(timeout=max(0.0, proxima_ressincronia - time.monotonic()))]
+            except queue.Empty:
+                lote = []
+            while lote and len(lote) < MAX_LOTE_GRAVACAO:
+                try: lote.append(self.fila.get_nowait())
+                except queue.Empty: break
+            if lote: self.confirmar_lote(lote)
+            if time.monotonic() >= proxima_ressincronia:
+                try: self.carregar_patio()
+                except Exception: traceback.print_exc()
+                proxima_ressincronia = time.monotonic() + INTERVALO_RESSINCRONIA_S
+
+    def _responder(self, conexao, pedido, **resposta):
+        try:
+            conexao.enviar({'id': pedido.get('id'), **resposta})
+        except OSError:
+            self.desconectar(conexao)
+
+    def confirmar_lote(self, lote):
+        por_diario = {}
+        for conexao, pedido in lote:
+            try:
+                if pedido['op'] == 'registrar':
+                    caminho_diario = get_caminho_diario()
+                    registro = dict(pedido['dados'])
+                    registro['ID Movimento'] = novo_id_movimento(_dia_do_diario(caminho_diario))
+                else:
+                    caminho_diario = localizar_movimento(pedido['id_movimento'])
+                    if caminho_diario is None:
+                        raise ErroMovimento(f"Movimento {pedido['id_movimento']} não encontrado.")
+                    registro = {'_tipo': 'atualizacao', 'ID Movimento': pedido['id_movimento']}
+                    registro.update(pedido['campos'])
+            except Exception as e:
+                self._responder(conexao, pedido, ok=False, erro=str(e))
+                continue
+            por_diario.setdefault(caminho_diario, []).append((conexao, pedido, registro))
+        for caminho_diario, itens in por_diario.items():
+            try:
+                with medir_operacao('lote_coordenador', movimentos=len(itens)):
+                    _anexar_diario(caminho_diario, [registro for _, _, registro in itens])
+            except Exception as e:
+                traceback.print_exc()
+                for conexao, pedido, _ in itens:
+                    self._responder(conexao, pedido, ok=False, erro=str(e))
                 continue
-    if not lista_dfs: return pd.DataFrame()
-    df_total = pd.concat(lista_dfs, ignore_index=True)
-    df_total['Data e Hora'] = pd.to_datetime(df_total['Data e Hora'], errors='coerce')
-    df_total.dropna(subset=['Data e Hora', 'Nº do Contêiner'], inplace=True)
-    df_total.sort_values(by='Data e Hora', ascending=False, inplace=True)
-    ultimo_movimento = df_total.drop_duplicates(subset='Nº do Contêiner', keep='first')
-    return ultimo_movimento[ultimo_movimento['Status'] == 'Entrada'].copy()
+            _agendar_exportacao_excel(caminho_diario)
+            for conexao, pedido, registro in itens:
+                evento = {'evento': 'movimento' if pedido['op'] == 'registrar' else 'atualizacao', 'registro': registro}
+                with self.trava:
+                    _aplicar_evento_patio(self.patio, evento)
+                self._responder(conexao, pedido, ok=True, id_movimento=registro['ID Movimento'])
+                self.difundir(evento)
+
+class _ManipuladorCoordenador(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordenador = self.server.coordenador
+        conexao = _ConexaoCoordenador(self.connection)
+        token = _token_coordenador()
+        autenticado = not token
+        try:
+            for linha in self.rfile:
+                try:
+                    pedido = json.loads(linha)
+                except ValueError:
+                    continue
+                if not autenticado:
+                    # COM SENHA CONFIGURADA, A PRIMEIRA MENSAGEM DA CONEXÃO PRECISA SER 'autenticar' COM A SENHA CERTA.
+                    autenticado = pedido.get('op') == 'autenticar' and hmac.compare_digest(str(pedido.get('token', '')), token)
+                    if not autenticado:
+                        print(f"Conexão recusada de {self.client_address[0]}: senha do coordenador ausente ou errada.", file=sys.stderr)
+                        conexao.enviar({'id': pedido.get('id'), 'ok': False, 'erro': "Terminal não autorizado pelo coordenador."})
+                        break
+                coordenador.atender(conexao, pedido)
+        except OSError:
+            pass
+        finally:
+            coordenador.desconectar(conexao)
+
+class _ServidorCoordenador(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def executar_coordenador(host='127.0.0.1', porta=PORTA_COORDENADOR):
+    if not _eh_endereco_local(host) and not _token_coordenador():
+        print(f"Para escutar em {host} (fora desta máquina) configure a senha em M4_TOKEN_COORDENADOR "
+              f"(a mesma em todos os terminais).", file=sys.stderr)
+        return 1
+    _MODO_COORDENADOR['servidor'] = True
+    coordenador = CoordenadorMovimentos()
+    coordenador.carregar_patio()
+    servidor = _ServidorCoordenador((host, porta), _ManipuladorCoordenador)
+    servidor.coordenador = coordenador
+    threading.Thread(target=coordenador.laco_gravacao, name='m4_gravacao_coordenador', daemon=True).start()
+    print(f"Coordenador M4 em {host}:{servidor.server_address[1]} ({len(coordenador.patio)} contêiner(es) no pátio).", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        exportar_pendentes_excel()
+    return 0
+
+class ClienteCoordenador:
+    def __init__(self, host, porta, timeout=TIMEOUT_COORDENADOR_S):
+        self.timeout = timeout
+        self.sock = socket.create_connection((host, porta), timeout=timeout)
+        self.sock.settimeout(None)
+        self.trava = threading.Lock()
+        self.sequencia = itertools.count(1)
+        self.pendentes = {}
+        self.patio = {}
+        self.trava_patio = threading.Lock()
+        self.patio_recebido = threading.Event()
+        self.conectado = True
+        threading.Thread(target=self._laco_leitura, name='m4_cliente_coordenador', daemon=True).start()
+        if _token_coordenador():
+            try:
+                self._requisitar({'op': 'autenticar', 'token': _token_coordenador()})
+            except ErroMovimento as e:
+                self.fechar()
+                raise OSError(str(e)) from e
+        _enviar_mensagem(self.sock, self.trava, {'op': 'assinar'})
+        if not self.patio_recebido.wait(timeout):
+            self.fechar()
+            raise OSError("O coordenador não enviou o estado do pátio.")
+
+    def _laco_leitura(self):
+        try:
+            with self.sock.makefile('rb') as arquivo:
+                for linha in arquivo:
+                    mensagem = json.loads(linha)
+                    if 'evento' in mensagem:
+                        with self.trava_patio:
+                            _aplicar_evento_patio(self.patio, mensagem)
+                        self.patio_recebido.set()
+                        if mensagem['evento'] == 'movimento': registrar_sugestoes(mensagem['registro'])
+                    else:
+                        futuro = self.pendentes.pop(mensagem.get('id'), None)
+                        if futuro is not None: futuro.set_result(mensagem)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.conectado = False
+            for futuro in list(self.pendentes.values()):
+                futuro.set_exception(ErroMovimento("Conexão com o coordenador perdida; confira o registro antes de repetir."))
+            self.pendentes.clear()
+
+    def _requisitar(self, pedido):
+        if not self.conectado:
+            raise ErroMovimento("Sem conexão com o coordenador.")
+        pedido['id'] = next(self.sequencia)
+        futuro = Future()
+        self.pendentes[pedido['id']] = futuro
+        try:
+            _enviar_mensagem(self.sock, self.trava, pedido)
+            resposta = futuro.result(timeout=self.timeout)
+        except (OSError, TempoEsgotadoFuturo) as e:
+            self.pendentes.pop(pedido['id'], None)
+            raise ErroMovimento(f"Sem resposta do coordenador; confira o registro antes de repetir. ({e})") from e
+        if not resposta.get('ok'):
+            raise ErroMovimento(resposta.get('erro') or "O coordenador recusou a gravação.")
+        return resposta
+
+    def registrar(self, dados):
+        return self._requisitar({'op': 'registrar', 'dados': _registro_serializavel(dados)})['id_movimento']
+
+    def atualizar(self, id_movimento, campos):
+        self._requisitar({'op': 'atualizar', 'id_movimento': id_movimento, 'campos': _registro_serializavel(campos)})
+
+    def containers_no_patio(self):
+        with self.trava_patio:
+            registros = [dict(r) for r in self.patio.values()]
+        if not registros: return pd.DataFrame()
+        df = _df_de_registros(registros)
+        return df.sort_values(by='Data e Hora', ascending=False)
+
+    def fechar(self):
+        self.conectado = False
+        try: self.sock.close()
+        except OSError: pass
+
+def cliente_coordenador():
+    # None = GRAVAÇÃO LOCAL. SE O COORDENADOR CONFIGURADO NÃO RESPONDE, TENTA DE NOVO SÓ APÓS INTERVALO_RECONEXAO_S.
+    endereco = os.environ.get('M4_COORDENADOR') or ENDERECO_COORDENADOR
+    if not endereco or _MODO_COORDENADOR['servidor']: return None
+    with _TRAVA_CLIENTE_COORDENADOR:
+        cliente = _CLIENTE_COORDENADOR['value']
+        if cliente is not None and cliente.conectado: return cliente
+        _CLIENTE_COORDENADOR['value'] = None
+        if time.monotonic() < _CLIENTE_COORDENADOR['proxima_tentativa']: return None
+        host, _, porta = endereco.rpartition(':')
+        try:
+            cliente = ClienteCoordenador(host or 'localhost', int(porta or PORTA_COORDENADOR))
+        except (OSError, ValueError) as e:
+            print(f"Coordenador {endereco} indisponível ({e}); gravando direto no diário com trava de arquivo.", file=sys.stderr)
+            _CLIENTE_COORDENADOR['proxima_tentativa'] = time.monotonic() + INTERVALO_RECONEXAO_S
+            return None
+        _CLIENTE_COORDENADOR['value'] = cliente
+        return cliente
+
+# --- PROCESSAMENTO DE SAÍDA E ROMANEIO ---
+# O layout de uma página fica em _desenhar_romaneio(). No lote, todas as páginas compartilham o mesmo FPDF (fontes
+# embutidas uma vez) e, nos arquivos individuais, os romaneios são divididos entre processos.
+def _novo_pdf_romaneio():
+    pdf = FPDF(); pdf.set_auto_page_break(auto=True, margin=15)
+    return pdf
+
+def _desenhar_romaneio(pdf, dados_finais_saida):
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.cell(0, 10, "Romaneio de Transporte", new_x="LMARGIN", new_y="NEXT", align="C")
+    pdf.ln(10)
+    for rotulo, campo in CAMPOS_ROMANEIO_PDF:
+        valor = dados_finais_saida.get(campo, '')
+        if campo == 'CPF Motorista': valor = formatar_cpf_para_exibicao(valor)
+        pdf.set_font("Helvetica", "B", 12); pdf.cell(45, 10, f"{rotulo}:", border=0)
+        pdf.set_font("Helvetica", "", 12); pdf.multi_cell(0, 10, str(valor), border=0, new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(20); pdf.cell(0, 10, "________________________________________", new_x="LMARGIN", new_y="NEXT", align="C")
+    pdf.cell(0, 10, "Assinatura Motorista", new_x="LMARGIN", new_y="NEXT", align="C")
+
+def _caminho_romaneio(dados_finais_saida):
+    pasta = os.path.join(_base_dir(), PASTA_ROMANEIOS_PDF)
+    os.makedirs(pasta, exist_ok=True)
+    # O NOME VEM DA PRÓPRIA SAÍDA (DATA E HORA ATÉ O SEGUNDO + ID MOVIMENTO), NÃO DA HORA DA GERAÇÃO: DUAS SAÍDAS DO
+    # MESMO CONTÊINER, NO LOTE OU NOS PROCESSOS PARALELOS, NUNCA DISPUTAM O MESMO ARQUIVO.
+    data_saida = pd.to_datetime(dados_finais_saida.get('Data e Hora'), errors='coerce')
+    if pd.isna(data_saida): data_saida = datetime.now()
+    nome_pdf = f"ROMANEIO_{str(dados_finais_saida['Nº do Contêiner']).replace('/', '-')}_{data_saida.strftime('%Y%m%d_%H%M%S')}"
+    id_movimento = dados_finais_saida.get('ID Movimento')
+    if isinstance(id_movimento, str) and id_movimento: nome_pdf += f"_{re.sub(r'[^0-9A-Za-z-]', '-', id_movimento)}"
+    nome_pdf += ".pdf"
+    return os.path.join(pasta, nome_pdf)
+
+def gerar_romaneio_pdf(dados_finais_saida, caminho_pdf=None):
+    caminho_pdf = caminho_pdf or _caminho_romaneio(dados_finais_saida)
+    with medir_operacao('pdf', arquivo=os.path.basename(caminho_pdf)) as detalhes:
+        pdf = _novo_pdf_romaneio()
+        _desenhar_romaneio(pdf, dados_finais_saida)
+        pdf.output(caminho_pdf)
+        detalhes['bytes'] = os.path.getsize(caminho_pdf)
+    return caminho_pdf
+
+def _gerar_romaneios_sequencial(lista_saidas):
+    return [gerar_romaneio_pdf(dados) for dados in lista_saidas]
+
+def gerar_romaneios_lote(lista_saidas, mesclado=False, caminho_mesclado=None, max_workers=None):
+    # MODO MESCLADO: UM ÚNICO PDF COM UMA PÁGINA POR SAÍDA (EX.: O TURNO INTEIRO), DEVOLVE [caminho].
+    # MODO INDIVIDUAL: UM ARQUIVO POR SAÍDA EM Romaneios_PDF, GERADOS EM PARALELO; DEVOLVE OS CAMINHOS NA ORDEM.
+    lista_saidas = list(lista_saidas)
+    if not lista_saidas: return []
+    if mesclado:
+        if caminho_mesclado is None:
+            os.makedirs(os.path.join(_base_dir(), PASTA_ROMANEIOS_PDF), exist_ok=True)
+            caminho_mesclado = os.path.join(_base_dir(), PASTA_ROMANEIOS_PDF, f"ROMANEIOS_LOTE_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
+        with medir_operacao('pdf_lote', arquivo=os.path.basename(caminho_mesclado), linhas=len(lista_saidas)) as detalhes:
+            pdf = _novo_pdf_romaneio()
+            for dados in lista_saidas:
+                _desenhar_romaneio(pdf, dados)
+            pdf.output(caminho_mesclado)
+            detalhes['bytes'] = os.path.getsize(caminho_mesclado)
+        return [caminho_mesclado]
+    workers = min(_num_workers_leitura(max_workers), len(lista_saidas))
+    if workers > 1 and len(lista_saidas) >= MIN_ROMANEIOS_PARALELO:
+        tamanho = math.ceil(len(lista_saidas) / workers)
+        lotes = [lista_saidas[i:i + tamanho] for i in range(0, len(lista_saidas), tamanho)]
+        try:
+            with ProcessPoolExecutor(max_workers=len(lotes)) as pool:
+                medido = functools.partial(_com_metricas_do_worker, _gerar_romaneios_sequencial, _METRICAS['ativas'])
+                gerados = []
+                for caminhos, metricas in pool.map(medido, lotes):
+                    _registrar_metricas_do_worker(metricas)
+                    gerados.extend(caminhos)
+                return gerados
+        except (BrokenProcessPool, OSError):
+            traceback.print_exc()
+    return _gerar_romaneios_sequencial(lista_saidas)
+
+def saidas_do_periodo(inicio, fim, clientes=None):
+    # SAÍDAS REGISTRADAS DE 'inicio' A 'fim' (DATA E HORA, INCLUSIVE; EX.: UM TURNO), EM ORDEM CRONOLÓGICA, COMO
+    # DICIONÁRIOS PRONTOS PARA gerar_romaneios_lote().
+    saidas = []
+    for bloco in iterar_movimentos_periodo(inicio, fim, clientes, status='Saída'):
+        bloco = descompactar_df(bloco)
+        bloco = bloco[(bloco['Data e Hora'] >= pd.Timestamp(inicio)) & (bloco['Data e Hora'] <= pd.Timestamp(fim))]
+        saidas.extend(bloco.astype(object).where(bloco.notna(), '').to_dict('records'))
+    return saidas
+
+def _id_da_entrada(dados_container):
+    id_entrada = dados_container.get('ID Movimento')
+    if isinstance(id_entrada, str) and id_entrada: return id_entrada
+    # ENTRADA DE UM DIA LEGADO (SÓ EXCEL): MIGRA O DIA, QUE RECEBE IDS, E LOCALIZA A LINHA UMA ÚNICA VEZ.
+    data_entrada_original = dados_container['Data e Hora']
+    caminho_diario_entrada = get_caminho_diario(data_entrada_original.strftime('%Y-%m-%d'))
+    if not _garantir_diario(caminho_diario_entrada):
+        raise ErroMovimento("Arquivo de log da entrada não encontrado.")
+    df_log_entrada = _ler_diario(caminho_diario_entrada)
+    mesma_linha = df_log_entrada[(df_log_entrada['Data e Hora'] == data_entrada_original) &
+                                 (df_log_entrada['Nº do Contêiner'] == dados_container['Nº do Contêiner'])]
+    if mesma_linha.empty or pd.isna(mesma_linha['ID Movimento'].iloc[0]):
+        raise ErroMovimento("Não foi possível encontrar a linha de entrada original no log.")
+    return mesma_linha['ID Movimento'].iloc[0]
+
+def processar_saida(dados_container, dados_novos, campos_romaneio):
+    # GRAVA OS DADOS DO ROMANEIO NA ENTRADA, REGISTRA A SAÍDA E GERA O PDF. DEVOLVE O CAMINHO DO ROMANEIO.
+    data_entrada_original = dados_container['Data e Hora']
+    id_entrada = _id_da_entrada(dados_container)
+    atualizar_movimento(id_entrada, {campo_romaneio: dados_novos[campo_romaneio] for campo_romaneio in campos_romaneio})
+
+    dados_finais_saida = dados_container.copy()
+    dados_finais_saida.update(dados_novos)
+    dados_finais_saida['CPF Motorista'] = ''.join(filter(str.isdigit, dados_novos['CPF Motorista']))
+    dados_finais_saida['Status'] = 'Saída'
+    dados_finais_saida['Data e Hora'] = datetime.now()
+    tempo_de_patio = dados_finais_saida['Data e Hora'] - data_entrada_original
+    dados_finais_saida['Tempo de Pátio (Dias)'] = tempo_de_patio.days
+    dados_finais_saida['ID Movimento'] = _gravar_movimento(dados_finais_saida)
+    return gerar_romaneio_pdf(dados_finais_saida)
+
+# --- AUDITORIA DO HISTÓRICO ---
+def auditar_historico(max_workers=None):
+    # VARRE TODO O HISTÓRICO E DEVOLVE UM DataFrame COM UMA LINHA POR PROBLEMA ENCONTRADO.
+    colunas_relatorio = ['Arquivo', 'Data e Hora', 'Status', 'Nº do Contêiner', 'CPF Motorista', 'ID Movimento', 'Problema']
+    df = carregar_historico(colunas_relatorio[1:-1], max_workers=max_workers, com_arquivo=True)
+    if df.empty: return pd.DataFrame(columns=colunas_relatorio)
+    df['Data e Hora'] = pd.to_datetime(df['Data e Hora'], errors='coerce')
+    problemas = []
+    containers = validar_containers_vetorizado(df['Nº do Contêiner'])
+    problemas.append(df[~containers['valido']].assign(Problema="Contêiner: " + containers.loc[~containers['valido'], 'motivo']))
+    cpfs = validar_cpfs_vetorizado(df['CPF Motorista'])
+    problemas.append(df[~cpfs['valido']].assign(Problema=cpfs.loc[~cpfs['valido'], 'motivo']))
+    # SEQUÊNCIA POR CONTÊINER: SAÍDA SEM ENTRADA ANTERIOR (ÓRFÃ) E ENTRADA REPETIDA SEM SAÍDA NO MEIO.
+    ordenado = df.dropna(subset=['Data e Hora', 'Nº do Contêiner']).sort_values(by=['Nº do Contêiner', 'Data e Hora'], kind='stable')
+    anterior = ordenado.groupby('Nº do Contêiner', sort=False)['Status'].shift()
+    saida_orfa = (ordenado['Status'] == 'Saída') & (anterior != 'Entrada')
+    entrada_repetida = (ordenado['Status'] == 'Entrada') & (anterior == 'Entrada')
+    problemas.append(ordenado[saida_orfa].assign(Problema="Saída órfã (sem entrada anterior)"))
+    problemas.append(ordenado[entrada_repetida].assign(Problema="Entrada repetida sem saída"))
+    relatorio = pd.concat(problemas, ignore_index=True).reindex(columns=colunas_relatorio)
+    return relatorio.sort_values(by=['Data e Hora', 'Nº do Contêiner'], na_position='first', kind='stable').reset_index(drop=True)
+
+# --- INDICADORES DE MOVIMENTAÇÃO E PERMANÊNCIA ---
+# Cada arquivo de log vira um cubo pequeno: quantidade de movimentos por dia, status, cliente, tipo, condição e dias
+# de pátio (da saída). O cubo fica em Logs_Excel/.indicadores.pkl com a assinatura do arquivo, como o índice do pátio;
+# registrar um movimento altera só o diário do dia, que é o único resumido de novo na próxima consulta.
+_INDICADORES_MEMORIA = {'value': None, 'trava': threading.RLock()}
+
+def _caminho_indicadores():
+    return os.path.join(_base_dir(), PASTA_LOGS_EXCEL, ARQUIVO_INDICADORES)
+
+def _resumo_diario(df):
+    status = df['Status']
+    resumo = pd.DataFrame({
+        'Dia': pd.to_datetime(df['Data e Hora'], errors='coerce').dt.normalize(),
+        'Status': status,
+        'Cliente': df['Cliente'].fillna('(sem cliente)'),
+        'Tipo de Contêiner': df['Tipo de Contêiner'].fillna('(não informado)'),
+        'Condição': df['Condição'].fillna('(não informado)'),
+        'Tempo de Pátio (Dias)': pd.to_numeric(df['Tempo de Pátio (Dias)'], errors='coerce').where(status == 'Saída'),
+    })
+    resumo = resumo[resumo['Dia'].notna() & status.isin(['Entrada', 'Saída'])]
+    return resumo.groupby(COLUNAS_INDICADORES, dropna=False).size().rename('Quantidade').reset_index()
+
+def atualizar_indicadores():
+    with _INDICADORES_MEMORIA['trava']:
+        indice = _carregar_indice(_caminho_indicadores(), VERSAO_INDICADORES, _INDICADORES_MEMORIA)
+        colunas = ['Data e Hora'] + [c for c in COLUNAS_INDICADORES if c in COLUNAS_ORDENADAS]
+        if _reconciliar_indice(indice, _resumo_diario, 'indicadores', colunas): _salvar_indice(_caminho_indicadores(), indice)
+        return indice
+
+def carregar_indicadores():
+    with medir_operacao('indicadores_cubo') as detalhes:
+        with _INDICADORES_MEMORIA['trava']:
+            partes = [df for _, df in atualizar_indicadores()['arquivos'].values() if df is not None and not df.empty]
+        if not partes: return pd.DataFrame(columns=COLUNAS_INDICADORES + ['Quantidade'])
+        cubo = pd.concat(partes, ignore_index=True)
+        cubo = cubo.groupby(COLUNAS_INDICADORES, dropna=False, as_index=False)['Quantidade'].sum()
+        detalhes['linhas'] = len(cubo)
+        return cubo
+
+def _no_periodo(cubo, inicio, fim):
+    filtro = pd.Series(True, index=cubo.index)
+    if inicio is not None: filtro &= cubo['Dia'] >= pd.Timestamp(inicio).normalize()
+    if fim is not None: filtro &= cubo['Dia'] <= pd.Timestamp(fim).normalize()
+    return cubo[filtro]
+
+def movimentos_por_dia(cubo, inicio=None, fim=None):
+    # A OCUPAÇÃO É ACUMULADA DESDE O INÍCIO DO HISTÓRICO, POR ISSO O FILTRO DE PERÍODO SÓ ENTRA NO FINAL.
+    colunas = ['Dia', 'Entradas', 'Saídas', 'Ocupação no Fim do Dia']
+    if cubo.empty: return pd.DataFrame(columns=colunas)
+    por_dia = cubo.pivot_table(index='Dia', columns='Status', values='Quantidade', aggfunc='sum', fill_value=0)
+    por_dia = por_dia.reindex(columns=['Entrada', 'Saída'], fill_value=0)
+    ultimo_dia = por_dia.index.max() if fim is None else max(por_dia.index.max(), pd.Timestamp(fim).normalize())
+    por_dia = por_dia.reindex(pd.date_range(por_dia.index.min(), ultimo_dia, freq='D'), fill_value=0)
+    por_dia['Ocupação no Fim do Dia'] = (por_dia['Entrada'] - por_dia['Saída']).cumsum()
+    por_dia = por_dia.rename(columns={'Entrada': 'Entradas', 'Saída': 'Saídas'}).rename_axis(index='Dia', columns=None).reset_index()
+    return _no_periodo(por_dia, inicio, fim)[colunas].reset_index(drop=True)
+
+def permanencia_por_grupo(cubo, inicio=None, fim=None, agrupar_por='Cliente'):
+    # DISTRIBUIÇÃO DOS DIAS DE PÁTIO DAS SAÍDAS DO PERÍODO. O CUBO GUARDA CONTAGENS, ENTÃO OS VALORES SÃO PONDERADOS.
+    colunas = [agrupar_por, 'Saídas', 'Média (dias)', 'Mediana (dias)', 'P90 (dias)', 'Máximo (dias)'] + [f[2] for f in FAIXAS_PERMANENCIA]
+    saidas = _no_periodo(cubo, inicio, fim)
+    saidas = saidas[(saidas['Status'] == 'Saída') & saidas['Tempo de Pátio (Dias)'].notna()]
+    if saidas.empty: return pd.DataFrame(columns=colunas)
+    linhas = []
+    grupos = list(saidas.groupby(agrupar_por, sort=True)) + [('Todos', saidas)]
+    for grupo, df in grupos:
+        dias = np.repeat(df['Tempo de Pátio (Dias)'].to_numpy(dtype=float), df['Quantidade'].to_numpy(dtype=int))
+        linha = {agrupar_por: grupo, 'Saídas': len(dias), 'Média (dias)': round(float(dias.mean()), 1),
+                 'Mediana (dias)': float(np.median(dias)), 'P90 (dias)': round(float(np.percentile(dias, 90)), 1),
+                 'Máximo (dias)': float(dias.max())}
+        for minimo, maximo, rotulo in FAIXAS_PERMANENCIA:
+            linha[rotulo] = int(((dias >= minimo) & (dias <= maximo)).sum())
+        linhas.append(linha)
+    return pd.DataFrame(linhas, columns=colunas)
+
+def principais_clientes(cubo, inicio=None, fim=None, quantidade=QTD_PRINCIPAIS_CLIENTES):
+    colunas = ['Cliente', 'Entradas', 'Saídas', 'Total', 'Permanência Média (dias)']
+    periodo = _no_periodo(cubo, inicio, fim)
+    if periodo.empty: return pd.DataFrame(columns=colunas)
+    por_cliente = periodo.pivot_table(index='Cliente', columns='Status', values='Quantidade', aggfunc='sum', fill_value=0)
+    por_cliente = por_cliente.reindex(columns=['Entrada', 'Saída'], fill_value=0).rename(columns={'Entrada': 'Entradas', 'Saída': 'Saídas'})
+    por_cliente['Total'] = por_cliente['Entradas'] + por_cliente['Saídas']
+    saidas = periodo[(periodo['Status'] == 'Saída') & periodo['Tempo de Pátio (Dias)'].notna()]
+    ponderado = (saidas['Tempo de Pátio (Dias)'] * saidas['Quantidade']).groupby(saidas['Cliente']).sum()
+    por_cliente['Permanência Média (dias)'] = (ponderado / saidas.groupby('Cliente')['Quantidade'].sum()).round(1)
+    por_cliente = por_cliente.sort_values(by=['Total', 'Entradas'], ascending=False).head(quantidade)
+    return por_cliente.rename_axis(index='Cliente', columns=None).reset_index()[colunas]
+
+def relatorio_indicadores(inicio=None, fim=None, cubo=None):
+    cubo = carregar_indicadores() if cubo is None else cubo
+    return {
+        'Movimentos por Dia': movimentos_por_dia(cubo, inicio, fim),
+        'Principais Clientes': principais_clientes(cubo, inicio, fim),
+        'Permanência por Cliente': permanencia_por_grupo(cubo, inicio, fim, 'Cliente'),
+        'Permanência por Tipo': permanencia_por_grupo(cubo, inicio, fim, 'Tipo de Contêiner'),
+        'Permanência por Condição': permanencia_por_grupo(cubo, inicio, fim, 'Condição'),
+    }
+
+def exportar_indicadores(caminho_arquivo, inicio=None, fim=None, relatorio=None):
+    relatorio = relatorio_indicadores(inicio, fim) if relatorio is None else relatorio
+    header_font = Font(bold=True, color="FFFFFF", name='Calibri')
+    header_fill = PatternFill(start_color="2F4F4F", end_color="2F4F4F", fill_type="solid")
+    with medir_operacao('exportar_indicadores', arquivo=os.path.basename(caminho_arquivo)), \
+            pd.ExcelWriter(caminho_arquivo, engine='openpyxl', datetime_format='DD/MM/YYYY') as writer:
+        for nome_aba, df in relatorio.items():
+            df.to_excel(writer, sheet_name=nome_aba, index=False)
+            ws = writer.sheets[nome_aba]
+            ws.freeze_panes = 'A2'
+            for col_num, column_title in enumerate(df.columns, 1):
+                celula = ws.cell(row=1, column=col_num)
+                celula.font = header_font; celula.fill = header_fill
+                ws.column_dimensions[get_column_letter(col_num)].width = max(len(str(column_title)), 12) + 4
+    return caminho_arquivo
+
+# --- SUGESTÕES DE PREENCHIMENTO (AUTOCOMPLETAR) ---
+# Cada arquivo de log é reduzido às contagens de cada cliente, motorista, CPF, placa e transportadora, mais o último
+# CPF/placas/transportadora de cada motorista (índice persistente com assinatura, como o do pátio). Em memória, cada
+# campo vira uma lista ordenada de chaves normalizadas (busca por bisect) e os mais frequentes de cada prefixo curto
+# ficam pré-calculados; nenhuma tecla relê o histórico.
+_INDICE_SUGESTOES_MEMORIA = {'value': None, 'trava': threading.RLock()}
+_RE_NAO_DIGITO = re.compile(r'[^0-9]')
+_SUGESTOES = {'pronto': False, 'campos': {}, 'motoristas': {}}
+_TRAVA_SUGESTOES = threading.Lock()
+
+def _caminho_indice_sugestoes():
+    return os.path.join(_base_dir(), PASTA_LOGS_EXCEL, ARQUIVO_INDICE_SUGESTOES)
+
+def _limpar_valores_sugestao(campo, serie):
+    serie = serie.dropna().astype(str)
+    if campo == 'CPF Motorista': serie = serie.str.replace(r'[^0-9]', '', regex=True)
+    else: serie = serie.str.strip().str.replace(r'\s+', ' ', regex=True)
+    return serie[serie != '']
+
+def _limpar_valor_sugestao(campo, valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)): return ''
+    if campo == 'CPF Motorista': return _RE_NAO_DIGITO.sub('', str(valor))
+    return ' '.join(str(valor).split())
+
+def _chave_sugestao(campo, texto):
+    # SEM ACENTOS E EM MAIÚSCULAS; NO CPF SÓ OS DÍGITOS, PARA A MÁSCARA DIGITADA NÃO ATRAPALHAR A BUSCA.
+    if campo == 'CPF Motorista': return _RE_NAO_DIGITO.sub('', texto)
+    if not texto.isascii():
+        texto = ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+    return ' '.join(texto.upper().split())
+
+def _valores_para_sugestao(df):
+    limpo = pd.DataFrame({campo: _limpar_valores_sugestao(campo, df[campo]) for campo in CAMPOS_SUGESTAO}, index=df.index)
+    partes = []
+    for campo in CAMPOS_SUGESTAO:
+        contagem = limpo[campo].value_counts()
+        partes.append(pd.DataFrame({'Campo': campo, 'Valor': contagem.index.astype(str), 'Quantidade': contagem.to_numpy()}))
+    motoristas = limpo.assign(Ultimo=pd.to_datetime(df['Data e Hora'], errors='coerce')).dropna(subset=['Motorista'])
+    motoristas = motoristas.sort_values(by='Ultimo', na_position='first').groupby('Motorista')[list(CAMPOS_DO_MOTORISTA) + ['Ultimo']].last()
+    resumo = pd.concat(partes, ignore_index=True)
+    eh_motorista = resumo['Campo'] == 'Motorista'
+    detalhes = motoristas.reindex(resumo.loc[eh_motorista, 'Valor']).set_axis(resumo.index[eh_motorista])
+    return resumo.join(detalhes)
+
+def _montar_indice_prefixos(campo, contagem):
+    entradas = sorted((_chave_sugestao(campo, valor), valor) for valor in contagem)
+    topo = {}
+    for chave, valor in entradas:
+        for tamanho in range(1, min(len(chave), TAMANHO_PREFIXO_PRECALCULADO) + 1):
+            topo.setdefault(chave[:tamanho], []).append(valor)
+    for prefixo, valores in topo.items():
+        topo[prefixo] = heapq.nlargest(QTD_SUGESTOES, valores, key=contagem.get)
+    return {'contagem': contagem, 'entradas': entradas, 'topo': topo}
+
+def carregar_sugestoes():
+    with medir_operacao('sugestoes') as detalhes:
+        with _INDICE_SUGESTOES_MEMORIA['trava']:
+            indice = _carregar_indice(_caminho_indice_sugestoes(), VERSAO_INDICE_SUGESTOES, _INDICE_SUGESTOES_MEMORIA)
+            colunas = ('Data e Hora',) + CAMPOS_SUGESTAO
+            if _reconciliar_indice(indice, _valores_para_sugestao, 'indice_sugestoes', colunas):
+                _salvar_indice(_caminho_indice_sugestoes(), indice)
+            partes = [df for _, df in indice['arquivos'].values() if df is not None and not df.empty]
+        contagens = {campo: {} for campo in CAMPOS_SUGESTAO}
+        motoristas = {}
+        if partes:
+            total = pd.concat(partes, ignore_index=True)
+            for (campo, valor), quantidade in total.groupby(['Campo', 'Valor'])['Quantidade'].sum().items():
+                contagens[campo][valor] = int(quantidade)
+            dados_motoristas = total[total['Campo'] == 'Motorista'].sort_values(by='Ultimo', na_position='first')
+            dados_motoristas = dados_motoristas.groupby('Valor')[list(CAMPOS_DO_MOTORISTA)].last()
+            for nome, linha in dados_motoristas.iterrows():
+                motoristas[nome] = {campo: valor for campo, valor in linha.items() if isinstance(valor, str) and valor}
+        campos = {campo: _montar_indice_prefixos(campo, contagem) for campo, contagem in contagens.items()}
+        with _TRAVA_SUGESTOES:
+            _SUGESTOES.update(pronto=True, campos=campos, motoristas=motoristas)
+        detalhes['linhas'] = sum(len(contagem) for contagem in contagens.values())
+        return detalhes['linhas']
+
+def registrar_sugestoes(dados):
+    # CHAMADA A CADA MOVIMENTO GRAVADO (OU RECEBIDO DO COORDENADOR). ANTES DA PRIMEIRA CARGA NÃO HÁ O QUE ATUALIZAR:
+    # A CARGA LÊ O DIÁRIO, QUE JÁ CONTÉM O MOVIMENTO.
+    if not _SUGESTOES['pronto']: return
+    with _TRAVA_SUGESTOES:
+        for campo in CAMPOS_SUGESTAO:
+            valor = _limpar_valor_sugestao(campo, dados.get(campo))
+            if not valor: continue
+            indice = _SUGESTOES['campos'][campo]
+            contagem = indice['contagem']
+            chave = _chave_sugestao(campo, valor)
+            if valor not in contagem: bisect.insort(indice['entradas'], (chave, valor))
+            contagem[valor] = contagem.get(valor, 0) + 1
+            for tamanho in range(1, min(len(chave), TAMANHO_PREFIXO_PRECALCULADO) + 1):
+                topo = indice['topo'].setdefault(chave[:tamanho], [])
+                if valor not in topo: topo.append(valor)
+                topo.sort(key=contagem.get, reverse=True)
+                del topo[QTD_SUGESTOES:]
+        motorista = _limpar_valor_sugestao('Motorista', dados.get('Motorista'))
+        if motorista:
+            detalhes = _SUGESTOES['motoristas'].setdefault(motorista, {})
+            for campo in CAMPOS_DO_MOTORISTA:
+                valor = _limpar_valor_sugestao(campo, dados.get(campo))
+                if valor: detalhes[campo] = valor
+
+def sugerir(campo, texto, limite=QTD_SUGESTOES):
+    chave = _chave_sugestao(campo, texto or '')
+    if not chave: return []
+    with _TRAVA_SUGESTOES:
+        indice = _SUGESTOES['campos'].get(campo)
+        if indice is None: return []
+        if len(chave) <= TAMANHO_PREFIXO_PRECALCULADO:
+            return indice['topo'].get(chave, [])[:limite]
+        entradas = indice['entradas']
+        candidatos = []
+        for posicao in range(bisect.bisect_left(entradas, (chave,)), len(entradas)):
+            chave_entrada, valor = entradas[posicao]
+            if not chave_entrada.startswith(chave): break
+            candidatos.append(valor)
+        return heapq.nlargest(limite, candidatos, key=indice['contagem'].get)
+
+def dados_do_motorista(nome_motorista):
+    with _TRAVA_SUGESTOES:
+        return dict(_SUGESTOES['motoristas'].get(_limpar_valor_sugestao('Motorista', nome_motorista), {}))
+
+# --- ARQUIVO MORTO MENSAL ---
+# Um mês fechado (anterior ao mês corrente) é lido dos diários de cada dia e gravado como um único arquivo colunar:
+# JSON compactado com uma lista de valores por coluna, independente de versão do pandas. As correções posteriores
+# (ex.: saída de um contêiner que entrou num mês já arquivado) vão para Arquivo_<mês>.jsonl, aplicado na leitura.
+def _pasta_arquivo_morto():
+    return os.path.join(_base_dir(), PASTA_LOGS_EXCEL, PASTA_ARQUIVO_MORTO)
+
+def _caminho_arquivo_mensal(mes):
+    return os.path.join(_pasta_arquivo_morto(), f"Arquivo_{mes}{EXTENSAO_ARQUIVO_MENSAL}")
+
+def _caminho_atualizacoes_arquivo(caminho_arquivo):
+    return caminho_arquivo[:-len(EXTENSAO_ARQUIVO_MENSAL)] + EXTENSAO_DIARIO
+
+def _eh_do_arquivo_morto(caminho):
+    return os.path.basename(os.path.dirname(caminho)) == PASTA_ARQUIVO_MORTO
+
+def _ler_colunas_arquivo(caminho_arquivo):
+    with gzip.open(caminho_arquivo, 'rt', encoding='utf-8') as f:
+        return json.load(f)['colunas']
+
+def _ler_arquivo_mensal(caminho_arquivo):
+    colunas = _ler_colunas_arquivo(caminho_arquivo)
+    caminho_atualizacoes = _caminho_atualizacoes_arquivo(caminho_arquivo)
+    if not os.path.exists(caminho_atualizacoes): return _df_de_registros(colunas)
+    nomes = list(colunas)
+    movimentos = [dict(zip(nomes, valores)) for valores in zip(*colunas.values())]
+    return _ler_diario(caminho_atualizacoes, movimentos)
+
+def _linhas_arquivo_mensal(caminho_arquivo):
+    # 'linhas' VEM LOGO NO INÍCIO DO JSON (VER _gravar_arquivo_mensal): BASTA DESCOMPACTAR O COMEÇO DO ARQUIVO. SEM
+    # CONSEGUIR LER, O MÊS CONTA COMO UM LOTE INTEIRO; O ERRO APARECE NA LEITURA PROPRIAMENTE DITA.
+    try:
+        with gzip.open(caminho_arquivo, 'rt', encoding='utf-8') as f:
+            achado = re.search(r'"linhas":\s*(\d+)', f.read(256))
+    except (OSError, EOFError, UnicodeDecodeError):
+        achado = None
+    return int(achado.group(1)) if achado else LINHAS_POR_LOTE_ARQUIVO
+
+def _gravar_arquivo_mensal(caminho_destino, mes, df):
+    colunas = {}
+    for col in COLUNAS_ORDENADAS:
+        serie = df[col]
+        if col == 'Data e Hora':
+            colunas[col] = [valor.isoformat() if pd.notna(valor) else None for valor in serie]
+        else:
+            colunas[col] = [str(valor) if valor is not None else None for valor in serie.astype(object).where(serie.notna(), None)]
+    with gzip.open(caminho_destino, 'wt', encoding='utf-8') as f:
+        json.dump({'versao': VERSAO_ARQUIVO_MENSAL, 'mes': mes, 'linhas': len(df), 'colunas': colunas}, f, ensure_ascii=False)
+    with open(caminho_destino, 'rb') as f:
+        os.fsync(f.fileno())
+
+def meses_para_arquivar(ate_mes=None):
+    # MESES COM PASTAS DIÁRIAS ATÉ 'ate_mes' (AAAA-MM). O MÊS CORRENTE NUNCA É ARQUIVADO.
+    limite = (datetime.now().replace(day=1) - pd.Timedelta(days=1)).strftime('%Y-%m')
+    if ate_mes: limite = min(limite, ate_mes)
+    pasta_logs = os.path.join(_base_dir(), PASTA_LOGS_EXCEL)
+    meses = {}
+    for nome in sorted(os.listdir(pasta_logs)) if os.path.isdir(pasta_logs) else []:
+        if re.fullmatch(r'\d{4}-\d{2}-\d{2}', nome) and nome[:7] <= limite and os.path.isdir(os.path.join(pasta_logs, nome)):
+            meses.setdefault(nome[:7], []).append(nome)
+    return meses
+
+def _pasta_remocao_pendente():
+    return os.path.join(_base_dir(), PASTA_REMOCAO_PENDENTE)
+
+def _remover_pastas_pendentes():
+    # REMOVE O QUE FICOU DE ARQUIVAMENTOS ANTERIORES; DEVOLVE AS PASTAS QUE AINDA NÃO PUDERAM SER APAGADAS.
+    pasta = _pasta_remocao_pendente()
+    nao_removidas = []
+    for nome in sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []:
+        try:
+            shutil.rmtree(os.path.join(pasta, nome))
+        except OSError:
+            nao_removidas.append(os.path.join(pasta, nome))
+    return nao_removidas
+
+def arquivar_mes(mes, dias):
+    # O ARQUIVO NOVO SÓ SUBSTITUI O ANTERIOR DEPOIS DE CONFERIDO E DE TODAS AS PASTAS DO MÊS SAÍREM DE Logs_Excel;
+    # ATÉ ALI, QUALQUER FALHA DESFAZ O QUE FOI FEITO E O HISTÓRICO CONTINUA EXATAMENTE COMO ESTAVA.
+    pasta_logs = os.path.join(_base_dir(), PASTA_LOGS_EXCEL)
+    caminho_arquivo = _caminho_arquivo_mensal(mes)
+    caminho_originais = os.path.join(_pasta_arquivo_morto(), f"Originais_{mes}.zip")
+    os.makedirs(_pasta_arquivo_morto(), exist_ok=True)
+    caminhos_diarios = [os.path.join(pasta_logs, dia, f"Log_Diario_{dia}{EXTENSAO_DIARIO}") for dia in dias]
+    caminho_tmp = f"{caminho_arquivo}.{os.getpid()}.tmp"
+    originais_tmp = f"{caminho_originais}.{os.getpid()}.tmp"
+    pasta_pendente = os.path.join(_pasta_remocao_pendente(), f"{mes}_{os.getpid()}")
+    movidas = []
+    with medir_operacao('arquivar_mes', arquivo=os.path.basename(caminho_arquivo), dias=len(dias)) as detalhes, \
+            contextlib.ExitStack() as travas:
+        try:
+            # DIAS AINDA SÓ EM EXCEL RECEBEM DIÁRIO (E IDS) ANTES; DEPOIS, TODOS OS DIÁRIOS DO MÊS FICAM TRAVADOS ATÉ O FIM.
+            partes = []
+            for caminho_diario in caminhos_diarios:
+                if not _garantir_diario(caminho_diario): continue
+                travas.enter_context(_trava_arquivo(caminho_diario))
+                partes.append(_ler_diario(caminho_diario))
+            if os.path.exists(caminho_arquivo):
+                # DIAS QUE REAPARECERAM NUM MÊS JÁ ARQUIVADO (IMPORTAÇÃO TARDIA) SÃO SOMADOS AO ARQUIVO EXISTENTE.
+                travas.enter_context(_trava_arquivo(_caminho_atualizacoes_arquivo(caminho_arquivo)))
+                partes.insert(0, _ler_arquivo_mensal(caminho_arquivo))
+            partes = [df for df in partes if not df.empty]
+            df_mes = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_ORDENADAS)
+            df_mes = df_mes.sort_values(by='Data e Hora', na_position='first', kind='stable').reset_index(drop=True)
+            _gravar_arquivo_mensal(caminho_tmp, mes, df_mes)
+            conferencia = _df_de_registros(_ler_colunas_arquivo(caminho_tmp))
+            if len(conferencia) != len(df_mes) or set(conferencia['ID Movimento'].dropna()) != set(df_mes['ID Movimento'].dropna()):
+                raise ErroMovimento(f"Conferência do arquivo {os.path.basename(caminho_arquivo)} falhou; nada foi alterado.")
+            if os.path.exists(caminho_originais): shutil.copyfile(caminho_originais, originais_tmp)
+            with zipfile.ZipFile(originais_tmp, 'a', zipfile.ZIP_DEFLATED) as zf:
+                for dia in dias:
+                    pasta_dia = os.path.join(pasta_logs, dia)
+                    for nome in sorted(os.listdir(pasta_dia)):
+                        if nome.endswith('.lock') or nome.startswith('~'): continue
+                        zf.write(os.path.join(pasta_dia, nome), arcname=f"{dia}/{nome}")
+            # MOVER A PASTA FALHA POR INTEIRO SE ALGUM ARQUIVO DELA ESTIVER ABERTO (EX.: EXCEL NO WINDOWS).
+            os.makedirs(pasta_pendente, exist_ok=True)
+            em_uso = []
+            for dia in dias:
+                try:
+                    os.replace(os.path.join(pasta_logs, dia), os.path.join(pasta_pendente, dia))
+                    movidas.append(dia)
+                except OSError:
+                    em_uso.append(dia)
+            if em_uso:
+                raise ErroMovimento(f"Não foi possível arquivar {mes}: arquivos em uso nas pastas {', '.join(em_uso)}. "
+                                    f"Feche-os (ex.: Excel) e tente novamente; nada foi alterado.")
+            os.replace(originais_tmp, caminho_originais)
+            os.replace(caminho_tmp, caminho_arquivo)
+        except BaseException:
+            for dia in reversed(movidas):
+                os.replace(os.path.join(pasta_pendente, dia), os.path.join(pasta_logs, dia))
+            for caminho in (caminho_tmp, originais_tmp):
+                if os.path.exists(caminho): os.remove(caminho)
+            if os.path.isdir(pasta_pendente) and not os.listdir(pasta_pendente): os.rmdir(pasta_pendente)
+            raise
+        if os.path.exists(_caminho_atualizacoes_arquivo(caminho_arquivo)): os.remove(_caminho_atualizacoes_arquivo(caminho_arquivo))
+        detalhes['linhas'] = len(df_mes)
+    return len(df_mes)
+
+def arquivar_meses_fechados(ate_mes=None):
+    # DEVOLVE AS LINHAS ARQUIVADAS POR MÊS E AS PASTAS JÁ ARQUIVADAS QUE AINDA NÃO PUDERAM SER APAGADAS DO DISCO.
+    meses = {mes: arquivar_mes(mes, dias) for mes, dias in meses_para_arquivar(ate_mes).items()}
+    return {'meses': meses, 'nao_removidas': _remover_pastas_pendentes()}
+
+# --- EXPORTAÇÃO CONSOLIDADA POR PERÍODO ---
+def _periodo_da_fonte(caminho):
+    # (PRIMEIRO DIA, ÚLTIMO DIA) COBERTOS PELO ARQUIVO, PELO NOME; None QUANDO NÃO DÁ PARA SABER (É LIDO SEMPRE).
+    nome = os.path.basename(caminho)
+    achado = re.search(r'(\d{4}-\d{2}-\d{2})', nome)
+    if achado:
+        dia = pd.Timestamp(achado.group(1))
+        return dia, dia
+    achado = re.search(r'Arquivo_(\d{4}-\d{2})', nome)
+    if achado:
+        inicio = pd.Timestamp(achado.group(1) + '-01')
+        return inicio, inicio + pd.offsets.MonthEnd(0)
+    return None
+
+def _filtrar_movimentos(df, inicio, fim, clientes=None, status=None, tipos=None):
+    datas = pd.to_datetime(df['Data e Hora'], errors='coerce')
+    filtro = datas.notna()
+    if inicio is not None: filtro &= datas >= pd.Timestamp(inicio).normalize()
+    if fim is not None: filtro &= datas < pd.Timestamp(fim).normalize() + pd.Timedelta(days=1)
+    if clientes: filtro &= df['Cliente'].isin(list(clientes))
+    if status: filtro &= df['Status'].isin([status] if isinstance(status, str) else list(status))
+    if tipos: filtro &= df['Tipo de Contêiner'].isin([tipos] if isinstance(tipos, str) else list(tipos))
+    return df[filtro].sort_values(by='Data e Hora', kind='stable')
+
+def iterar_movimentos_periodo(inicio=None, fim=None, clientes=None, status=None, tipos=None, max_workers=None):
+    # LÊ SÓ AS FONTES DO PERÍODO, EM LOTES (iterar_historico), EM ORDEM CRONOLÓGICA, E DEVOLVE CADA LOTE JÁ FILTRADO.
+    inicio_ts = pd.Timestamp(inicio).normalize() if inicio is not None else None
+    fim_ts = pd.Timestamp(fim).normalize() if fim is not None else None
+    fontes = []
+    for caminho in get_fontes_historico():
+        periodo = _periodo_da_fonte(caminho)
+        if periodo is not None and ((inicio_ts is not None and periodo[1] < inicio_ts) or (fim_ts is not None and periodo[0] > fim_ts)):
+            continue
+        fontes.append((periodo[0] if periodo else pd.Timestamp.min, caminho))
+    fontes = [caminho for _, caminho in sorted(fontes)]
+    for lote in iterar_historico(arquivos=fontes, max_workers=max_workers):
+        filtrado = _filtrar_movimentos(lote, inicio, fim, clientes, status, tipos)
+        if not filtrado.empty: yield filtrado
+
+def exportar_periodo(caminho_saida, inicio=None, fim=None, clientes=None, status=None, tipos=None, max_workers=None):
+    # GRAVA O PERÍODO EM .xlsx (FORMATADO, EM STREAMING) OU .csv (';', UTF-8 COM BOM), LOTE A LOTE. DEVOLVE AS LINHAS.
+    blocos = iterar_movimentos_periodo(inicio, fim, clientes, status, tipos, max_workers)
+    with medir_operacao('exportar_periodo', arquivo=os.path.basename(caminho_saida)) as detalhes:
+        caminho_tmp = os.path.join(os.path.dirname(os.path.abspath(caminho_saida)), f"~${os.getpid()}_{os.path.basename(caminho_saida)}")
+        try:
+            if caminho_saida.lower().endswith('.csv'):
+                total = 0
+                pd.DataFrame(columns=COLUNAS_ORDENADAS).to_csv(caminho_tmp, index=False, sep=';', encoding='utf-8-sig')
+                for bloco in blocos:
+                    bloco.reindex(columns=COLUNAS_ORDENADAS).to_csv(caminho_tmp, mode='a', header=False, index=False, sep=';',
+                                                                   encoding='utf-8', date_format='%d/%m/%Y %H:%M')
+                    total += len(bloco)
+            else:
+                # AS LARGURAS SÃO DEFINIDAS ANTES DA PRIMEIRA LINHA: USA O PRIMEIRO LOTE COMO AMOSTRA.
+                primeiro = next(blocos, None)
+                larguras = _larguras_colunas(primeiro.reindex(columns=COLUNAS_ORDENADAS)) if primeiro is not None else {}
+                total = escrever_planilha_streaming(caminho_tmp, itertools.chain([primeiro], blocos), larguras)
+            os.replace(caminho_tmp, caminho_saida)
+        finally:
+            if os.path.exists(caminho_tmp): os.remove(caminho_tmp)
+        detalhes['linhas'] = total
+    return total
+
+# --- IMPORTAÇÃO EM LOTE (LINHA DE COMANDO) ---
+# Recupera movimentos digitados de papel após uma queda do sistema. As linhas são validadas como no formulário,
+# aplicadas em ordem cronológica sobre o pátio atual e gravadas com uma única anexação por diário do dia.
+def _ler_planilha_importacao(caminho_arquivo):
+    if caminho_arquivo.lower().endswith(('.xlsx', '.xlsm', '.xls')):
+        df = pd.read_excel(caminho_arquivo, dtype=str)
+    else:
+        df = pd.read_csv(caminho_arquivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def _texto_importado(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)): return ''
+    return str(valor).strip()
+
+def _normalizar_status(valor):
+    return {'entrada': 'Entrada', 'saída': 'Saída', 'saida': 'Saída'}.get(valor.strip().lower())
+
+def _validar_movimento_importado(dados):
+    if pd.isna(dados['Data e Hora']): return "Data e Hora ausente ou inválida."
+    if dados['Status'] is None: return "Status deve ser 'Entrada' ou 'Saída'."
+    if not validar_numero_container(dados['Nº do Contêiner']): return f"Nº do Contêiner '{dados['Nº do Contêiner']}' inválido."
+    if dados['CPF Motorista'] and not validar_cpf(dados['CPF Motorista']): return f"CPF '{dados['CPF Motorista']}' inválido."
+    if dados['Status'] == 'Entrada' and len(dados['Placa do Veículo']) < 7:
+        return "A Placa do Veículo deve ter no mínimo 7 caracteres."
+    if dados['Status'] == 'Saída' and not all(dados[k] for k in ('Placa do Veículo', 'Motorista', 'Transportadora')):
+        return "Placa do Veículo, Motorista e Transportadora são obrigatórios na saída."
+    return None
+
+def importar_movimentos(caminho_arquivo, caminho_rejeitos=None):
+    df_origem = _ler_planilha_importacao(caminho_arquivo)
+    faltando = [c for c in COLUNAS_OBRIGATORIAS_IMPORTACAO if c not in df_origem.columns]
+    if faltando:
+        raise ErroMovimento(f"Colunas obrigatórias ausentes no arquivo: {', '.join(faltando)}")
+    datas = pd.to_datetime(df_origem['Data e Hora'], dayfirst=True, errors='coerce')
+    rejeitados = []
+    candidatos = []
+    for posicao, bruto in enumerate(df_origem.to_dict('records')):
+        dados = {col: _texto_importado(bruto.get(col)) for col in DTYPE_COLS if col != 'ID Movimento'}
+        dados['Data e Hora'] = datas.iloc[posicao]
+        dados['Status'] = _normalizar_status(dados['Status'])
+        dados['Nº do Contêiner'] = dados['Nº do Contêiner'].upper()
+        dados['Placa do Veículo'] = dados['Placa do Veículo'].upper()
+        dados['Placa Carreta'] = dados['Placa Carreta'].upper()
+        dados['CPF Motorista'] = ''.join(filter(str.isdigit, dados['CPF Motorista']))
+        motivo = _validar_movimento_importado(dados)
+        if motivo: rejeitados.append((posicao, motivo))
+        else: candidatos.append((posicao, dados))
+    candidatos.sort(key=lambda item: item[1]['Data e Hora'])
+
+    # UM CONTÊINER SÓ ENTRA SE NÃO ESTIVER NO PÁTIO E SÓ SAI SE ESTIVER, CONSIDERANDO O HISTÓRICO E O PRÓPRIO LOTE.
+    no_patio = {registro['Nº do Contêiner']: registro for registro in get_containers_no_patio().to_dict('records')}
+    novos_por_dia = {}
+    atualizacoes_por_diario = {}
+    for posicao, dados in candidatos:
+        numero_container = dados['Nº do Contêiner']
+        dia = dados['Data e Hora'].strftime('%Y-%m-%d')
+        entrada = no_patio.get(numero_container)
+        if dados['Status'] == 'Entrada':
+            if entrada is not None:
+                rejeitados.append((posicao, "Contêiner já está no pátio: entrada repetida sem saída.")); continue
+            dados['Tempo de Pátio (Dias)'] = ''
+            movimento = dados
+        else:
+            if entrada is None:
+                rejeitados.append((posicao, "Saída de contêiner que não está no pátio.")); continue
+            if dados['Data e Hora'] < entrada['Data e Hora']:
+                rejeitados.append((posicao, "Saída anterior à entrada do contêiner.")); continue
+            romaneio = {campo: dados[campo] for campo in CAMPOS_ROMANEIO if dados[campo]}
+            if romaneio:
+                if entrada.get('_lote'):
+                    entrada.update(romaneio)
+                else:
+                    try:
+                        id_entrada = _id_da_entrada(entrada)
+                    except ErroMovimento as e:
+                        rejeitados.append((posicao, str(e))); continue
+                    atualizacao = {'_tipo': 'atualizacao', 'ID Movimento': id_entrada}
+                    atualizacao.update(romaneio)
+                    atualizacoes_por_diario.setdefault(localizar_movimento(id_entrada), []).append(atualizacao)
+            movimento = {k: v for k, v in entrada.items() if k in COLUNAS_ORDENADAS}
+            movimento.update({k: v for k, v in dados.items() if v != ''})
+            movimento['Tempo de Pátio (Dias)'] = (dados['Data e Hora'] - entrada['Data e Hora']).days
+        movimento['ID Movimento'] = novo_id_movimento(dia)
+        novos_por_dia.setdefault(dia, []).append(movimento)
+        if movimento['Status'] == 'Entrada':
+            movimento['_lote'] = True
+            no_patio[numero_container] = movimento
+        else:
+            del no_patio[numero_container]
+
+    diarios_alterados = set()
+    for dia, registros in novos_por_dia.items():
+        caminho_diario = get_caminho_diario(dia)
+        _anexar_diario(caminho_diario, [{k: v for k, v in r.items() if k != '_lote'} for r in registros])
+        diarios_alterados.add(caminho_diario)
+    for caminho_diario, atualizacoes in atualizacoes_por_diario.items():
+        _anexar_diario(caminho_diario, atualizacoes)
+        diarios_alterados.add(caminho_diario)
+    for caminho_diario in sorted(diarios_alterados):
+        exportar_diario_para_excel(caminho_diario)
+
+    if rejeitados:
+        caminho_rejeitos = caminho_rejeitos or os.path.splitext(caminho_arquivo)[0] + "_rejeitados.csv"
+        rejeitados.sort()
+        df_rejeitos = df_origem.iloc[[posicao for posicao, _ in rejeitados]].copy()
+        df_rejeitos.insert(0, 'Motivo', [motivo for _, motivo in rejeitados])
+        df_rejeitos.insert(0, 'Linha', [posicao + 2 for posicao, _ in rejeitados])
+        df_rejeitos.to_csv(caminho_rejeitos, index=False, sep=';', encoding='utf-8-sig')
+    else:
+        caminho_rejeitos = None
+    return {
+        'importados': sum(len(r) for r in novos_por_dia.values()),
+        'rejeitados': len(rejeitados),
+        'relatorio_rejeitos': caminho_rejeitos,
+    }
+
+def _ler_data_br(texto):
+    try:
+        return datetime.strptime(texto.strip(), '%d/%m/%Y')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Data inválida: {texto} (use DD/MM/AAAA).")
+
+def _ler_data_hora_br(texto, fim_do_dia=False):
+    # 'DD/MM/AAAA HH:MM' OU SÓ 'DD/MM/AAAA' (00:00, OU 23:59:59 QUANDO É O FIM DE UM PERÍODO).
+    try:
+        return datetime.strptime(texto.strip(), '%d/%m/%Y %H:%M')
+    except ValueError:
+        data = _ler_data_br(texto)
+        return data.replace(hour=23, minute=59, second=59) if fim_do_dia else data
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(prog="M4_logistica", description="M4 Logística - operações sem interface gráfica.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    parser_importar = subparsers.add_parser('importar', help="Importa em lote entradas e saídas de um CSV ou planilha.")
+    parser_importar.add_argument('arquivo', help="Arquivo .csv ou .xlsx com as colunas do log (Data e Hora, Status, Nº do Contêiner, ...).")
+    parser_importar.add_argument('--rejeitos', help="Caminho do relatório de linhas rejeitadas (padrão: <arquivo>_rejeitados.csv).")
+    parser_auditar = subparsers.add_parser('auditar', help="Audita todo o histórico: dígitos de contêiner, CPFs e saídas órfãs.")
+    parser_auditar.add_argument('--saida', help="Caminho do relatório CSV (padrão: Auditoria_<data>.csv na pasta do sistema).")
+    parser_auditar.add_argument('--workers', type=int, help="Processos usados na leitura do histórico.")
+    parser_coordenador = subparsers.add_parser('coordenador', help="Inicia o coordenador que grava os movimentos de todos os terminais.")
+    parser_coordenador.add_argument('--host', default='127.0.0.1', help="Endereço em que o coordenador escuta (padrão: só esta máquina; "
+                                    "0.0.0.0 para a rede, exige M4_TOKEN_COORDENADOR).")
+    parser_coordenador.add_argument('--porta', type=int, default=PORTA_COORDENADOR, help=f"Porta TCP (padrão: {PORTA_COORDENADOR}).")
+    parser_indicadores = subparsers.add_parser('indicadores', help="Exporta os indicadores de movimentação e permanência para Excel.")
+    parser_indicadores.add_argument('--inicio', type=_ler_data_br, help="Primeiro dia do período (DD/MM/AAAA).")
+    parser_indicadores.add_argument('--fim', type=_ler_data_br, help="Último dia do período (DD/MM/AAAA).")
+    parser_indicadores.add_argument('--saida', help="Caminho do .xlsx (padrão: Indicadores_<data>.xlsx na pasta do sistema).")
+    parser_exportar = subparsers.add_parser('exportar', help="Exporta os movimentos de um período para .xlsx ou .csv, com filtros.")
+    parser_exportar.add_argument('--inicio', type=_ler_data_br, help="Primeiro dia do período (DD/MM/AAAA).")
+    parser_exportar.add_argument('--fim', type=_ler_data_br, help="Último dia do período (DD/MM/AAAA).")
+    parser_exportar.add_argument('--cliente', action='append', help="Cliente a incluir (pode ser repetido).")
+    parser_exportar.add_argument('--status', choices=['Entrada', 'Saída'], help="Só entradas ou só saídas.")
+    parser_exportar.add_argument('--tipo', action='append', help="Tipo de contêiner a incluir (pode ser repetido).")
+    parser_exportar.add_argument('--saida', help="Caminho do .xlsx ou .csv (padrão: Movimentos_<data>.xlsx na pasta do sistema).")
+    parser_romaneios = subparsers.add_parser('romaneios', help="Gera os romaneios das saídas de um turno ou período.")
+    parser_romaneios.add_argument('--inicio', required=True, type=_ler_data_hora_br, help="Início (DD/MM/AAAA ou DD/MM/AAAA HH:MM).")
+    parser_romaneios.add_argument('--fim', type=functools.partial(_ler_data_hora_br, fim_do_dia=True),
+                                  help="Fim (DD/MM/AAAA ou DD/MM/AAAA HH:MM; padrão: fim do dia do início).")
+    parser_romaneios.add_argument('--cliente', action='append', help="Cliente a incluir (pode ser repetido).")
+    parser_romaneios.add_argument('--individuais', action='store_true', help="Um PDF por saída em vez de um único PDF mesclado.")
+    parser_romaneios.add_argument('--saida', help="Caminho do PDF mesclado (padrão: ROMANEIOS_LOTE_<data>.pdf em Romaneios_PDF).")
+    parser_arquivar = subparsers.add_parser('arquivar', help="Compacta os meses fechados num arquivo único por mês.")
+    parser_arquivar.add_argument('--ate-mes', help="Último mês a arquivar (AAAA-MM; padrão: o mês anterior ao atual).")
+    parser_inicializacao = subparsers.add_parser('inicializacao', help="Mostra os tempos de abertura do programa e a meta.")
+    parser_inicializacao.add_argument('--ultimas', type=int, default=50, help="Quantidade de aberturas consideradas (padrão: 50).")
+    args = parser.parse_args(argv)
+    if args.comando == 'inicializacao':
+        relatorio = relatorio_inicializacao(args.ultimas)
+        if not relatorio['aberturas']:
+            print("Nenhuma abertura registrada ainda.")
+            return 0
+        print(f"Meta: formulário visível em até {relatorio['meta_s']:.2f} s. "
+              f"{relatorio['dentro_da_meta']} de {relatorio['aberturas']} abertura(s) dentro da meta.")
+        nomes = {'importacoes_s': 'Importações', 'janela_s': 'Formulário visível', 'pronto_s': 'Pátio pronto'}
+        for etapa, valores in relatorio['etapas'].items():
+            print(f"{nomes[etapa]:<20} mediana {valores['mediana']:6.2f} s   p90 {valores['p90']:6.2f} s   máx {valores['maximo']:6.2f} s")
+        return 0 if relatorio['ultima'].get('dentro_da_meta') else 2
+    if args.comando == 'indicadores':
+        caminho_saida = args.saida or os.path.join(_base_dir(), f"Indicadores_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+        exportar_indicadores(caminho_saida, args.inicio, args.fim)
+        print(f"Indicadores exportados: {caminho_saida}")
+        return 0
+    if args.comando == 'exportar':
+        caminho_saida = args.saida or os.path.join(_base_dir(), f"Movimentos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+        total = exportar_periodo(caminho_saida, args.inicio, args.fim, args.cliente, args.status, args.tipo)
+        print(f"{total} movimento(s) exportado(s): {caminho_saida}")
+        return 0
+    if args.comando == 'romaneios':
+        fim = args.fim or args.inicio.replace(hour=23, minute=59, second=59)
+        saidas = saidas_do_periodo(args.inicio, fim, args.cliente)
+        if not saidas:
+            print("Nenhuma saída no período.")
+            return 0
+        caminhos = gerar_romaneios_lote(saidas, mesclado=not args.individuais, caminho_mesclado=args.saida)
+        print(f"{len(saidas)} romaneio(s) gerado(s): {caminhos[0] if len(caminhos) == 1 else os.path.dirname(caminhos[0])}")
+        return 0
+    if args.comando == 'arquivar':
+        if args.ate_mes and not re.fullmatch(r'\d{4}-\d{2}', args.ate_mes):
+            print(f"Mês inválido: {args.ate_mes} (use AAAA-MM).", file=sys.stderr)
+            return 1
+        try:
+            resumo = arquivar_meses_fechados(args.ate_mes)
+        except (ErroMovimento, OSError) as e:
+            print(f"Erro no arquivamento: {e}", file=sys.stderr)
+            return 1
+        for mes, linhas in resumo['meses'].items():
+            print(f"{mes}: {linhas} movimento(s) arquivado(s) em {_caminho_arquivo_mensal(mes)}")
+        if not resumo['meses']: print("Nenhum mês fechado para arquivar.")
+        for pasta in resumo['nao_removidas']:
+            print(f"Aviso: a pasta {pasta} já está arquivada mas não pôde ser apagada; apague-a manualmente.", file=sys.stderr)
+        return 2 if resumo['nao_removidas'] else 0
+    if args.comando == 'coordenador':
+        return executar_coordenador(args.host, args.porta)
+    if args.comando == 'auditar':
+        relatorio = auditar_historico(max_workers=args.workers)
+        caminho_saida = args.saida or os.path.join(_base_dir(), f"Auditoria_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        relatorio.to_csv(caminho_saida, index=False, sep=';', encoding='utf-8-sig', date_format='%d/%m/%Y %H:%M')
+        for problema, quantidade in relatorio['Problema'].value_counts().items():
+            print(f"{quantidade:>8}  {problema}")
+        print(f"{len(relatorio)} problema(s) encontrado(s). Relatório: {caminho_saida}")
+        return 0 if relatorio.empty else 2
+    if args.comando == 'importar':
+        try:
+            resumo = importar_movimentos(args.arquivo, args.rejeitos)
+        except (ErroMovimento, OSError, ValueError) as e:
+            print(f"Erro na importação: {e}", file=sys.stderr)
+            return 1
+        print(f"{resumo['importados']} movimento(s) importado(s), {resumo['rejeitados']} rejeitado(s).")
+        if resumo['relatorio_rejeitos']:
+            print(f"Relatório de rejeitos: {resumo['relatorio_rejeitos']}")
+        return 0 if not resumo['rejeitados'] else 2
+    return 1
+
+# --- EXECUÇÃO EM SEGUNDO PLANO ---
+# Leituras pesadas rodam num pool de threads; gravações numa fila de um único worker, preservando a ordem
+# dos movimentos. O resultado volta ao loop do Tk por 'after', nunca tocando widgets fora da thread principal.
+_EXECUTORES = {}
+# CONTÊINERES COM GRAVAÇÃO EM ANDAMENTO (SÓ ACESSADO NA THREAD DO TK), CONTRA ENVIOS DUPLICADOS.
+_GRAVACOES_EM_ANDAMENTO = set()
+
+def _executor(nome, max_workers):
+    if nome not in _EXECUTORES:
+        _EXECUTORES[nome] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"m4_{nome}")
+    return _EXECUTORES[nome]
+
+def executar_em_segundo_plano(widget, funcao, *args, ao_concluir=None, ao_falhar=None, gravacao=False):
+    executor = _executor('gravacao', 1) if gravacao else _executor('leitura', 2)
+    futuro = executor.submit(funcao, *args)
+    def verificar():
+        try:
+            if not widget.winfo_exists(): return
+        except Exception:
+            return
+        if not futuro.done():
+            widget.after(INTERVALO_VERIFICACAO_MS, verificar); return
+        erro = futuro.exception()
+        if erro is None:
+            if ao_concluir: ao_concluir(futuro.result())
+        elif ao_falhar:
+            ao_falhar(erro)
+        else:
+            traceback.print_exception(type(erro), erro, erro.__traceback__)
+            messagebox.showerror("Erro", f"Ocorreu um erro:\n{erro}")
+    widget.after(INTERVALO_VERIFICACAO_MS, verificar)
+    return futuro
+
+def aquecer_sistema():
+    # RODA EM SEGUNDO PLANO LOGO QUE O FORMULÁRIO APARECE: IMPORTA AS BIBLIOTECAS ADIADAS E MONTA O ÍNDICE DO PÁTIO
+    # E AS SUGESTÕES DE PREENCHIMENTO (EM MEMÓRIA), PARA A PRIMEIRA SAÍDA OU CONSULTA NÃO PAGAR ESSE CUSTO.
+    with medir_operacao('aquecimento') as detalhes:
+        carregar_modulos_adiados()
+        no_patio = get_containers_no_patio()
+        carregar_sugestoes()
+        detalhes['linhas'] = len(no_patio)
+        return len(no_patio)
+
+def indicar_ocupado(ocupado, barra=None, widgets=()):
+    for w in widgets:
+        w.configure(state=DISABLED if ocupado else NORMAL)
+    if barra is not None:
+        if ocupado: barra.start(10)
+        else: barra.stop()
 
 # --- FUNÇÕES DE FORMATAÇÃO E AJUDA DA UI ---
 # ... (permanecem as mesmas)
@@ -209,72 +2305,294 @@ def limpar_campos():
     entry_lacre.delete(0, END); entry_nf.delete(0, END); entry_destino.delete(0, END); entry_obs.delete("1.0", END)
     entry_container.focus_set()
 
+def preencher_campos(dados):
+    # DEVOLVE AO FORMULÁRIO UMA ENTRADA QUE NÃO PÔDE SER GRAVADA, PARA O OPERADOR CORRIGIR E REGISTRAR DE NOVO.
+    limpar_campos()
+    for entry, coluna in ((entry_container, 'Nº do Contêiner'), (entry_placa, 'Placa do Veículo'), (entry_motorista, 'Motorista'),
+                          (entry_cliente, 'Cliente'), (entry_lacre, 'Nº do Lacre'), (entry_nf, 'Nota Fiscal (NF)'), (entry_destino, 'Destino')):
+        entry.insert(0, dados.get(coluna, ''))
+    if dados.get('CPF Motorista'): entry_cpf.insert(0, formatar_cpf_para_exibicao(dados['CPF Motorista']))
+    tipo_container_var.set(dados.get('Tipo de Contêiner') or TIPOS_CONTAINER[0]); condicao_var.set(dados.get('Condição') or CONDICOES[0])
+    entry_obs.insert("1.0", dados.get('Observações', ''))
+
+def ativar_sugestoes(entry_widget, campo, ao_escolher=None):
+    # LISTA SUSPENSA LOGO ABAIXO DO CAMPO: SETAS NAVEGAM, ENTER/TAB OU CLIQUE ESCOLHEM, ESC FECHA. OS BINDS FICAM NUMA
+    # BINDTAG PRÓPRIA (formatar_cpf_aprimorado DESFAZ E REFAZ OS BINDS DE <KeyRelease> DO WIDGET), À FRENTE DAS DEMAIS
+    # PARA QUE O "break" DE ENTER/TAB IMPEÇA A TROCA DE FOCO QUANDO UMA SUGESTÃO FOI ESCOLHIDA.
+    tag = f"{entry_widget}_sugestoes"
+    entry_widget.bindtags((tag,) + entry_widget.bindtags())
+    popup = {'janela': None, 'lista': None, 'valores': []}
+    exibir = formatar_cpf_para_exibicao if campo == 'CPF Motorista' else str
+    def esconder(event=None):
+        if popup['janela'] is not None:
+            popup['janela'].destroy()
+            popup['janela'] = None
+    def escolher(posicao):
+        valor = popup['valores'][posicao]
+        entry_widget.delete(0, END); entry_widget.insert(0, exibir(valor)); entry_widget.icursor(END)
+        esconder()
+        if ao_escolher: ao_escolher(valor)
+    def mostrar(valores):
+        if popup['janela'] is None:
+            janela = ttk.Toplevel(entry_widget)
+            janela.overrideredirect(True)
+            lista = Listbox(janela, exportselection=False, activestyle='none')
+            lista.pack(fill=BOTH, expand=True)
+            lista.bind("<ButtonRelease-1>", lambda e: escolher(lista.nearest(e.y)))
+            popup['janela'], popup['lista'] = janela, lista
+        lista = popup['lista']
+        popup['valores'] = valores
+        lista.delete(0, END)
+        for valor in valores: lista.insert(END, exibir(valor))
+        lista.configure(height=len(valores))
+        popup['janela'].geometry(f"{entry_widget.winfo_width()}x{lista.winfo_reqheight()}"
+                                 f"+{entry_widget.winfo_rootx()}+{entry_widget.winfo_rooty() + entry_widget.winfo_height()}")
+        popup['janela'].lift()
+    def ao_digitar(event):
+        if event.keysym in ('Up', 'Down', 'Return', 'KP_Enter', 'Tab', 'Escape') or event.keysym.startswith(('Shift', 'Control', 'Alt')):
+            return
+        texto = entry_widget.get()
+        valores = sugerir(campo, texto)
+        if not valores or (len(valores) == 1 and _chave_sugestao(campo, valores[0]) == _chave_sugestao(campo, texto)):
+            esconder(); return
+        mostrar(valores)
+    def mover(passo):
+        if popup['janela'] is None: return None
+        lista = popup['lista']
+        atual = lista.curselection()
+        posicao = max(0, min(len(popup['valores']) - 1, (atual[0] + passo) if atual else 0))
+        lista.selection_clear(0, END); lista.selection_set(posicao); lista.see(posicao)
+        return "break"
+    def confirmar(event):
+        if popup['janela'] is None or not popup['lista'].curselection(): return None
+        escolher(popup['lista'].curselection()[0])
+        return "break"
+    entry_widget.bind_class(tag, "<KeyRelease>", ao_digitar)
+    entry_widget.bind_class(tag, "<Down>", lambda e: mover(1))
+    entry_widget.bind_class(tag, "<Up>", lambda e: mover(-1))
+    entry_widget.bind_class(tag, "<Return>", confirmar)
+    entry_widget.bind_class(tag, "<Tab>", confirmar)
+    entry_widget.bind_class(tag, "<Escape>", esconder)
+    # O CLIQUE NA LISTA TIRA O FOCO DO CAMPO: ESPERA UM POUCO PARA O CLIQUE SER TRATADO ANTES DE FECHAR.
+    entry_widget.bind_class(tag, "<FocusOut>", lambda e: entry_widget.after(200, esconder))
+
+def preencher_dados_do_motorista(nome_motorista, entries):
+    # O CPF É DO MOTORISTA E SEMPRE É SUBSTITUÍDO; PLACAS E TRANSPORTADORA SÓ PREENCHEM CAMPOS AINDA VAZIOS.
+    dados = dados_do_motorista(nome_motorista)
+    for campo, entry_widget in entries.items():
+        valor = dados.get(campo)
+        if not valor or (campo != 'CPF Motorista' and entry_widget.get().strip()): continue
+        entry_widget.delete(0, END)
+        entry_widget.insert(0, formatar_cpf_para_exibicao(valor) if campo == 'CPF Motorista' else valor)
+
+# --- LISTA DE PÁTIO PAGINADA E PESQUISÁVEL ---
+COLUNAS_AUXILIARES_PATIO = ['Dias no Pátio', '_busca']
+
+def preparar_df_patio(df_patio):
+    if df_patio.empty: return df_patio
+    df = df_patio.copy()
+    df['Dias no Pátio'] = (datetime.now() - df['Data e Hora']).dt.days
+    chave_busca = None
+    for col in COLUNAS_BUSCA_PATIO:
+        parte = df[col].fillna('').astype(str).str.upper() if col in df else ''
+        chave_busca = parte if chave_busca is None else chave_busca + '\x1f' + parte
+    df['_busca'] = chave_busca
+    return df
+
+def carregar_patio_para_exibicao():
+    return preparar_df_patio(get_containers_no_patio())
+
+def _valor_exibicao(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)): return ''
+    if isinstance(valor, datetime): return valor.strftime('%d/%m/%Y %H:%M')
+    return str(valor)
+
+def criar_lista_patio(parent, colunas, ordem_inicial=('Data e Hora', False)):
+    # 'colunas' = [(título exibido, coluna do DataFrame)]. O iid de cada linha é o nº do contêiner, o que permite
+    # atualizar só as linhas que mudaram em vez de limpar o Treeview a cada recarga.
+    estado = {'df': pd.DataFrame(), 'visivel': pd.DataFrame(), 'pagina': 0, 'ordem': ordem_inicial, 'busca_agendada': None}
+    titulos = [titulo for titulo, _ in colunas]
+    colunas_df = [coluna for _, coluna in colunas]
+
+    frame_busca = ttk.Frame(parent)
+    frame_busca.pack(fill=X, padx=10, pady=(5, 0))
+    ttk.Label(frame_busca, text="Buscar (contêiner, cliente ou placa):").pack(side=LEFT)
+    busca_var = ttk.StringVar()
+    entry_busca = ttk.Entry(frame_busca, textvariable=busca_var, width=40)
+    entry_busca.pack(side=LEFT, padx=5)
+    tree = ttk.Treeview(parent, columns=titulos, show='headings')
+    tree.pack(expand=True, fill=BOTH, padx=10, pady=5)
+    frame_paginas = ttk.Frame(parent)
+    frame_paginas.pack(pady=(0, 5))
+    botao_anterior = ttk.Button(frame_paginas, text="< Anterior", bootstyle="secondary-outline")
+    botao_anterior.pack(side=LEFT, padx=5)
+    info_pagina = ttk.Label(frame_paginas, text="")
+    info_pagina.pack(side=LEFT, padx=10)
+    botao_proxima = ttk.Button(frame_paginas, text="Próxima >", bootstyle="secondary-outline")
+    botao_proxima.pack(side=LEFT, padx=5)
+
+    def atualizar_cabecalhos():
+        coluna_ordem, crescente = estado['ordem']
+        for titulo, coluna in colunas:
+            seta = (' ▲' if crescente else ' ▼') if coluna == coluna_ordem else ''
+            tree.heading(titulo, text=titulo + seta)
+
+    def renderizar_pagina():
+        df = estado['visivel']
+        total_paginas = max(1, math.ceil(len(df) / TAMANHO_PAGINA_PATIO))
+        estado['pagina'] = min(max(estado['pagina'], 0), total_paginas - 1)
+        inicio = estado['pagina'] * TAMANHO_PAGINA_PATIO
+        pagina_df = df.iloc[inicio:inicio + TAMANHO_PAGINA_PATIO]
+        desejados = [
+            (str(registro['Nº do Contêiner']), tuple(_valor_exibicao(registro.get(c)) for c in colunas_df))
+            for registro in pagina_df.to_dict('records')
+        ]
+        manter = {iid for iid, _ in desejados}
+        remover = [iid for iid in tree.get_children() if iid not in manter]
+        if remover: tree.delete(*remover)
+        for posicao, (iid, valores) in enumerate(desejados):
+            if tree.exists(iid):
+                if tuple(str(v) for v in tree.item(iid, 'values')) != valores: tree.item(iid, values=valores)
+                if tree.index(iid) != posicao: tree.move(iid, '', posicao)
+            else:
+                tree.insert('', posicao, iid=iid, values=valores)
+        info_pagina.config(text=f"Página {estado['pagina'] + 1} de {total_paginas}  |  {len(df)} de {len(estado['df'])} contêiner(es)")
+        botao_anterior.configure(state=NORMAL if estado['pagina'] > 0 else DISABLED)
+        botao_proxima.configure(state=NORMAL if estado['pagina'] < total_paginas - 1 else DISABLED)
+
+    def aplicar_filtro_e_ordem(voltar_ao_inicio=False):
+        estado['busca_agendada'] = None
+        df = estado['df']
+        termo = busca_var.get().strip().upper()
+        if termo and not df.empty:
+            df = df[df['_busca'].str.contains(termo, regex=False)]
+        coluna_ordem, crescente = estado['ordem']
+        if coluna_ordem in df:
+            df = df.sort_values(by=coluna_ordem, ascending=crescente, na_position='last', kind='stable')
+        estado['visivel'] = df
+        if voltar_ao_inicio: estado['pagina'] = 0
+        atualizar_cabecalhos()
+        renderizar_pagina()
+
+    def agendar_busca(event=None):
+        if estado['busca_agendada'] is not None: parent.after_cancel(estado['busca_agendada'])
+        estado['busca_agendada'] = parent.after(ATRASO_BUSCA_MS, lambda: aplicar_filtro_e_ordem(voltar_ao_inicio=True))
+
+    def ordenar_por(coluna):
+        coluna_ordem, crescente = estado['ordem']
+        estado['ordem'] = (coluna, not crescente if coluna == coluna_ordem else True)
+        aplicar_filtro_e_ordem(voltar_ao_inicio=True)
+
+    def mudar_pagina(delta):
+        estado['pagina'] += delta
+        renderizar_pagina()
+
+    def definir_dados(df_preparado):
+        estado['df'] = df_preparado
+        aplicar_filtro_e_ordem()
+
+    def registro_selecionado():
+        iid = tree.focus()
+        df = estado['df']
+        if not iid or df.empty: return None
+        linhas = df[df['Nº do Contêiner'].astype(str) == iid]
+        if linhas.empty: return None
+        return linhas.drop(columns=COLUNAS_AUXILIARES_PATIO, errors='ignore').iloc[0].to_dict()
+
+    for titulo, coluna in colunas:
+        tree.heading(titulo, text=titulo, command=lambda c=coluna: ordenar_por(c))
+        tree.column(titulo, width=180, anchor=CENTER)
+    entry_busca.bind("<KeyRelease>", agendar_busca)
+    botao_anterior.configure(command=lambda: mudar_pagina(-1))
+    botao_proxima.configure(command=lambda: mudar_pagina(1))
+    atualizar_cabecalhos()
+    return {'tree': tree, 'definir_dados': definir_dados, 'registro_selecionado': registro_selecionado, 'entry_busca': entry_busca}
+
 # --- JANELAS DA APLICAÇÃO ---
 def abrir_janela_patio():
     patio_window = ttk.Toplevel(title="Controle de Pátio - Contêineres Presentes")
-    patio_window.geometry("950x500"); patio_window.transient(app); patio_window.grab_set()
+    patio_window.geometry("950x560"); patio_window.transient(app); patio_window.grab_set()
+    estado = {'carregando': False}
+    def exibir_dados_patio(df_preparado):
+        estado['carregando'] = False
+        indicar_ocupado(False, barra_progresso, (botao_atualizar,))
+        lista['definir_dados'](df_preparado)
+        if df_preparado.empty:
+            status_label.config(text="Nenhum contêiner no pátio.")
+            messagebox.showinfo("Pátio Vazio", "Nenhum contêiner encontrado no pátio.", parent=patio_window)
+            return
+        status_label.config(text=f"{len(df_preparado)} contêiner(es) no pátio. Atualizado às {datetime.now().strftime('%H:%M:%S')}.")
+    def falha_dados_patio(e):
+        estado['carregando'] = False
+        indicar_ocupado(False, barra_progresso, (botao_atualizar,))
+        status_label.config(text="")
+        messagebox.showerror("Erro ao Ler Histórico", f"Ocorreu um erro:\n{e}", parent=patio_window)
     def carregar_dados_patio():
-        for item in tree.get_children(): tree.delete(item)
-        try:
-            containers_no_patio = get_containers_no_patio()
-            if containers_no_patio.empty:
-                messagebox.showinfo("Pátio Vazio", "Nenhum contêiner encontrado no pátio.", parent=patio_window)
-                return
-            df_para_exibir = containers_no_patio.copy()
-            agora = datetime.now()
-            df_para_exibir['Dias no Pátio'] = (agora - df_para_exibir['Data e Hora']).dt.days
-            df_para_exibir['Data e Hora'] = df_para_exibir['Data e Hora'].dt.strftime('%d/%m/%Y %H:%M')
-            for _, row in df_para_exibir.iterrows():
-                tree.insert("", END, values=(
-                    row.get('Nº do Contêiner', ''), row.get('Cliente', ''), 
-                    row.get('Data e Hora', ''), row.get('Dias no Pátio', '')
-                ))
-        except Exception as e:
-            messagebox.showerror("Erro ao Ler Histórico", f"Ocorreu um erro:\n{e}", parent=patio_window)
-    ttk.Button(patio_window, text="Atualizar Lista", command=carregar_dados_patio, bootstyle="info").pack(pady=10)
-    cols = ('Nº do Contêiner', 'Cliente', 'Data de Entrada', 'Dias no Pátio')
-    tree = ttk.Treeview(patio_window, columns=cols, show='headings')
-    for col in cols: 
-        tree.heading(col, text=col)
-        tree.column(col, width=180, anchor=CENTER)
-    tree.pack(expand=True, fill=BOTH, padx=10, pady=5)
+        if estado['carregando']: return
+        estado['carregando'] = True
+        status_label.config(text="Carregando histórico...")
+        indicar_ocupado(True, barra_progresso, (botao_atualizar,))
+        executar_em_segundo_plano(patio_window, carregar_patio_para_exibicao, ao_concluir=exibir_dados_patio, ao_falhar=falha_dados_patio)
+    botao_atualizar = ttk.Button(patio_window, text="Atualizar Lista", command=carregar_dados_patio, bootstyle="info")
+    botao_atualizar.pack(pady=10)
+    barra_progresso = ttk.Progressbar(patio_window, mode='indeterminate', bootstyle="info-striped")
+    barra_progresso.pack(fill=X, padx=10)
+    status_label = ttk.Label(patio_window, text="")
+    status_label.pack(pady=(5, 0))
+    lista = criar_lista_patio(patio_window, [
+        ('Nº do Contêiner', 'Nº do Contêiner'), ('Cliente', 'Cliente'), ('Placa do Veículo', 'Placa do Veículo'),
+        ('Data de Entrada', 'Data e Hora'), ('Dias no Pátio', 'Dias no Pátio')
+    ], ordem_inicial=('Dias no Pátio', False))
+    for col in ('Nº do Contêiner', 'Cliente', 'Placa do Veículo', 'Data de Entrada', 'Dias no Pátio'):
+        lista['tree'].column(col, width=170)
+    lista['entry_busca'].focus_set()
     carregar_dados_patio()
 
 def abrir_janela_saida():
     selecao_window = ttk.Toplevel(title="Registrar Saída - Etapa 1 de 2")
-    selecao_window.geometry("800x500"); selecao_window.transient(app); selecao_window.grab_set()
-    df_patio_cache = {'value': pd.DataFrame()}
+    selecao_window.geometry("800x560"); selecao_window.transient(app); selecao_window.grab_set()
+    estado = {'carregando': False}
+    def exibir_containers_patio(df_preparado):
+        estado['carregando'] = False
+        indicar_ocupado(False, barra_progresso, (botao_proximo,))
+        lista['definir_dados'](df_preparado)
+        if df_preparado.empty:
+            info_label.config(text="Nenhum contêiner no pátio.")
+        else:
+            info_label.config(text="Selecione o contêiner que está saindo:")
+    def falha_containers_patio(e):
+        estado['carregando'] = False
+        indicar_ocupado(False, barra_progresso, (botao_proximo,))
+        info_label.config(text="Falha ao carregar o pátio.")
+        messagebox.showerror("Erro ao Ler Histórico", f"Ocorreu um erro:\n{e}", parent=selecao_window)
     def carregar_containers_patio():
-        for item in tree.get_children(): tree.delete(item)
-        try:
-            df_patio = get_containers_no_patio()
-            df_patio_cache['value'] = df_patio
-            if df_patio.empty:
-                info_label.config(text="Nenhum contêiner no pátio.")
-            else:
-                info_label.config(text="Selecione o contêiner que está saindo:")
-                for idx, row in df_patio.iterrows():
-                    tree.insert("", END, values=[row.get(col, '') for col in COLUNAS_ORDENADAS], tags=(idx,))
-        except Exception as e:
-            messagebox.showerror("Erro ao Ler Histórico", f"Ocorreu um erro:\n{e}", parent=selecao_window)
+        if estado['carregando']: return
+        estado['carregando'] = True
+        info_label.config(text="Carregando...")
+        indicar_ocupado(True, barra_progresso, (botao_proximo,))
+        executar_em_segundo_plano(selecao_window, carregar_patio_para_exibicao, ao_concluir=exibir_containers_patio, ao_falhar=falha_containers_patio)
     def on_selecionar_container():
-        selecionado = tree.focus()
-        if not selecionado:
+        if not lista['tree'].focus():
             messagebox.showwarning("Atenção", "Nenhum contêiner foi selecionado.", parent=selecao_window); return
-        index_selecionado = tree.item(selecionado)['tags'][0]
-        df_patio = df_patio_cache['value']
-        if index_selecionado not in df_patio.index:
+        dados_originais = lista['registro_selecionado']()
+        if dados_originais is None:
             messagebox.showerror("Erro", "Não foi possível localizar o registro selecionado.", parent=selecao_window); return
-        dados_originais = df_patio.loc[index_selecionado].to_dict()
+        if dados_originais['Nº do Contêiner'] in _GRAVACOES_EM_ANDAMENTO:
+            messagebox.showwarning("Atenção", "Já existe uma gravação em andamento para este contêiner.", parent=selecao_window); return
         selecao_window.destroy()
         abrir_janela_dados_saida_e_romaneio(dados_originais)
     info_label = ttk.Label(selecao_window, text="Carregando...", font=("-size 12 -weight bold"))
     info_label.pack(pady=(10, 5))
-    tree = ttk.Treeview(selecao_window, columns=COLUNAS_ORDENADAS, displaycolumns=('Nº do Contêiner', 'Cliente', 'Placa do Veículo', 'Data e Hora'), show='headings')
-    for col in ('Nº do Contêiner', 'Cliente', 'Placa do Veículo', 'Data e Hora'):
-        tree.heading(col, text=col); tree.column(col, width=180)
-    tree.pack(expand=True, fill=BOTH, padx=10, pady=5)
-    ttk.Button(selecao_window, text="Próximo -> Preencher Dados de Saída", command=on_selecionar_container, bootstyle="primary", padding=10).pack(pady=10)
+    barra_progresso = ttk.Progressbar(selecao_window, mode='indeterminate', bootstyle="info-striped")
+    barra_progresso.pack(fill=X, padx=10)
+    lista = criar_lista_patio(selecao_window, [
+        ('Nº do Contêiner', 'Nº do Contêiner'), ('Cliente', 'Cliente'),
+        ('Placa do Veículo', 'Placa do Veículo'), ('Data e Hora', 'Data e Hora')
+    ])
+    lista['tree'].bind("<Double-1>", lambda e: on_selecionar_container())
+    botao_proximo = ttk.Button(selecao_window, text="Próximo -> Preencher Dados de Saída", command=on_selecionar_container, bootstyle="primary", padding=10)
+    botao_proximo.pack(pady=10)
+    lista['entry_busca'].focus_set()
     carregar_containers_patio()
 
 def abrir_janela_dados_saida_e_romaneio(dados_container):
@@ -296,7 +2614,12 @@ def abrir_janela_dados_saida_e_romaneio(dados_container):
         entries[campo].grid(row=i, column=1, padx=5, pady=5, sticky='w')
         if "Placa" in campo: entries[campo].bind("<KeyRelease>", lambda e, w=entries[campo]: formatar_texto_maiusculo(e, w))
         if "CPF" in campo: entries[campo].bind("<KeyRelease>", lambda e, w=entries[campo]: formatar_cpf_aprimorado(e, w))
-    campos_romaneio = ['Tara', 'Peso Bruto Carga', 'Booking', 'Armador', 'Navio', 'Deadline']
+    for campo in campos_transporte:
+        ao_escolher = None
+        if campo == 'Motorista':
+            ao_escolher = lambda nome: preencher_dados_do_motorista(nome, {c: entries[c] for c in CAMPOS_DO_MOTORISTA})
+        ativar_sugestoes(entries[campo], campo, ao_escolher)
+    campos_romaneio = CAMPOS_ROMANEIO
     for i, campo in enumerate(campos_romaneio):
         ttk.Label(frame_romaneio, text=f"{campo}:").grid(row=i % 3, column=(i // 3) * 2, padx=5, pady=5, sticky='w')
         entries[campo] = ttk.Entry(frame_romaneio, width=30)
@@ -311,63 +2634,349 @@ def abrir_janela_dados_saida_e_romaneio(dados_container):
             messagebox.showerror("CPF Inválido", f"O CPF '{dados_novos['CPF Motorista']}' é inválido.", parent=dialog); return
         if not all(dados_novos[k] for k in campos_romaneio):
             messagebox.showwarning("Atenção", "Todos os campos do Romaneio devem ser preenchidos.", parent=dialog); return
-        try:
-            data_entrada_original = dados_container['Data e Hora']
-            caminho_log_entrada = os.path.join(_base_dir(), PASTA_LOGS_EXCEL, data_entrada_original.strftime('%Y-%m-%d'), f"Log_Diario_{data_entrada_original.strftime('%Y-%m-%d')}.xlsx")
-            if not os.path.exists(caminho_log_entrada):
-                messagebox.showerror("Erro Crítico", f"Arquivo de log da entrada não encontrado.", parent=dialog); return
-            
-            df_log_entrada = pd.read_excel(caminho_log_entrada, dtype=DTYPE_COLS)
-            df_log_entrada['Data e Hora'] = pd.to_datetime(df_log_entrada['Data e Hora'])
-            indice_para_atualizar = df_log_entrada[df_log_entrada['Data e Hora'] == data_entrada_original].index
-            if indice_para_atualizar.empty:
-                messagebox.showerror("Erro Crítico", "Não foi possível encontrar a linha de entrada original no log.", parent=dialog); return
-            for campo_romaneio in campos_romaneio:
-                 df_log_entrada.loc[indice_para_atualizar, campo_romaneio] = dados_novos[campo_romaneio]
-            salvar_planilha(df_log_entrada, caminho_log_entrada)
-            
-            dados_finais_saida = dados_container.copy()
-            dados_finais_saida.update(dados_novos)
-            dados_finais_saida['CPF Motorista'] = cpf_limpo
-            dados_finais_saida['Status'] = 'Saída'
-            dados_finais_saida['Data e Hora'] = datetime.now()
-            tempo_de_patio = dados_finais_saida['Data e Hora'] - data_entrada_original
-            dados_finais_saida['Tempo de Pátio (Dias)'] = tempo_de_patio.days
-            
-            registrar_movimento(dados_finais_saida)
-            
-            os.makedirs(os.path.join(_base_dir(), PASTA_ROMANEIOS_PDF), exist_ok=True)
-            nome_pdf = f"ROMANEIO_{dados_finais_saida['Nº do Contêiner'].replace('/', '-')}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
-            caminho_pdf = os.path.join(_base_dir(), PASTA_ROMANEIOS_PDF, nome_pdf)
-            pdf = FPDF(); pdf.add_page(); pdf.set_auto_page_break(auto=True, margin=15)
-            pdf.set_font("Helvetica", "B", 16)
-            pdf.cell(0, 10, "Romaneio de Transporte", new_x="LMARGIN", new_y="NEXT", align="C")
-            pdf.ln(10)
-            dados_pdf = {
-                'Nº do Contêiner': dados_finais_saida['Nº do Contêiner'], 'Cliente': dados_finais_saida['Cliente'],
-                'Placa do Veículo': dados_finais_saida['Placa do Veículo'], 'Placa Carreta': dados_finais_saida['Placa Carreta'],
-                'Motorista': dados_finais_saida['Motorista'], 'CPF': formatar_cpf_para_exibicao(dados_finais_saida['CPF Motorista']),
-                'Transportadora': dados_finais_saida['Transportadora'], 'Nº do Lacre': dados_finais_saida['Nº do Lacre'],
-                'Tara': dados_finais_saida['Tara'], 'Peso da Carga': dados_finais_saida['Peso Bruto Carga'],
-                'Booking': dados_finais_saida['Booking'], 'Armador': dados_finais_saida['Armador'],
-                'Navio': dados_finais_saida['Navio'], 'Deadline': dados_finais_saida['Deadline'],
-                'Destino': dados_finais_saida['Destino']
-            }
-            for chave, valor in dados_pdf.items(): 
-                pdf.set_font("Helvetica", "B", 12); pdf.cell(45, 10, f"{chave}:", border=0)
-                pdf.set_font("Helvetica", "", 12); pdf.multi_cell(0, 10, str(valor), border=0, new_x="LMARGIN", new_y="NEXT")
-            pdf.ln(20); pdf.cell(0, 10, "________________________________________", new_x="LMARGIN", new_y="NEXT", align="C")
-            pdf.cell(0, 10, "Assinatura Motorista", new_x="LMARGIN", new_y="NEXT", align="C")
-            pdf.output(caminho_pdf)
+        if estado_saida['salvando']: return
+        estado_saida['salvando'] = True
+        numero_container = dados_container['Nº do Contêiner']
+        _GRAVACOES_EM_ANDAMENTO.add(numero_container)
+        indicar_ocupado(True, barra_progresso, (botao_confirmar,))
+        def saida_concluida(caminho_pdf):
+            _GRAVACOES_EM_ANDAMENTO.discard(numero_container)
             messagebox.showinfo("Sucesso", f"Saída registrada e Romaneio gerado!\nSalvo em: {caminho_pdf}", parent=dialog)
             dialog.destroy()
-        except Exception as e:
-            traceback.print_exc()
+        def saida_falhou(e):
+            _GRAVACOES_EM_ANDAMENTO.discard(numero_container)
+            estado_saida['salvando'] = False
+            indicar_ocupado(False, barra_progresso, (botao_confirmar,))
+            if isinstance(e, ErroMovimento):
+                messagebox.showerror("Erro Crítico", str(e), parent=dialog); return
+            traceback.print_exception(type(e), e, e.__traceback__)
             messagebox.showerror("Erro Detalhado", f"Ocorreu um erro completo no processo de saída:\n\n{e}\n\nVerifique o terminal para mais detalhes.")
-    ttk.Button(dialog, text="Confirmar Saída e Gerar Documentos", command=on_confirmar_tudo, bootstyle="success", padding=10).pack(pady=20)
+        executar_em_segundo_plano(dialog, processar_saida, dados_container, dados_novos, campos_romaneio,
+                                  ao_concluir=saida_concluida, ao_falhar=saida_falhou, gravacao=True)
+    estado_saida = {'salvando': False}
+    def ao_fechar_dialogo():
+        if estado_saida['salvando']:
+            messagebox.showwarning("Aguarde", "A saída ainda está sendo gravada.", parent=dialog); return
+        dialog.destroy()
+    dialog.protocol("WM_DELETE_WINDOW", ao_fechar_dialogo)
+    barra_progresso = ttk.Progressbar(dialog, mode='indeterminate', bootstyle="success-striped")
+    barra_progresso.pack(fill=X, padx=10)
+    botao_confirmar = ttk.Button(dialog, text="Confirmar Saída e Gerar Documentos", command=on_confirmar_tudo, bootstyle="success", padding=10)
+    botao_confirmar.pack(pady=20)
+
+def abrir_janela_diagnostico():
+    diag_window = ttk.Toplevel(title="Diagnóstico - Tempos das Operações")
+    diag_window.geometry("980x560"); diag_window.transient(app)
+    frame_controles = ttk.Frame(diag_window, padding=10)
+    frame_controles.pack(fill=X)
+    metricas_var = ttk.BooleanVar(value=_METRICAS['ativas'])
+    ttk.Checkbutton(frame_controles, text="Registrar métricas", variable=metricas_var, bootstyle="round-toggle",
+                    command=lambda: definir_metricas_ativas(metricas_var.get())).pack(side=LEFT, padx=5)
+    def solicitar_perfil():
+        perfilar_proxima_operacao('*')
+        perfil_label.config(text="A próxima operação será perfilada (cProfile) e salva na pasta Metricas.")
+    ttk.Button(frame_controles, text="Perfilar Próxima Ação", command=solicitar_perfil, bootstyle="warning-outline").pack(side=LEFT, padx=5)
+    ttk.Button(frame_controles, text="Abrir Pasta de Métricas", bootstyle="secondary-outline",
+               command=lambda: _abrir_no_sistema(os.path.join(_base_dir(), PASTA_METRICAS))).pack(side=LEFT, padx=5)
+    perfil_label = ttk.Label(diag_window, text="")
+    perfil_label.pack(fill=X, padx=10)
+    relatorio_abertura = relatorio_inicializacao()
+    if relatorio_abertura['ultima']:
+        ultima = relatorio_abertura['ultima']
+        texto_abertura = (f"Última abertura: formulário em {ultima.get('janela_s', 0):.2f} s (meta {relatorio_abertura['meta_s']:.2f} s)"
+                          + (f", pátio pronto em {ultima['pronto_s']:.2f} s" if 'pronto_s' in ultima else '')
+                          + f". {relatorio_abertura['dentro_da_meta']} de {relatorio_abertura['aberturas']} aberturas dentro da meta.")
+        ttk.Label(diag_window, text=texto_abertura, bootstyle="success" if ultima.get('dentro_da_meta') else "warning").pack(fill=X, padx=10)
+    colunas_resumo = ('Operação', 'Chamadas', 'Mediana (ms)', 'Máximo (ms)', 'Total (ms)')
+    tree_resumo = ttk.Treeview(diag_window, columns=colunas_resumo, show='headings', height=6)
+    for col in colunas_resumo:
+        tree_resumo.heading(col, text=col); tree_resumo.column(col, width=150, anchor=CENTER)
+    tree_resumo.pack(fill=X, padx=10, pady=5)
+    colunas_recentes = ('Quando', 'Operação', 'Duração (ms)', 'Linhas', 'Tamanho (KB)', 'Arquivo')
+    tree_recentes = ttk.Treeview(diag_window, columns=colunas_recentes, show='headings')
+    for col in colunas_recentes:
+        tree_recentes.heading(col, text=col); tree_recentes.column(col, width=150, anchor=CENTER)
+    tree_recentes.pack(expand=True, fill=BOTH, padx=10, pady=5)
+    estado = {'exibidos': None}
+    def atualizar():
+        if not diag_window.winfo_exists(): return
+        recentes = metricas_recentes()
+        ultimo = recentes[-1]['quando'] if recentes else None
+        if ultimo != estado['exibidos']:
+            estado['exibidos'] = ultimo
+            tree_recentes.delete(*tree_recentes.get_children())
+            for registro in reversed(recentes[-200:]):
+                tamanho = registro.get('bytes')
+                tree_recentes.insert("", END, values=(
+                    registro['quando'][11:], registro['operacao'], f"{registro['duracao_ms']:.1f}", registro.get('linhas', ''),
+                    f"{tamanho / 1024:.1f}" if tamanho else '', registro.get('arquivo', '')
+                ))
+            tree_resumo.delete(*tree_resumo.get_children())
+            por_operacao = {}
+            for registro in recentes:
+                por_operacao.setdefault(registro['operacao'], []).append(registro['duracao_ms'])
+            for operacao, duracoes in sorted(por_operacao.items(), key=lambda item: -sum(item[1])):
+                duracoes.sort()
+                tree_resumo.insert("", END, values=(operacao, len(duracoes), f"{duracoes[len(duracoes) // 2]:.1f}",
+                                                     f"{duracoes[-1]:.1f}", f"{sum(duracoes):.1f}"))
+        diag_window.after(1000, atualizar)
+    atualizar()
+
+def abrir_janela_indicadores():
+    ind_window = ttk.Toplevel(title="Indicadores - Movimentação e Permanência")
+    ind_window.geometry("1100x620"); ind_window.transient(app)
+    hoje = datetime.now()
+    frame_filtros = ttk.Frame(ind_window, padding=10)
+    frame_filtros.pack(fill=X)
+    ttk.Label(frame_filtros, text="De:").pack(side=LEFT)
+    inicio_var = ttk.StringVar(value=hoje.replace(day=1).strftime('%d/%m/%Y'))
+    ttk.Entry(frame_filtros, textvariable=inicio_var, width=12).pack(side=LEFT, padx=(5, 15))
+    ttk.Label(frame_filtros, text="Até:").pack(side=LEFT)
+    fim_var = ttk.StringVar(value=hoje.strftime('%d/%m/%Y'))
+    ttk.Entry(frame_filtros, textvariable=fim_var, width=12).pack(side=LEFT, padx=(5, 15))
+    botao_atualizar = ttk.Button(frame_filtros, text="Atualizar", bootstyle="info")
+    botao_atualizar.pack(side=LEFT, padx=5)
+    botao_exportar = ttk.Button(frame_filtros, text="Exportar para Excel", bootstyle="success-outline")
+    botao_exportar.pack(side=LEFT, padx=5)
+    barra_progresso = ttk.Progressbar(ind_window, mode='indeterminate', bootstyle="info-striped")
+    barra_progresso.pack(fill=X, padx=10)
+    status_label = ttk.Label(ind_window, text="")
+    status_label.pack(fill=X, padx=10, pady=(5, 0))
+    abas = ttk.Notebook(ind_window)
+    abas.pack(expand=True, fill=BOTH, padx=10, pady=10)
+    arvores = {}
+    estado = {'relatorio': None, 'periodo': None}
+
+    def periodo_informado():
+        try:
+            inicio = datetime.strptime(inicio_var.get().strip(), '%d/%m/%Y')
+            fim = datetime.strptime(fim_var.get().strip(), '%d/%m/%Y')
+        except ValueError:
+            messagebox.showerror("Período Inválido", "Informe as datas no formato DD/MM/AAAA.", parent=ind_window)
+            return None
+        if inicio > fim:
+            messagebox.showerror("Período Inválido", "A data inicial é posterior à data final.", parent=ind_window)
+            return None
+        return inicio, fim
+
+    def exibir_relatorio(relatorio):
+        indicar_ocupado(False, barra_progresso, (botao_atualizar, botao_exportar))
+        estado['relatorio'] = relatorio
+        for nome_aba, df in relatorio.items():
+            if nome_aba not in arvores:
+                frame_aba = ttk.Frame(abas)
+                abas.add(frame_aba, text=nome_aba)
+                tree = ttk.Treeview(frame_aba, show='headings')
+                scrollbar = ttk.Scrollbar(frame_aba, orient=VERTICAL, command=tree.yview)
+                tree.configure(yscrollcommand=scrollbar.set)
+                scrollbar.pack(side=RIGHT, fill=Y)
+                tree.pack(expand=True, fill=BOTH)
+                arvores[nome_aba] = tree
+            tree = arvores[nome_aba]
+            tree.delete(*tree.get_children())
+            tree.configure(columns=list(df.columns))
+            for col in df.columns:
+                tree.heading(col, text=col); tree.column(col, width=110 if col != df.columns[0] else 170, anchor=CENTER)
+            for linha in df.itertuples(index=False, name=None):
+                tree.insert("", END, values=[valor.strftime('%d/%m/%Y') if isinstance(valor, datetime) else _valor_exibicao(valor)
+                                             for valor in linha])
+        movimentos = relatorio['Movimentos por Dia']
+        status_label.config(text=f"{int(movimentos['Entradas'].sum())} entrada(s) e {int(movimentos['Saídas'].sum())} saída(s) "
+                                 f"no período. Atualizado às {datetime.now().strftime('%H:%M:%S')}.")
+
+    def falha(e):
+        indicar_ocupado(False, barra_progresso, (botao_atualizar, botao_exportar))
+        status_label.config(text="")
+        messagebox.showerror("Erro nos Indicadores", f"Ocorreu um erro:\n{e}", parent=ind_window)
+
+    def carregar():
+        periodo = periodo_informado()
+        if periodo is None: return
+        estado['periodo'] = periodo
+        status_label.config(text="Calculando indicadores...")
+        indicar_ocupado(True, barra_progresso, (botao_atualizar, botao_exportar))
+        executar_em_segundo_plano(ind_window, relatorio_indicadores, *periodo, ao_concluir=exibir_relatorio, ao_falhar=falha)
+
+    def exportar():
+        if estado['relatorio'] is None: return
+        inicio, fim = estado['periodo']
+        caminho = filedialog.asksaveasfilename(
+            parent=ind_window, defaultextension=".xlsx", filetypes=[("Planilha Excel", "*.xlsx")], initialdir=_base_dir(),
+            initialfile=f"Indicadores_{inicio.strftime('%Y%m%d')}_{fim.strftime('%Y%m%d')}.xlsx")
+        if not caminho: return
+        def exportado(caminho_arquivo):
+            indicar_ocupado(False, barra_progresso, (botao_atualizar, botao_exportar))
+            status_label.config(text=f"Indicadores exportados para {caminho_arquivo}.")
+            if messagebox.askyesno("Exportação Concluída", "Deseja abrir a planilha agora?", parent=ind_window):
+                _abrir_no_sistema(caminho_arquivo)
+        indicar_ocupado(True, barra_progresso, (botao_atualizar, botao_exportar))
+        executar_em_segundo_plano(ind_window, exportar_indicadores, caminho, inicio, fim, estado['relatorio'],
+                                  ao_concluir=exportado, ao_falhar=falha)
+
+    botao_atualizar.config(command=carregar)
+    botao_exportar.config(command=exportar)
+    carregar()
+
+def abrir_janela_exportacao():
+    exp_window = ttk.Toplevel(title="Exportar Movimentos por Período")
+    exp_window.geometry("560x300"); exp_window.transient(app)
+    hoje = datetime.now()
+    frame = ttk.Frame(exp_window, padding=15)
+    frame.pack(fill=BOTH, expand=True)
+    inicio_var = ttk.StringVar(value=hoje.replace(day=1).strftime('%d/%m/%Y'))
+    fim_var = ttk.StringVar(value=hoje.strftime('%d/%m/%Y'))
+    cliente_var = ttk.StringVar(); status_var = ttk.StringVar(value="Todos"); tipo_var = ttk.StringVar(value="Todos")
+    formato_var = ttk.StringVar(value="Excel (.xlsx)")
+    ttk.Label(frame, text="De:").grid(row=0, column=0, sticky='w', pady=5)
+    ttk.Entry(frame, textvariable=inicio_var, width=14).grid(row=0, column=1, sticky='w', pady=5)
+    ttk.Label(frame, text="Até:").grid(row=0, column=2, sticky='w', padx=(15, 0), pady=5)
+    ttk.Entry(frame, textvariable=fim_var, width=14).grid(row=0, column=3, sticky='w', pady=5)
+    ttk.Label(frame, text="Cliente:").grid(row=1, column=0, sticky='w', pady=5)
+    entry_cliente = ttk.Entry(frame, textvariable=cliente_var, width=40)
+    entry_cliente.grid(row=1, column=1, columnspan=3, sticky='we', pady=5)
+    ativar_sugestoes(entry_cliente, 'Cliente')
+    ttk.Label(frame, text="Status:").grid(row=2, column=0, sticky='w', pady=5)
+    ttk.Combobox(frame, textvariable=status_var, values=["Todos", "Entrada", "Saída"], width=12, state="readonly").grid(row=2, column=1, sticky='w', pady=5)
+    ttk.Label(frame, text="Tipo:").grid(row=2, column=2, sticky='w', padx=(15, 0), pady=5)
+    ttk.Combobox(frame, textvariable=tipo_var, values=["Todos"] + TIPOS_CONTAINER, width=18, state="readonly").grid(row=2, column=3, sticky='w', pady=5)
+    ttk.Label(frame, text="Formato:").grid(row=3, column=0, sticky='w', pady=5)
+    ttk.Combobox(frame, textvariable=formato_var, values=["Excel (.xlsx)", "CSV (.csv)"], width=14, state="readonly").grid(row=3, column=1, sticky='w', pady=5)
+    barra_progresso = ttk.Progressbar(frame, mode='indeterminate', bootstyle="info-striped")
+    barra_progresso.grid(row=4, column=0, columnspan=4, sticky='we', pady=(15, 5))
+    status_label = ttk.Label(frame, text="")
+    status_label.grid(row=5, column=0, columnspan=4, sticky='w')
+    botao_exportar = ttk.Button(frame, text="Exportar", bootstyle="success")
+    botao_exportar.grid(row=6, column=0, columnspan=4, pady=(10, 0))
+
+    def exportado(total, caminho):
+        indicar_ocupado(False, barra_progresso, (botao_exportar,))
+        status_label.config(text=f"{total} movimento(s) exportado(s) para {os.path.basename(caminho)}.")
+        if total and messagebox.askyesno("Exportação Concluída", "Deseja abrir o arquivo agora?", parent=exp_window):
+            _abrir_no_sistema(caminho)
+
+    def falha(e):
+        indicar_ocupado(False, barra_progresso, (botao_exportar,))
+        status_label.config(text="")
+        messagebox.showerror("Erro na Exportação", f"Ocorreu um erro:\n{e}", parent=exp_window)
+
+    def exportar():
+        try:
+            inicio = datetime.strptime(inicio_var.get().strip(), '%d/%m/%Y')
+            fim = datetime.strptime(fim_var.get().strip(), '%d/%m/%Y')
+        except ValueError:
+            messagebox.showerror("Período Inválido", "Informe as datas no formato DD/MM/AAAA.", parent=exp_window)
+            return
+        if inicio > fim:
+            messagebox.showerror("Período Inválido", "A data inicial é posterior à data final.", parent=exp_window)
+            return
+        extensao = ".csv" if formato_var.get().startswith("CSV") else ".xlsx"
+        caminho = filedialog.asksaveasfilename(
+            parent=exp_window, defaultextension=extensao, initialdir=_base_dir(),
+            filetypes=[("Arquivo CSV", "*.csv")] if extensao == ".csv" else [("Planilha Excel", "*.xlsx")],
+            initialfile=f"Movimentos_{inicio.strftime('%Y%m%d')}_{fim.strftime('%Y%m%d')}{extensao}")
+        if not caminho: return
+        cliente = cliente_var.get().strip()
+        status = None if status_var.get() == "Todos" else status_var.get()
+        tipo = None if tipo_var.get() == "Todos" else tipo_var.get()
+        status_label.config(text="Exportando movimentos do período...")
+        indicar_ocupado(True, barra_progresso, (botao_exportar,))
+        executar_em_segundo_plano(exp_window, exportar_periodo, caminho, inicio, fim, [cliente] if cliente else None, status, tipo,
+                                  ao_concluir=lambda total: exportado(total, caminho), ao_falhar=falha)
+
+    botao_exportar.config(command=exportar)
+
+def abrir_janela_romaneios_lote():
+    lote_window = ttk.Toplevel(title="Romaneios em Lote - Saídas do Turno")
+    lote_window.geometry("900x560"); lote_window.transient(app)
+    frame_filtros = ttk.Frame(lote_window, padding=10)
+    frame_filtros.pack(fill=X)
+    data_var = ttk.StringVar(value=datetime.now().strftime('%d/%m/%Y'))
+    de_var = ttk.StringVar(value="00:00"); ate_var = ttk.StringVar(value="23:59")
+    mesclado_var = ttk.BooleanVar(value=True)
+    ttk.Label(frame_filtros, text="Data:").pack(side=LEFT)
+    ttk.Entry(frame_filtros, textvariable=data_var, width=12).pack(side=LEFT, padx=(5, 15))
+    ttk.Label(frame_filtros, text="Das:").pack(side=LEFT)
+    ttk.Entry(frame_filtros, textvariable=de_var, width=6).pack(side=LEFT, padx=(5, 10))
+    ttk.Label(frame_filtros, text="Às:").pack(side=LEFT)
+    ttk.Entry(frame_filtros, textvariable=ate_var, width=6).pack(side=LEFT, padx=(5, 15))
+    botao_buscar = ttk.Button(frame_filtros, text="Buscar Saídas", bootstyle="info")
+    botao_buscar.pack(side=LEFT, padx=5)
+    barra_progresso = ttk.Progressbar(lote_window, mode='indeterminate', bootstyle="info-striped")
+    barra_progresso.pack(fill=X, padx=10)
+    status_label = ttk.Label(lote_window, text="")
+    status_label.pack(fill=X, padx=10, pady=(5, 0))
+    frame_lista = ttk.Frame(lote_window, padding=(10, 5))
+    frame_lista.pack(expand=True, fill=BOTH)
+    colunas = ('Data e Hora', 'Nº do Contêiner', 'Cliente', 'Placa do Veículo', 'Motorista')
+    tree = ttk.Treeview(frame_lista, columns=colunas, show='headings', selectmode='extended')
+    for col in colunas:
+        tree.heading(col, text=col); tree.column(col, width=160, anchor=CENTER)
+    scrollbar = ttk.Scrollbar(frame_lista, orient=VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side=RIGHT, fill=Y)
+    tree.pack(expand=True, fill=BOTH)
+    frame_acoes = ttk.Frame(lote_window, padding=10)
+    frame_acoes.pack(fill=X)
+    ttk.Checkbutton(frame_acoes, text="Um único PDF com todas as páginas", variable=mesclado_var).pack(side=LEFT)
+    botao_gerar = ttk.Button(frame_acoes, text="Gerar Romaneios", bootstyle="success")
+    botao_gerar.pack(side=RIGHT)
+    estado = {'saidas': []}
+    botoes = (botao_buscar, botao_gerar)
+
+    def falha(e):
+        indicar_ocupado(False, barra_progresso, botoes)
+        status_label.config(text="")
+        messagebox.showerror("Erro nos Romaneios", f"Ocorreu um erro:\n{e}", parent=lote_window)
+
+    def exibir_saidas(saidas):
+        indicar_ocupado(False, barra_progresso, botoes)
+        estado['saidas'] = saidas
+        tree.delete(*tree.get_children())
+        for indice, saida in enumerate(saidas):
+            tree.insert("", END, iid=str(indice), values=[saida['Data e Hora'].strftime('%d/%m/%Y %H:%M')] +
+                        [_valor_exibicao(saida.get(col, '')) for col in colunas[1:]])
+        tree.selection_set(tree.get_children())
+        status_label.config(text=f"{len(saidas)} saída(s) no período. Todas selecionadas; ajuste a seleção se precisar.")
+
+    def buscar():
+        try:
+            inicio = datetime.strptime(f"{data_var.get().strip()} {de_var.get().strip()}", '%d/%m/%Y %H:%M')
+            fim = datetime.strptime(f"{data_var.get().strip()} {ate_var.get().strip()}", '%d/%m/%Y %H:%M').replace(second=59)
+        except ValueError:
+            messagebox.showerror("Período Inválido", "Informe a data como DD/MM/AAAA e os horários como HH:MM.", parent=lote_window)
+            return
+        if inicio > fim:
+            messagebox.showerror("Período Inválido", "O horário inicial é posterior ao final.", parent=lote_window)
+            return
+        status_label.config(text="Buscando saídas...")
+        indicar_ocupado(True, barra_progresso, botoes)
+        executar_em_segundo_plano(lote_window, saidas_do_periodo, inicio, fim, ao_concluir=exibir_saidas, ao_falhar=falha)
+
+    def gerados(caminhos):
+        indicar_ocupado(False, barra_progresso, botoes)
+        status_label.config(text=f"{len(caminhos)} arquivo(s) gerado(s) em {PASTA_ROMANEIOS_PDF}.")
+        if messagebox.askyesno("Romaneios Gerados", "Deseja abri-los agora?", parent=lote_window):
+            _abrir_no_sistema(caminhos[0] if len(caminhos) == 1 else os.path.dirname(caminhos[0]))
+
+    def gerar():
+        selecionadas = [estado['saidas'][int(iid)] for iid in tree.selection()]
+        if not selecionadas:
+            messagebox.showwarning("Nenhuma Saída", "Selecione ao menos uma saída.", parent=lote_window)
+            return
+        status_label.config(text=f"Gerando {len(selecionadas)} romaneio(s)...")
+        indicar_ocupado(True, barra_progresso, botoes)
+        executar_em_segundo_plano(lote_window, gerar_romaneios_lote, selecionadas, mesclado_var.get(),
+                                  ao_concluir=gerados, ao_falhar=falha)
+
+    botao_buscar.config(command=buscar)
+    botao_gerar.config(command=gerar)
+    buscar()
 
 # --- BLOCO PRINCIPAL E INTERFACE GRÁFICA ---
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(main_cli(sys.argv[1:]))
     app = ttk.Window(themename="darkly")
     app.title("M4 Logística - Controle de Movimentação")
     app.geometry("980x560")
@@ -412,6 +3021,11 @@ if __name__ == "__main__":
     ttk.Label(main_frame, text="Observações:").grid(row=6, column=0, padx=10, pady=8, sticky='w')
     entry_obs = ttk.Text(main_frame, height=4, width=90)
     entry_obs.grid(row=7, column=0, columnspan=4, padx=10, pady=8)
+    ativar_sugestoes(entry_placa, 'Placa do Veículo')
+    ativar_sugestoes(entry_motorista, 'Motorista',
+                     lambda nome: preencher_dados_do_motorista(nome, {'CPF Motorista': entry_cpf, 'Placa do Veículo': entry_placa}))
+    ativar_sugestoes(entry_cpf, 'CPF Motorista')
+    ativar_sugestoes(entry_cliente, 'Cliente')
 
     def registrar_entrada_wrapper():
         dados_entrada = {
@@ -443,9 +3057,26 @@ if __name__ == "__main__":
             return
         for col in ['Placa Carreta', 'Transportadora', 'Tara', 'Peso Bruto Carga', 'Booking', 'Armador', 'Navio', 'Deadline', 'Tempo de Pátio (Dias)']:
             dados_entrada[col] = ''
-        if registrar_movimento(dados_entrada):
-            messagebox.showinfo("Sucesso", "Registro de ENTRADA salvo com sucesso!")
-            limpar_campos()
+        numero_container = dados_entrada['Nº do Contêiner']
+        if numero_container in _GRAVACOES_EM_ANDAMENTO:
+            messagebox.showwarning("Atenção", f"A entrada do contêiner {numero_container} ainda está sendo gravada.")
+            return
+        # A GRAVAÇÃO SEGUE EM SEGUNDO PLANO; O FORMULÁRIO É LIBERADO NA HORA PARA A PRÓXIMA ENTRADA.
+        _GRAVACOES_EM_ANDAMENTO.add(numero_container)
+        status_var.set(f"Gravando entrada do contêiner {numero_container}...")
+        # CÓPIA DO QUE FOI DIGITADO: SE A GRAVAÇÃO FALHAR, OS DADOS VOLTAM AO FORMULÁRIO.
+        digitado = dict(dados_entrada)
+        limpar_campos()
+        def entrada_gravada(_):
+            _GRAVACOES_EM_ANDAMENTO.discard(numero_container)
+            status_var.set(f"Entrada do contêiner {numero_container} salva às {datetime.now().strftime('%H:%M:%S')}.")
+        def entrada_falhou(e):
+            _GRAVACOES_EM_ANDAMENTO.discard(numero_container)
+            traceback.print_exception(type(e), e, e.__traceback__)
+            status_var.set(f"FALHA ao salvar a entrada do contêiner {numero_container}.")
+            preencher_campos(digitado)
+            messagebox.showerror("Erro ao Salvar", f"Ocorreu um erro ao salvar a entrada do contêiner {numero_container}.\n\nOs dados voltaram ao formulário.\n\n{e}")
+        executar_em_segundo_plano(app, _gravar_movimento, dados_entrada, ao_concluir=entrada_gravada, ao_falhar=entrada_falhou, gravacao=True)
 
     frame_botoes = ttk.Frame(main_frame)
     frame_botoes.grid(row=8, column=0, columnspan=4, pady=20)
@@ -455,7 +3086,13 @@ if __name__ == "__main__":
     ttk.Button(frame_botoes, text="Ver Pátio Atual", width=20, bootstyle="success", command=abrir_janela_patio, padding=(10, 10)).pack(side=LEFT, padx=5)
 
     def abrir_excel_do_dia():
-        caminho = garantir_arquivo_do_dia()
+        try:
+            caminho = garantir_arquivo_do_dia()
+        except OSError as e:
+            # A PLANILHA NÃO PÔDE SER REGRAVADA (NORMALMENTE JÁ ESTÁ ABERTA NO EXCEL): ABRE A CÓPIA QUE EXISTE E AVISA.
+            caminho = get_caminho_log_diario()
+            status_var.set(f"Excel do dia DESATUALIZADO ({e.strerror or e}). Feche a planilha e clique em 'Abrir Excel do Dia' de novo.")
+            if not os.path.exists(caminho): return
         _abrir_no_sistema(caminho)
 
     def abrir_pasta_logs_dia():
@@ -465,5 +3102,51 @@ if __name__ == "__main__":
 
     ttk.Button(frame_botoes, text="Abrir Excel do Dia", width=20, bootstyle="secondary", command=abrir_excel_do_dia, padding=(10,10)).pack(side=LEFT, padx=5)
     ttk.Button(frame_botoes, text="Abrir Pasta dos Logs", width=20, bootstyle="secondary", command=abrir_pasta_logs_dia, padding=(10,10)).pack(side=LEFT, padx=5)
+    ttk.Button(frame_botoes, text="Indicadores", width=20, bootstyle="info", command=abrir_janela_indicadores, padding=(10,10)).pack(side=LEFT, padx=5)
+
+    status_var = ttk.StringVar(value="")
+    ttk.Label(main_frame, textvariable=status_var).grid(row=9, column=0, columnspan=3, pady=(0, 10))
+    frame_links = ttk.Frame(main_frame)
+    frame_links.grid(row=9, column=3, sticky='e')
+    ttk.Button(frame_links, text="Romaneios em Lote", bootstyle="link", command=abrir_janela_romaneios_lote).pack(side=LEFT)
+    ttk.Button(frame_links, text="Exportar Período", bootstyle="link", command=abrir_janela_exportacao).pack(side=LEFT)
+    ttk.Button(frame_links, text="Diagnóstico", bootstyle="link", command=abrir_janela_diagnostico).pack(side=LEFT)
+    app.bind("<F12>", lambda e: abrir_janela_diagnostico())
+
+    etapas_inicializacao = {'importacoes_s': _FIM_IMPORTACOES - _INICIO_PROCESSO}
+    def sistema_aquecido(qtd_no_patio):
+        etapas_inicializacao['pronto_s'] = time.perf_counter() - _INICIO_PROCESSO
+        registrar_inicializacao(etapas_inicializacao)
+        if not status_var.get():
+            status_var.set(f"Pronto. {qtd_no_patio} contêiner(es) no pátio.")
+    def aquecimento_falhou(e):
+        traceback.print_exception(e)
+        registrar_inicializacao(etapas_inicializacao)
+    def formulario_exibido():
+        etapas_inicializacao['janela_s'] = time.perf_counter() - _INICIO_PROCESSO
+        executar_em_segundo_plano(app, aquecer_sistema, ao_concluir=sistema_aquecido, ao_falhar=aquecimento_falhou)
+    app.after_idle(formulario_exibido)
+
+    avisos_excel = {'falhas': {}}
+    def vigiar_exportacao_excel():
+        # AS EXPORTAÇÕES RODAM EM THREADS SEM ACESSO AO TK; A BARRA DE STATUS SÓ MUDA QUANDO O CONJUNTO DE FALHAS MUDA.
+        falhas = falhas_exportacao_excel()
+        if falhas != avisos_excel['falhas']:
+            if falhas:
+                nomes = ', '.join(sorted(os.path.basename(c) for c in falhas))
+                status_var.set(f"Excel DESATUALIZADO: {nomes} não pôde ser regravado (aberto no Excel?). Os movimentos estão salvos no diário.")
+            elif avisos_excel['falhas']:
+                status_var.set(f"Excel do dia atualizado às {datetime.now().strftime('%H:%M:%S')}.")
+            avisos_excel['falhas'] = falhas
+        app.after(INTERVALO_AVISO_EXCEL_MS, vigiar_exportacao_excel)
+    app.after(INTERVALO_AVISO_EXCEL_MS, vigiar_exportacao_excel)
+
+    def ao_fechar_app():
+        if _GRAVACOES_EM_ANDAMENTO:
+            messagebox.showwarning("Aguarde", "Ainda há movimentos sendo gravados. Tente fechar novamente em instantes.")
+            return
+        exportar_pendentes_excel()
+        app.destroy()
 
+    app.protocol("WM_DELETE_WINDOW", ao_fechar_app)
     app.mainloop()
\ No newline at end of file
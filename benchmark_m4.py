@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# --- BENCHMARK SINTÉTICO DO M4 LOGÍSTICA ---
+# Gera um histórico realista (contêineres ISO 6346 e CPFs válidos) em Logs_Excel/<data>/Log_Diario_<data>.xlsx
+# numa pasta temporária, mede as operações de gravação, leitura e romaneio em várias escalas e salva os
+# resultados em JSON para comparar duas execuções (por exemplo, antes e depois de uma mudança).
+#
+#   python benchmark_m4.py --escalas 30x40,180x40,365x60
+#   python benchmark_m4.py --comparar Benchmarks/antes.json Benchmarks/depois.json
+
+PASTA_RESULTADOS = "Benchmarks"
+ESCALAS_PADRAO = "30x40,180x40"
+CLIENTES = ["Transtec", "FernandoLogTec", "Agro Sul", "Mineração Vale Verde", "Café Export", "Têxtil Norte", "Química Paulista"]
+TRANSPORTADORAS = ["FerLogTech", "Transtec", "RodoBrasil", "TransMar", "Via Porto"]
+ARMADORES = ["Maersk", "MSC", "CMA CGM", "Hapag-Lloyd", "Evergreen"]
+NAVIOS = ["MSCU", "MCU", "MAERSK SANTOS", "CMA RIO", "EVER LOTUS"]
+DESTINOS = ["Japão", "China", "Holanda", "EUA", "Alemanha", "Chile"]
+MOTORISTAS = ["Gio", "Fernando Dias", "Ana Souza", "Bia Lima", "Carlos Melo", "João Pedro", "Marcos Reis", "Paulo Alves"]
+
+_VALORES_ISO6346 = {**{str(d): d for d in range(10)}, 'A': 10, 'B': 12, 'C': 13, 'D': 14, 'E': 15, 'F': 16, 'G': 17, 'H': 18, 'I': 19, 'J': 20, 'K': 21, 'L': 23, 'M': 24, 'N': 25, 'O': 26, 'P': 27, 'Q': 28, 'R': 29, 'S': 30, 'T': 31, 'U': 32, 'V': 34, 'W': 35, 'X': 36, 'Y': 37, 'Z': 38}
+
+
+# --- GERADOR DETERMINÍSTICO DE DADOS ---
+def gerar_numero_container(rng):
+    prefixo = ''.join(rng.choice(string.ascii_uppercase) for _ in range(3)) + 'U'
+    serie = ''.join(rng.choice(string.digits) for _ in range(6))
+    base = prefixo + serie
+    digito = sum(_VALORES_ISO6346[c] * (2 ** i) for i, c in enumerate(base)) % 11 % 10
+    return f"{base}{digito}"
+
+def gerar_cpf(rng):
+    while True:
+        numeros = [rng.randint(0, 9) for _ in range(9)]
+        if len(set(numeros)) > 1: break
+    for pesos in (range(10, 1, -1), range(11, 1, -1)):
+        numeros.append(sum(n * p for n, p in zip(numeros, pesos)) * 10 % 11 % 10)
+    return ''.join(map(str, numeros))
+
+def gerar_placa(rng):
+    return ''.join(rng.choice(string.ascii_uppercase) for _ in range(3)) + str(rng.randint(0, 9)) + rng.choice(string.ascii_uppercase) + f"{rng.randint(0, 99):02d}"
+
+def _movimento_entrada(m4, rng, instante, numero_container, motoristas):
+    motorista, cpf = rng.choice(motoristas)
+    dados = {col: '' for col in m4.COLUNAS_ORDENADAS}
+    dados.update({
+        'Data e Hora': instante, 'Status': 'Entrada', 'Nº do Contêiner': numero_container,
+        'Tipo de Contêiner': rng.choice(m4.TIPOS_CONTAINER[:-1]), 'Condição': rng.choice(m4.CONDICOES),
+        'Cliente': rng.choice(CLIENTES), 'Nº do Lacre': str(rng.randint(100000, 999999)),
+        'Nota Fiscal (NF)': str(rng.randint(100000, 9999999)), 'Destino': rng.choice(DESTINOS),
+        'Placa do Veículo': gerar_placa(rng), 'Motorista': motorista, 'CPF Motorista': cpf,
+    })
+    return dados
+
+def _movimento_saida(m4, rng, instante, entrada, motoristas):
+    motorista, cpf = rng.choice(motoristas)
+    dados = dict(entrada)
+    dados.update({
+        'Data e Hora': instante, 'Status': 'Saída', 'Placa do Veículo': gerar_placa(rng), 'Placa Carreta': gerar_placa(rng),
+        'Motorista': motorista, 'CPF Motorista': cpf, 'Transportadora': rng.choice(TRANSPORTADORAS),
+        'Tara': str(rng.randint(2000, 4500)), 'Peso Bruto Carga': str(rng.randint(5000, 30000)),
+        'Booking': str(rng.randint(100000, 999999)), 'Armador': rng.choice(ARMADORES), 'Navio': rng.choice(NAVIOS),
+        'Deadline': (instante + timedelta(days=rng.randint(1, 20))).strftime('%d/%m/%Y'),
+        'Tempo de Pátio (Dias)': str((instante - entrada['Data e Hora']).days),
+    })
+    return dados
+
+def gerar_historico(m4, pasta_base, dias, movimentos_por_dia, semente=42):
+    # ESCREVE 'dias' ARQUIVOS LEGADOS (SÓ EXCEL) TERMINANDO ONTEM; O PÁTIO É CARREGADO DE UM DIA PARA O OUTRO.
+    rng = random.Random(semente)
+    motoristas = [(rng.choice(MOTORISTAS) + f" {i}", gerar_cpf(rng)) for i in range(60)]
+    no_patio = {}
+    inicio = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias)
+    total = 0
+    for d in range(dias):
+        dia = inicio + timedelta(days=d)
+        instantes = sorted(dia + timedelta(hours=6, seconds=rng.randint(0, 16 * 3600)) for _ in range(movimentos_por_dia))
+        registros = []
+        for instante in instantes:
+            sai = no_patio and (len(no_patio) > 50 or rng.random() < 0.45)
+            if sai:
+                numero_container = rng.choice(list(no_patio))
+                registros.append(_movimento_saida(m4, rng, instante, no_patio.pop(numero_container), motoristas))
+            else:
+                numero_container = gerar_numero_container(rng)
+                entrada = _movimento_entrada(m4, rng, instante, numero_container, motoristas)
+                no_patio[numero_container] = entrada
+                registros.append(entrada)
+        pasta_dia = os.path.join(pasta_base, m4.PASTA_LOGS_EXCEL, dia.strftime('%Y-%m-%d'))
+        os.makedirs(pasta_dia, exist_ok=True)
+        m4.salvar_planilha(m4.pd.DataFrame(registros), os.path.join(pasta_dia, f"Log_Diario_{dia.strftime('%Y-%m-%d')}.xlsx"))
+        total += len(registros)
+    return {'movimentos': total, 'no_patio': len(no_patio), 'motoristas': motoristas}
+
+
+# --- MEDIÇÃO ---
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados: return None
+    k = (len(ordenados) - 1) * p / 100
+    inferior, superior = int(k), min(int(k) + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+def medir(funcao, repeticoes, preparar=None, m4=None):
+    # TEMPOS SEM tracemalloc (QUE DISTORCE A LATÊNCIA) E UMA EXECUÇÃO EXTRA, RASTREADA, PARA O PICO DE MEMÓRIA.
+    # O tracemalloc SÓ ENXERGA ESTE PROCESSO: COM 'm4', A EXECUÇÃO RASTREADA FORÇA UM ÚNICO WORKER (LEITURA E
+    # ROMANEIOS NO PRÓPRIO PROCESSO), PARA O PICO INCLUIR A LEITURA DOS ARQUIVOS EM VEZ DE SÓ A JUNÇÃO DOS RESULTADOS.
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar: preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    if preparar: preparar()
+    workers_anterior = m4.MAX_WORKERS_LEITURA if m4 is not None else None
+    if m4 is not None: m4.MAX_WORKERS_LEITURA = 1
+    tracemalloc.start()
+    try:
+        funcao()
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if m4 is not None: m4.MAX_WORKERS_LEITURA = workers_anterior
+    return {
+        'repeticoes': repeticoes,
+        'p50_ms': _percentil(tempos, 50), 'p90_ms': _percentil(tempos, 90), 'p99_ms': _percentil(tempos, 99),
+        'max_ms': max(tempos), 'media_ms': sum(tempos) / len(tempos),
+        'pico_memoria_mb': pico / (1024 * 1024),
+    }
+
+def executar_escala(m4, dias, movimentos_por_dia, repeticoes, semente):
+    pasta_base = tempfile.mkdtemp(prefix="m4_bench_")
+    os.environ['M4_BASE_DIR'] = pasta_base
+    m4.ATRASO_EXPORTACAO_EXCEL_S = 3600
+    try:
+        inicio = time.perf_counter()
+        gerado = gerar_historico(m4, pasta_base, dias, movimentos_por_dia, semente)
+        print(f"  histórico gerado: {gerado['movimentos']} movimentos em {time.perf_counter() - inicio:.1f}s")
+        rng = random.Random(semente + 1)
+        resultados = {}
+
+        def limpar_indice():
+            m4._INDICE_PATIO_MEMORIA['value'] = None
+            if os.path.exists(m4._caminho_indice_patio()): os.remove(m4._caminho_indice_patio())
+        resultados['get_containers_no_patio (frio)'] = medir(m4.get_containers_no_patio, max(1, repeticoes // 10), preparar=limpar_indice, m4=m4)
+        resultados['get_containers_no_patio (quente)'] = medir(m4.get_containers_no_patio, repeticoes, m4=m4)
+
+        def registrar():
+            m4.registrar_movimento(_movimento_entrada(m4, rng, datetime.now(), gerar_numero_container(rng), gerado['motoristas']))
+        resultados['registrar_movimento'] = medir(registrar, repeticoes)
+        resultados['get_containers_no_patio (após movimento)'] = medir(m4.get_containers_no_patio, max(1, repeticoes // 4), preparar=registrar, m4=m4)
+        m4.exportar_pendentes_excel()
+
+        df_dia = m4.pd.DataFrame([_movimento_entrada(m4, rng, datetime.now(), gerar_numero_container(rng), gerado['motoristas'])
+                                  for _ in range(movimentos_por_dia)])
+        caminho_tmp = os.path.join(pasta_base, "bench_salvar.xlsx")
+        resultados['salvar_planilha (streaming)'] = medir(lambda: m4.salvar_planilha(df_dia.copy(), caminho_tmp, rapido=True), repeticoes)
+        resultados['salvar_planilha (clássico)'] = medir(lambda: m4.salvar_planilha(df_dia.copy(), caminho_tmp, rapido=False), repeticoes)
+
+        saida = _movimento_saida(m4, rng, datetime.now(), _movimento_entrada(m4, rng, datetime.now() - timedelta(days=3), gerar_numero_container(rng), gerado['motoristas']), gerado['motoristas'])
+        resultados['gerar_romaneio_pdf'] = medir(lambda: m4.gerar_romaneio_pdf(saida, os.path.join(pasta_base, "bench_romaneio.pdf")), repeticoes)
+        lote = [dict(saida, **{'Nº do Contêiner': gerar_numero_container(rng)}) for _ in range(20)]
+        resultados['gerar_romaneios_lote (20, mesclado)'] = medir(lambda: m4.gerar_romaneios_lote(lote, mesclado=True, caminho_mesclado=os.path.join(pasta_base, "bench_lote.pdf")), max(1, repeticoes // 4), m4=m4)
+        return {'dias': dias, 'movimentos_por_dia': movimentos_por_dia, 'movimentos_total': gerado['movimentos'], 'operacoes': resultados}
+    finally:
+        m4.exportar_pendentes_excel()
+        os.environ.pop('M4_BASE_DIR', None)
+        m4._INDICE_PATIO_MEMORIA['value'] = None
+        shutil.rmtree(pasta_base, ignore_errors=True)
+
+
+# --- RELATÓRIOS ---
+def _chave_escala(escala):
+    return f"{escala['dias']}x{escala['movimentos_por_dia']}"
+
+def imprimir_resultados(resultado):
+    for escala in resultado['escalas']:
+        print(f"\nEscala {_chave_escala(escala)} ({escala['movimentos_total']} movimentos)")
+        print(f"  {'operação':<42}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'máx ms':>10}{'pico MB':>10}")
+        for nome, r in escala['operacoes'].items():
+            print(f"  {nome:<42}{r['p50_ms']:>10.1f}{r['p90_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['pico_memoria_mb']:>10.1f}")
+
+def comparar_resultados(caminho_a, caminho_b):
+    with open(caminho_a, encoding='utf-8') as f: a = json.load(f)
+    with open(caminho_b, encoding='utf-8') as f: b = json.load(f)
+    escalas_a = {_chave_escala(e): e for e in a['escalas']}
+    for escala_b in b['escalas']:
+        escala_a = escalas_a.get(_chave_escala(escala_b))
+        if escala_a is None: continue
+        print(f"\nEscala {_chave_escala(escala_b)}: {os.path.basename(caminho_a)} -> {os.path.basename(caminho_b)}")
+        print(f"  {'operação':<42}{'p50 A':>10}{'p50 B':>10}{'variação':>10}{'pico A':>9}{'pico B':>9}")
+        for nome, rb in escala_b['operacoes'].items():
+            ra = escala_a['operacoes'].get(nome)
+            if ra is None: continue
+            variacao = (rb['p50_ms'] - ra['p50_ms']) / ra['p50_ms'] * 100 if ra['p50_ms'] else 0.0
+            print(f"  {nome:<42}{ra['p50_ms']:>10.1f}{rb['p50_ms']:>10.1f}{variacao:>+9.1f}%{ra['pico_memoria_mb']:>9.1f}{rb['pico_memoria_mb']:>9.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sintético das rotinas de gravação, pátio e romaneio do M4 Logística.")
+    parser.add_argument('--escalas', default=ESCALAS_PADRAO, help="Lista DIASxMOVIMENTOS_POR_DIA separada por vírgulas (padrão: %(default)s).")
+    parser.add_argument('--repeticoes', type=int, default=20, help="Repetições por operação (padrão: %(default)s).")
+    parser.add_argument('--semente', type=int, default=42, help="Semente do gerador de dados (padrão: %(default)s).")
+    parser.add_argument('--saida', help="Arquivo JSON de resultados (padrão: Benchmarks/benchmark_<data>.json).")
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'), help="Compara dois arquivos de resultado e sai.")
+    args = parser.parse_args(argv)
+    if args.comparar:
+        comparar_resultados(*args.comparar)
+        return 0
+
+    import M4_logistica as m4
+    escalas = [tuple(int(x) for x in e.lower().split('x')) for e in args.escalas.split(',') if e.strip()]
+    resultado = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'plataforma': platform.platform(), 'nucleos': os.cpu_count(),
+        'pandas': m4.pd.__version__, 'semente': args.semente, 'repeticoes': args.repeticoes, 'escalas': [],
+    }
+    for dias, movimentos_por_dia in escalas:
+        print(f"Escala {dias} dias x {movimentos_por_dia} movimentos/dia...")
+        resultado['escalas'].append(executar_escala(m4, dias, movimentos_por_dia, args.repeticoes, args.semente))
+    imprimir_resultados(resultado)
+    pasta_resultados = os.path.join(os.path.dirname(os.path.abspath(__file__)), PASTA_RESULTADOS)
+    caminho_saida = args.saida or os.path.join(pasta_resultados, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_saida)), exist_ok=True)
+    with open(caminho_saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em: {caminho_saida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import benchmark_m4
+
+# --- VERIFICAÇÃO DO COORDENADOR COM VÁRIOS TERMINAIS NA MESMA MÁQUINA ---
+# Sobe um coordenador (com senha) numa pasta temporária e vários terminais em processos separados, todos gravando
+# entradas, saídas e correções ao mesmo tempo. No fim confere que nenhum movimento foi perdido ou duplicado no
+# diário, que os IDs são únicos, que as correções foram aplicadas, que o pátio de cada terminal é igual ao recalculado
+# do diário e que um terminal com a senha errada é recusado. Sai com código 0 quando tudo confere.
+#
+#   python verificar_coordenador_m4.py --terminais 5 --movimentos 60
+
+CAMINHO_M4 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "M4_logistica.py")
+ESPERA_DIFUSAO_S = 1.0
+
+
+def _ambiente(pasta_base, token, porta=None):
+    ambiente = dict(os.environ, M4_BASE_DIR=pasta_base, M4_TOKEN_COORDENADOR=token)
+    if porta is not None: ambiente['M4_COORDENADOR'] = f"127.0.0.1:{porta}"
+    return ambiente
+
+
+def iniciar_coordenador(pasta_base, token):
+    processo = subprocess.Popen([sys.executable, CAMINHO_M4, 'coordenador', '--porta', '0'], env=_ambiente(pasta_base, token),
+                                stdout=subprocess.PIPE, text=True, encoding='utf-8')
+    linha = processo.stdout.readline()
+    achado = re.search(r':(\d+) ', linha)
+    if not achado:
+        processo.kill()
+        raise RuntimeError(f"O coordenador não iniciou: {linha!r}")
+    return processo, int(achado.group(1))
+
+
+def _terminal(numero, pasta_base, token, porta, movimentos, barreira):
+    # CADA TERMINAL GRAVA SÓ OS PRÓPRIOS CONTÊINERES; DEVOLVE O QUE GRAVOU E O PÁTIO QUE VÊ DEPOIS QUE TODOS TERMINAM.
+    os.environ.update(_ambiente(pasta_base, token, porta))
+    import M4_logistica as m4
+    rng = random.Random(numero)
+    motoristas = [(f"Motorista {numero}-{i}", benchmark_m4.gerar_cpf(rng)) for i in range(5)]
+    no_patio, ids, corrigidos = {}, [], {}
+    for i in range(movimentos):
+        if no_patio and i % 3 == 2:
+            numero_container = rng.choice(sorted(no_patio))
+            entrada = no_patio.pop(numero_container)
+            ids.append(m4._gravar_movimento(benchmark_m4._movimento_saida(m4, rng, datetime.now(), entrada, motoristas)))
+        else:
+            entrada = benchmark_m4._movimento_entrada(m4, rng, datetime.now(), benchmark_m4.gerar_numero_container(rng), motoristas)
+            entrada['ID Movimento'] = m4._gravar_movimento(entrada)
+            ids.append(entrada['ID Movimento'])
+            no_patio[entrada['Nº do Contêiner']] = entrada
+            if i % 5 == 0:
+                corrigidos[entrada['ID Movimento']] = f"CORRIGIDO T{numero}"
+                m4.atualizar_movimento(entrada['ID Movimento'], {'Observações': corrigidos[entrada['ID Movimento']]})
+    barreira.wait()
+    time.sleep(ESPERA_DIFUSAO_S)
+    visto = m4.get_containers_no_patio()
+    return {'ids': ids, 'no_patio': sorted(no_patio), 'corrigidos': corrigidos,
+            'patio_visto': sorted(visto['Nº do Contêiner']) if not visto.empty else []}
+
+
+def _terminal_recusado(pasta_base, porta):
+    os.environ.update(_ambiente(pasta_base, "senha-errada", porta))
+    import M4_logistica as m4
+    try:
+        m4.ClienteCoordenador('127.0.0.1', porta, timeout=5.0).fechar()
+    except OSError:
+        return True
+    return False
+
+
+def verificar(terminais, movimentos):
+    pasta_base = tempfile.mkdtemp(prefix="m4_coord_")
+    token = secrets.token_hex(16)
+    coordenador, porta = iniciar_coordenador(pasta_base, token)
+    falhas = []
+    try:
+        contexto = multiprocessing.get_context('spawn')
+        with contexto.Manager() as gerente, contexto.Pool(terminais + 1) as pool:
+            barreira = gerente.Barrier(terminais)
+            inicio = time.perf_counter()
+            pendentes = [pool.apply_async(_terminal, (n, pasta_base, token, porta, movimentos, barreira)) for n in range(terminais)]
+            resultados = [p.get(timeout=300) for p in pendentes]
+            duracao = time.perf_counter() - inicio
+            if not pool.apply(_terminal_recusado, (pasta_base, porta)):
+                falhas.append("Um terminal com a senha errada foi aceito pelo coordenador.")
+    finally:
+        coordenador.terminate()
+        coordenador.wait(timeout=30)
+    os.environ['M4_BASE_DIR'] = pasta_base
+    os.environ.pop('M4_COORDENADOR', None)
+    import M4_logistica as m4
+    try:
+        historico = m4.carregar_historico()
+        ids = [i for r in resultados for i in r['ids']]
+        esperado_no_patio = sorted(c for r in resultados for c in r['no_patio'])
+        patio_diario = sorted(m4.get_containers_no_patio()['Nº do Contêiner'])
+        if len(historico) != len(ids):
+            falhas.append(f"O diário tem {len(historico)} movimentos; os terminais gravaram {len(ids)}.")
+        if not historico['ID Movimento'].is_unique or set(historico['ID Movimento']) != set(ids):
+            falhas.append("IDs de movimento duplicados ou diferentes dos devolvidos aos terminais.")
+        observacoes = dict(zip(historico['ID Movimento'], historico['Observações']))
+        if any(observacoes.get(i) != texto for r in resultados for i, texto in r['corrigidos'].items()):
+            falhas.append("Alguma correção não foi aplicada ao movimento certo.")
+        if patio_diario != esperado_no_patio:
+            falhas.append(f"O pátio recalculado do diário ({len(patio_diario)}) difere do esperado ({len(esperado_no_patio)}).")
+        for numero, r in enumerate(resultados):
+            if r['patio_visto'] != esperado_no_patio:
+                falhas.append(f"O terminal {numero} vê {len(r['patio_visto'])} contêineres no pátio; esperado {len(esperado_no_patio)}.")
+        print(f"{terminais} terminais, {len(ids)} movimentos em {duracao:.1f}s; {len(esperado_no_patio)} contêineres no pátio.")
+    finally:
+        shutil.rmtree(pasta_base, ignore_errors=True)
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    if not falhas: print("OK: diário, IDs, correções e pátio conferem em todos os terminais.")
+    return 1 if falhas else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica o coordenador do M4 Logística com vários terminais gravando ao mesmo tempo.")
+    parser.add_argument('--terminais', type=int, default=5, help="Processos terminais simultâneos (padrão: %(default)s).")
+    parser.add_argument('--movimentos', type=int, default=60, help="Movimentos gravados por terminal (padrão: %(default)s).")
+    args = parser.parse_args(argv)
+    return verificar(args.terminais, args.movimentos)
+
+if __name__ == "__main__":
+    sys.exit(main())